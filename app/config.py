@@ -19,13 +19,138 @@ class Settings:
 
     # Groq API Configuration
     GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "")
-    GROQ_API_URL: str = "https://api.groq.com/openai/v1/chat/completions"
+    # Overridable to point at a local stand-in (python -m benchmarks.fake_groq)
+    GROQ_API_URL: str = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+    GROQ_MODELS_URL: str = os.getenv("GROQ_MODELS_URL", "https://api.groq.com/openai/v1/models")
     MODEL: str = os.getenv("MODEL", "llama-3.3-70b-versatile")
     MAX_TOKENS: int = int(os.getenv("MAX_TOKENS", "800"))
     TEMPERATURE: float = float(os.getenv("TEMPERATURE", "0.7"))
 
+    # Local plant knowledge base (snippets injected into prompts, optional direct answers)
+    KB_ENABLED: bool = os.getenv("KB_ENABLED", "true").lower() == "true"
+    KB_PATH: str = os.getenv("KB_PATH", "")  # default: app/data/plants.jsonl
+    KB_TOP_K: int = int(os.getenv("KB_TOP_K", "3"))
+    KB_MIN_SCORE: float = float(os.getenv("KB_MIN_SCORE", "1.5"))
+    KB_DIRECT_ANSWERS: bool = os.getenv("KB_DIRECT_ANSWERS", "false").lower() == "true"
+    KB_DIRECT_MAX_WORDS: int = int(os.getenv("KB_DIRECT_MAX_WORDS", "10"))
+
+    # Model routing (short, simple questions go to a smaller, faster model)
+    ROUTING_ENABLED: bool = os.getenv("ROUTING_ENABLED", "false").lower() == "true"
+    ROUTING_SMALL_MODEL: str = os.getenv("ROUTING_SMALL_MODEL", "llama-3.1-8b-instant")
+    ROUTING_SMALL_MAX_TOKENS: int = int(os.getenv("ROUTING_SMALL_MAX_TOKENS", "400"))
+    ROUTING_SIMPLE_MAX_WORDS: int = int(os.getenv("ROUTING_SIMPLE_MAX_WORDS", "12"))
+
+    # Adaptive output budget (max_tokens learned per question class, capped by the route's
+    # max_tokens) and optional early stop once the closing disclaimer is written
+    OUTPUT_BUDGET_ENABLED: bool = os.getenv("OUTPUT_BUDGET_ENABLED", "false").lower() == "true"
+    OUTPUT_BUDGET_MIN_TOKENS: int = int(os.getenv("OUTPUT_BUDGET_MIN_TOKENS", "256"))
+    OUTPUT_BUDGET_PERCENTILE: float = float(os.getenv("OUTPUT_BUDGET_PERCENTILE", "95"))
+    OUTPUT_BUDGET_HEADROOM: float = float(os.getenv("OUTPUT_BUDGET_HEADROOM", "1.15"))
+    OUTPUT_STOP_AT_DISCLAIMER: bool = os.getenv("OUTPUT_STOP_AT_DISCLAIMER", "false").lower() == "true"
+
+    # Groq HTTP client (one pooled client shared by all requests)
+    GROQ_TIMEOUT: float = float(os.getenv("GROQ_TIMEOUT", "30.0"))
+    GROQ_CONNECT_TIMEOUT: float = float(os.getenv("GROQ_CONNECT_TIMEOUT", "5.0"))
+    GROQ_HTTP2: bool = os.getenv("GROQ_HTTP2", "true").lower() == "true"
+    GROQ_POOL_MAX_CONNECTIONS: int = int(os.getenv("GROQ_POOL_MAX_CONNECTIONS", "20"))
+    GROQ_POOL_MAX_KEEPALIVE: int = int(os.getenv("GROQ_POOL_MAX_KEEPALIVE", "10"))
+    GROQ_KEEPALIVE_EXPIRY: float = float(os.getenv("GROQ_KEEPALIVE_EXPIRY", "60.0"))
+
+    # Retries and circuit breaker for Groq calls
+    GROQ_MAX_RETRIES: int = int(os.getenv("GROQ_MAX_RETRIES", "2"))
+    GROQ_RETRY_BASE_DELAY: float = float(os.getenv("GROQ_RETRY_BASE_DELAY", "0.5"))
+    GROQ_RETRY_MAX_DELAY: float = float(os.getenv("GROQ_RETRY_MAX_DELAY", "8.0"))
+    GROQ_ATTEMPT_TIMEOUT: float = float(os.getenv("GROQ_ATTEMPT_TIMEOUT", "20.0"))
+    GROQ_OVERALL_TIMEOUT: float = float(os.getenv("GROQ_OVERALL_TIMEOUT", "30.0"))
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RECOVERY_TIMEOUT: float = float(os.getenv("CIRCUIT_RECOVERY_TIMEOUT", "30.0"))
+
+    # Upstream pool and hedging (extra endpoints/keys as "url|key" pairs, see upstream_pool.py)
+    GROQ_UPSTREAMS: str = os.getenv("GROQ_UPSTREAMS", "")
+    GROQ_HEDGE_ENABLED: bool = os.getenv("GROQ_HEDGE_ENABLED", "false").lower() == "true"
+    GROQ_HEDGE_QUANTILE: float = float(os.getenv("GROQ_HEDGE_QUANTILE", "95"))
+    GROQ_HEDGE_MIN_DELAY: float = float(os.getenv("GROQ_HEDGE_MIN_DELAY", "1.0"))
+    GROQ_HEDGE_MAX_DELAY: float = float(os.getenv("GROQ_HEDGE_MAX_DELAY", "10.0"))
+    UPSTREAM_FAILURE_THRESHOLD: int = int(os.getenv("UPSTREAM_FAILURE_THRESHOLD", "3"))
+    UPSTREAM_COOLDOWN_SECONDS: float = float(os.getenv("UPSTREAM_COOLDOWN_SECONDS", "30"))
+
+    # Admission control (bounded concurrency and queueing of Groq calls)
+    UPSTREAM_MAX_CONCURRENCY: int = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "8"))
+    UPSTREAM_MAX_QUEUE: int = int(os.getenv("UPSTREAM_MAX_QUEUE", "32"))
+    UPSTREAM_QUEUE_TIMEOUT: float = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "10.0"))
+    UPSTREAM_RETRY_AFTER: float = float(os.getenv("UPSTREAM_RETRY_AFTER", "5"))
+
+    # Response cache (repeated questions are answered without calling Groq)
+    CACHE_ENABLED: bool = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))
+    CACHE_MAX_BYTES: int = int(os.getenv("CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+    CACHE_TTL_SECONDS: float = float(os.getenv("CACHE_TTL_SECONDS", "86400"))
+
+    # Persistent answer store (SQLite copy of the cache that survives restarts)
+    ANSWER_STORE_ENABLED: bool = os.getenv("ANSWER_STORE_ENABLED", "false").lower() == "true"
+    ANSWER_STORE_PATH: str = os.getenv("ANSWER_STORE_PATH", "data/answers.db")
+    ANSWER_STORE_MAX_ENTRIES: int = int(os.getenv("ANSWER_STORE_MAX_ENTRIES", "20000"))
+    ANSWER_STORE_MAX_BYTES: int = int(os.getenv("ANSWER_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+    ANSWER_STORE_TTL_SECONDS: float = float(os.getenv("ANSWER_STORE_TTL_SECONDS", str(7 * 86400)))
+    ANSWER_STORE_COMPACT_INTERVAL: float = float(os.getenv("ANSWER_STORE_COMPACT_INTERVAL", "3600"))
+
+    # Cache warm-up (frequent questions answered in the background at startup)
+    WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "false").lower() == "true"
+    WARMUP_PATH: str = os.getenv("WARMUP_PATH", "warmup_questions.txt")  # one question per line, or a capture .jsonl
+    WARMUP_MAX_QUESTIONS: int = int(os.getenv("WARMUP_MAX_QUESTIONS", "50"))
+    WARMUP_CONCURRENCY: int = int(os.getenv("WARMUP_CONCURRENCY", "2"))
+
+    # Conversation memory (multi-turn history sent to Groq)
+    CONVERSATION_MEMORY_ENABLED: bool = os.getenv("CONVERSATION_MEMORY_ENABLED", "true").lower() == "true"
+    CONVERSATION_BACKEND: str = os.getenv("CONVERSATION_BACKEND", "memory")  # memory | redis
+    CONVERSATION_REDIS_URL: str = os.getenv("CONVERSATION_REDIS_URL", "")
+    CONVERSATION_TTL_SECONDS: float = float(os.getenv("CONVERSATION_TTL_SECONDS", "1800"))
+    CONVERSATION_MAX_TURNS: int = int(os.getenv("CONVERSATION_MAX_TURNS", "12"))
+    CONVERSATION_HISTORY_TOKEN_BUDGET: int = int(os.getenv("CONVERSATION_HISTORY_TOKEN_BUDGET", "1200"))
+    CONVERSATION_MAX_CONVERSATIONS: int = int(os.getenv("CONVERSATION_MAX_CONVERSATIONS", "5000"))
+    CONVERSATION_MAX_TOTAL_BYTES: int = int(os.getenv("CONVERSATION_MAX_TOTAL_BYTES", str(16 * 1024 * 1024)))
+
+    # Health checks (background probe of the Groq models endpoint)
+    HEALTH_CHECK_INTERVAL: float = float(os.getenv("HEALTH_CHECK_INTERVAL", "60"))
+    HEALTH_CHECK_TIMEOUT: float = float(os.getenv("HEALTH_CHECK_TIMEOUT", "5.0"))
+    HEALTH_DEEP_CHECK_MIN_INTERVAL: float = float(os.getenv("HEALTH_DEEP_CHECK_MIN_INTERVAL", "10"))
+
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_PER_MINUTE", "10"))
+    RATE_LIMIT_STORAGE_URI: str = os.getenv("RATE_LIMIT_STORAGE_URI", "memory://")  # memory:// | shm:///dev/shm/... | redis://...
+    RATE_LIMIT_KEY: str = os.getenv("RATE_LIMIT_KEY", "ip")  # ip | user_id | conversation_id
+    QUOTA_RATE_LIMIT_PER_MINUTE: int = int(os.getenv("QUOTA_RATE_LIMIT_PER_MINUTE", "30"))
+
+    # Batch chat (/chat/batch: one rate-limited request, many questions)
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+    BATCH_CONCURRENCY: int = int(os.getenv("BATCH_CONCURRENCY", "4"))
+    BATCH_RATE_LIMIT_PER_MINUTE: int = int(os.getenv("BATCH_RATE_LIMIT_PER_MINUTE", "2"))
+
+    # WebSocket chat (/ws/chat: one connection per visitor session)
+    WS_MAX_CONNECTIONS: int = int(os.getenv("WS_MAX_CONNECTIONS", "5000"))
+    WS_MAX_CONNECTIONS_PER_IP: int = int(os.getenv("WS_MAX_CONNECTIONS_PER_IP", "20"))
+    WS_MESSAGES_PER_MINUTE: int = int(os.getenv("WS_MESSAGES_PER_MINUTE", os.getenv("RATE_LIMIT_PER_MINUTE", "10")))
+    WS_IDLE_TIMEOUT: float = float(os.getenv("WS_IDLE_TIMEOUT", "300"))
+    WS_SEND_TIMEOUT: float = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+
+    # Token budgets (tokens spent per user_id / per IP over a sliding window)
+    TOKEN_BUDGET_ENABLED: bool = os.getenv("TOKEN_BUDGET_ENABLED", "true").lower() == "true"
+    TOKEN_BUDGET_PER_USER: int = int(os.getenv("TOKEN_BUDGET_PER_USER", "20000"))
+    TOKEN_BUDGET_PER_IP: int = int(os.getenv("TOKEN_BUDGET_PER_IP", "60000"))
+    TOKEN_BUDGET_WINDOW_SECONDS: float = float(os.getenv("TOKEN_BUDGET_WINDOW_SECONDS", "3600"))
+    TOKEN_BUDGET_MAX_KEYS: int = int(os.getenv("TOKEN_BUDGET_MAX_KEYS", "10000"))
+
+    # Logging (records are written by a background thread, see utils/logger.py)
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")  # text | json
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    LOG_SAMPLE_RATE: float = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))  # share of requests whose INFO lines are kept
+
+    # Traffic capture for replay (python -m benchmarks.replay); stores user messages
+    CAPTURE_ENABLED: bool = os.getenv("CAPTURE_ENABLED", "false").lower() == "true"
+    CAPTURE_PATH: str = os.getenv("CAPTURE_PATH", "captures/chat_requests.jsonl")
+    CAPTURE_SAMPLE_RATE: float = float(os.getenv("CAPTURE_SAMPLE_RATE", "1.0"))
+    CAPTURE_MAX_QUEUE: int = int(os.getenv("CAPTURE_MAX_QUEUE", "10000"))
 
     # CORS
     ALLOWED_ORIGINS: list = ["*"]  # Allow all origins for WordPress widget
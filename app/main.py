@@ -3,26 +3,68 @@ Diane Herborist API - Main application module.
 FastAPI backend for Diane chatbot specializing in medicinal plants.
 """
 
-from fastapi import FastAPI, Request, HTTPException
+import asyncio
+import math
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from fastapi import FastAPI, Request, HTTPException, Depends, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
+from slowapi.util import get_remote_address
+from pydantic import ValidationError
 
 from app.config import settings
 from app.models import (
+    BatchChatRequest,
+    BatchChatResponse,
     ChatRequest,
     ChatResponse,
     ErrorResponse,
     HealthResponse,
     HealthCheckResponse,
+    QuotaResponse,
+    StatsResponse,
     generate_conversation_id,
     get_current_timestamp
 )
 from app.services.validator import is_valid_herbalism_topic, get_off_topic_response
-from app.services.groq_service import groq_service, GroqServiceError
-from app.utils.logger import logger
+from app.services.groq_service import groq_service, GroqServiceError, CircuitOpenError
+from app.services.chat_pipeline import (
+    generate_answer,
+    get_cached_answer,
+    get_history,
+    remember_exchange,
+    store_answer
+)
+from app.services.conversation_store import conversation_store, estimate_tokens
+from app.services.response_cache import response_cache
+from app.services.singleflight import groq_singleflight
+from app.services.answer_store import answer_store
+from app.services.batch import BatchPlan, batch_outcome, batch_processor, summarize
+from app.services.knowledge_base import knowledge_base
+from app.services.capture import CaptureMiddleware, capture_writer
+from app.services.health import health_monitor
+from app.services.metrics import CONTENT_TYPE, TOKENS_USED, VALIDATION_SECONDS, metrics_registry, record_request
+from app.services.admission import AdmissionRejectedError, groq_admission
+from app.services.rate_limit import build_rate_limit_key, capture_rate_limit_identity, create_limiter, hit_rate_limit
+from app.services.warmup import cache_warmer
+from app.services.websocket import (
+    CLOSE_NORMAL,
+    CLOSE_POLICY_VIOLATION,
+    CLOSE_TRY_AGAIN_LATER,
+    SEND_DISCONNECTED_ERRORS,
+    MessageRateLimiter,
+    ws_hub
+)
+from app.services.token_budget import TokenBudgetExceededError, token_budget
+from app.utils.logger import get_logging_stats, logger, sample_request_logs
+from app.utils.responses import FastJSONResponse, chat_response, off_topic_response
+from app.utils.sse import SSE_HEADERS, SSE_MEDIA_TYPE, format_sse_event
+from app.utils.json_codec import dumps
 
 
 # Initialize FastAPI app
@@ -34,10 +76,17 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
-# Initialize rate limiter
-limiter = Limiter(key_func=get_remote_address)
+# Initialize rate limiter (storage and key configurable, see rate_limit.py)
+limiter = create_limiter()
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded) -> Response:
+    """Count the rejection, then answer 429 like slowapi does."""
+    record_request(request.url.path, "rate_limited")
+    return _rate_limit_exceeded_handler(request, exc)
+
 
 # Configure CORS
 app.add_middleware(
@@ -48,10 +97,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Sample chat requests to a JSONL file for replay
+if settings.CAPTURE_ENABLED:
+    app.add_middleware(CaptureMiddleware, writer=capture_writer, sample_rate=settings.CAPTURE_SAMPLE_RATE)
+
 # Log startup information
-logger.info(f"{settings.APP_NAME} v{settings.APP_VERSION} starting...")
-logger.info(f"Using Groq model: {settings.MODEL}")
-logger.info(f"API Key configured: {settings.mask_api_key()}")
+logger.info("%s v%s starting...", settings.APP_NAME, settings.APP_VERSION)
+logger.info("Using Groq model: %s", settings.MODEL)
+logger.info("API Key configured: %s", settings.mask_api_key())
 
 # Warn if API key is missing (but allow startup)
 if not settings.GROQ_API_KEY:
@@ -75,26 +128,105 @@ async def root():
 
 
 @app.get("/health", response_model=HealthCheckResponse)
-async def health_check():
+async def health_check(deep: bool = False):
     """
-    Detailed health check endpoint - Verifies Groq API connection.
+    Detailed health check endpoint - Reports Groq API connection.
+
+    Answers from the status cached by the background health monitor, so
+    frequent probes cost nothing upstream.
+
+    Args:
+        deep: Force a fresh Groq check (rate limited, ?deep=1)
 
     Returns:
         Detailed health status including Groq API connectivity
     """
-    logger.info("Health check endpoint accessed")
+    logger.debug("Health check endpoint accessed")
+    started = time.perf_counter()
+
+    if deep:
+        await health_monitor.deep_check()
 
-    # Check Groq API connection
-    groq_connection = await groq_service.check_connection()
+    if health_monitor.last_checked is None:
+        api_status = "starting"
+    else:
+        api_status = "ok" if health_monitor.groq_connection else "degraded"
 
+    record_request("/health", api_status, time.perf_counter() - started)
     return HealthCheckResponse(
-        api_status="ok" if groq_connection else "degraded",
-        groq_connection=groq_connection,
+        api_status=api_status,
+        groq_connection=health_monitor.groq_connection,
+        timestamp=get_current_timestamp(),
+        last_checked=health_monitor.last_checked,
+        upstream_latency_ms=health_monitor.latency_ms
+    )
+
+
+@app.get("/stats", response_model=StatsResponse)
+async def stats():
+    """
+    Runtime statistics endpoint - Exposes upstream connection reuse.
+
+    Returns:
+        Groq connection pool statistics
+    """
+    return StatsResponse(
+        groq_pool=groq_service.get_pool_stats(),
+        routing=groq_service.router.get_stats(),
+        output_budget=groq_service.output_budget.get_stats(),
+        cache=response_cache.get_stats(),
+        singleflight=groq_singleflight.get_stats(),
+        health=health_monitor.get_stats(),
+        conversations=conversation_store.get_stats(),
+        resilience=groq_service.get_resilience_stats(),
+        admission=groq_admission.get_stats(),
+        token_budget=token_budget.get_stats(),
+        logging=get_logging_stats(),
+        capture=capture_writer.get_stats(),
+        answer_store=answer_store.get_stats(),
+        warmup=cache_warmer.get_stats(),
+        knowledge_base=knowledge_base.get_stats(),
+        batch=batch_processor.get_stats(),
+        websocket=ws_hub.get_stats(),
         timestamp=get_current_timestamp()
     )
 
 
-@app.post("/chat", response_model=ChatResponse)
+@app.get("/quota", response_model=QuotaResponse)
+@limiter.limit(f"{settings.QUOTA_RATE_LIMIT_PER_MINUTE}/minute")
+async def quota(request: Request):
+    """
+    Token budget status endpoint - Shows what the caller has left.
+
+    Only the budget of the caller's IP is reported: user IDs are not
+    authenticated, so anyone could read another user's budget.
+
+    Args:
+        request: FastAPI request object (for the client IP)
+
+    Returns:
+        Per-IP token budget
+    """
+    return QuotaResponse(
+        enabled=settings.TOKEN_BUDGET_ENABLED,
+        budgets=token_budget.get_quota(None, get_remote_address(request)),
+        timestamp=get_current_timestamp()
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus metrics endpoint.
+
+    Returns:
+        Request outcomes, stage latency histograms, tokens and upstream
+        status codes in the Prometheus text exposition format
+    """
+    return PlainTextResponse(metrics_registry.render(), media_type=CONTENT_TYPE)
+
+
+@app.post("/chat", response_model=ChatResponse, dependencies=[Depends(capture_rate_limit_identity)])
 @limiter.limit(f"{settings.RATE_LIMIT_PER_MINUTE}/minute")
 async def chat(request: Request, chat_request: ChatRequest):
     """
@@ -110,44 +242,88 @@ async def chat(request: Request, chat_request: ChatRequest):
     Raises:
         HTTPException: On validation or service errors
     """
+    started = time.perf_counter()
+    outcome = "error"
+
     user_message = chat_request.message.strip()
     conversation_id = chat_request.conversation_id or generate_conversation_id()
     user_id = chat_request.user_id or "anonymous"
 
-    logger.info(f"Chat request from user: {user_id}, conversation: {conversation_id}")
-    logger.info(f"Message: {user_message[:100]}...")
+    # Per-message INFO lines are kept for a LOG_SAMPLE_RATE share of requests
+    sample_request_logs()
+    logger.info("Chat request from user: %s, conversation: %s", user_id, conversation_id)
+    logger.info("Message: %s...", user_message[:100])
 
     try:
         # Validate topic before calling Groq API (save tokens)
         is_valid, validation_reason = is_valid_herbalism_topic(user_message)
+        VALIDATION_SECONDS.observe(time.perf_counter() - started)
 
         if not is_valid:
-            logger.info(f"Off-topic question detected: {validation_reason}")
-            return ChatResponse(
-                response=get_off_topic_response(),
-                conversation_id=conversation_id,
-                timestamp=get_current_timestamp(),
-                is_valid_topic=False,
-                tokens_used=0
-            )
-
-        logger.info(f"Topic validation passed: {validation_reason}")
-
-        # Get response from Groq API
-        response_text, tokens_used = await groq_service.get_response(user_message)
+            logger.info("Off-topic question detected: %s", validation_reason)
+            outcome = "off_topic"
+            return off_topic_response(conversation_id, get_current_timestamp())
+
+        logger.info("Topic validation passed: %s", validation_reason)
+
+        # Get response from cache or Groq API
+        response_text, tokens_used, cached = await generate_answer(
+            user_message,
+            conversation_id,
+            user_id=chat_request.user_id,
+            client_ip=get_remote_address(request)
+        )
 
-        logger.info(f"Response generated successfully - Tokens: {tokens_used}")
+        logger.info("Response generated successfully - Tokens: %s, cached: %s", tokens_used, cached)
+        outcome = "valid"
+        TOKENS_USED.inc(tokens_used)
 
-        return ChatResponse(
+        return chat_response(
             response=response_text,
             conversation_id=conversation_id,
             timestamp=get_current_timestamp(),
             is_valid_topic=True,
-            tokens_used=tokens_used
+            tokens_used=tokens_used,
+            cached=cached
+        )
+
+    except TokenBudgetExceededError as e:
+        outcome = "quota_exceeded"
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "error": "Quota de tokens dépassé",
+                "detail": "Votre quota de réponses est épuisé pour le moment, veuillez réessayer plus tard"
+            },
+            headers={"Retry-After": str(max(int(e.retry_after), 1))}
+        )
+
+    except AdmissionRejectedError as e:
+        outcome = "overloaded"
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "error": "Service temporairement surchargé",
+                "detail": "Trop de demandes en cours, veuillez réessayer dans quelques secondes"
+            },
+            headers={"Retry-After": str(max(int(e.retry_after), 1))}
+        )
+
+    except CircuitOpenError as e:
+        logger.warning("Groq circuit open, failing fast: %s", e)
+        outcome = "groq_error"
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "error": "Service temporairement indisponible",
+                "detail": "L'API Groq est momentanément indisponible, veuillez réessayer plus tard"
+            },
+            headers={"Retry-After": str(max(int(e.retry_after or 0), 1))}
         )
 
     except GroqServiceError as e:
-        logger.error(f"Groq service error: {str(e)}")
+        logger.error("Groq service error: %s", e)
+        outcome = "groq_error"
         raise HTTPException(
             status_code=500,
             detail={
@@ -157,7 +333,7 @@ async def chat(request: Request, chat_request: ChatRequest):
         )
 
     except Exception as e:
-        logger.error(f"Unexpected error in chat endpoint: {str(e)}")
+        logger.error("Unexpected error in chat endpoint: %s", e)
         raise HTTPException(
             status_code=500,
             detail={
@@ -166,8 +342,11 @@ async def chat(request: Request, chat_request: ChatRequest):
             }
         )
 
+    finally:
+        record_request(request.url.path, outcome, time.perf_counter() - started)
+
 
-@app.post("/diane", response_model=ChatResponse)
+@app.post("/diane", response_model=ChatResponse, dependencies=[Depends(capture_rate_limit_identity)])
 @limiter.limit(f"{settings.RATE_LIMIT_PER_MINUTE}/minute")
 async def diane_endpoint(request: Request, chat_request: ChatRequest):
     """
@@ -181,6 +360,397 @@ async def diane_endpoint(request: Request, chat_request: ChatRequest):
     return await chat(request, chat_request)
 
 
+async def _chat_events(
+    user_message: str,
+    conversation_id: str,
+    is_valid: bool,
+    user_id: Optional[str] = None,
+    client_ip: Optional[str] = None,
+    endpoint: str = "/chat/stream",
+    started: Optional[float] = None
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Generate the events of a streamed chat answer (SSE and WebSocket).
+
+    Emits one "chunk" event per content delta from Groq, then a final "done"
+    event carrying the full ChatResponse. Off-topic questions short-circuit
+    into the "done" event alone, and cached answers are sent as one chunk.
+
+    The request is counted in the metrics once the stream ends, so its
+    duration covers the whole answer.
+    """
+    started = started or time.perf_counter()
+    outcome = "error"
+
+    try:
+        if not is_valid:
+            outcome = "off_topic"
+            yield ("done", ChatResponse(
+                response=get_off_topic_response(),
+                conversation_id=conversation_id,
+                timestamp=get_current_timestamp(),
+                is_valid_topic=False,
+                tokens_used=0
+            ).model_dump())
+            return
+
+        history = await get_history(conversation_id)
+
+        cache_key, cached_text = ("", "") if history else await get_cached_answer(user_message)
+        if cached_text:
+            logger.info("Streamed answer served from cache")
+            await remember_exchange(conversation_id, user_message, cached_text)
+            outcome = "valid"
+            yield ("chunk", {"content": cached_text})
+            yield ("done", ChatResponse(
+                response=cached_text,
+                conversation_id=conversation_id,
+                timestamp=get_current_timestamp(),
+                is_valid_topic=True,
+                tokens_used=0,
+                cached=True
+            ).model_dump())
+            return
+
+        try:
+            reservation = token_budget.reserve(user_id, client_ip, settings.MAX_TOKENS)
+        except TokenBudgetExceededError:
+            outcome = "quota_exceeded"
+            yield ("error", {
+                "error": "Quota de tokens dépassé",
+                "detail": "Votre quota de réponses est épuisé pour le moment, veuillez réessayer plus tard"
+            })
+            return
+
+        parts = []
+        tokens_used = 0
+        finish_reason = None
+        # Charged if the stream stops early: Groq may still be generating
+        # for a client that went away, so it keeps the whole reservation
+        tokens_charged = reservation.amount
+
+        try:
+            async with groq_admission.slot():
+                async for content, tokens, finish_reason in groq_service.stream_response(user_message, history):
+                    if content:
+                        parts.append(content)
+                        yield ("chunk", {"content": content})
+                    if tokens:
+                        tokens_used = tokens
+            tokens_charged = tokens_used
+
+        except AdmissionRejectedError:
+            tokens_charged = 0
+            outcome = "overloaded"
+            yield ("error", {
+                "error": "Service temporairement surchargé",
+                "detail": "Trop de demandes en cours, veuillez réessayer dans quelques secondes"
+            })
+            return
+
+        except GroqServiceError as e:
+            logger.error("Groq service error during streaming: %s", e)
+            # Only what was streamed before the failure was generated
+            tokens_charged = estimate_tokens("".join(parts)) if parts else 0
+            outcome = "groq_error"
+            yield ("error", {
+                "error": "Service temporairement indisponible",
+                "detail": "Erreur lors de la connexion à l'API Groq"
+            })
+            return
+
+        finally:
+            token_budget.settle(reservation, tokens_charged)
+
+        logger.info("Streamed response completed - Tokens: %s", tokens_used)
+
+        response_text = "".join(parts)
+        # A truncated answer is served once but never cached
+        if not history and finish_reason != "length":
+            store_answer(cache_key, response_text)
+        await remember_exchange(conversation_id, user_message, response_text)
+        outcome = "valid"
+        TOKENS_USED.inc(tokens_used)
+
+        yield ("done", ChatResponse(
+            response=response_text,
+            conversation_id=conversation_id,
+            timestamp=get_current_timestamp(),
+            is_valid_topic=True,
+            tokens_used=tokens_used
+        ).model_dump())
+
+    finally:
+        record_request(endpoint, outcome, time.perf_counter() - started)
+
+
+async def _stream_chat_events(*args: Any, **kwargs: Any) -> AsyncIterator[str]:
+    """Format the events of _chat_events as server-sent events."""
+    async for event, data in _chat_events(*args, **kwargs):
+        yield format_sse_event(event, data)
+
+
+@app.post("/chat/stream", response_class=StreamingResponse, dependencies=[Depends(capture_rate_limit_identity)])
+@limiter.limit(f"{settings.RATE_LIMIT_PER_MINUTE}/minute")
+async def chat_stream(request: Request, chat_request: ChatRequest):
+    """
+    Streaming chat endpoint - Forwards Diane's answer as server-sent events.
+
+    Args:
+        request: FastAPI request object (for rate limiting)
+        chat_request: User's chat request
+
+    Returns:
+        text/event-stream of "chunk" events followed by a "done" event
+        (or an "error" event if the Groq API fails)
+    """
+    user_message = chat_request.message.strip()
+    conversation_id = chat_request.conversation_id or generate_conversation_id()
+    user_id = chat_request.user_id or "anonymous"
+
+    started = time.perf_counter()
+    sample_request_logs()
+    logger.info("Streaming chat request from user: %s, conversation: %s", user_id, conversation_id)
+
+    is_valid, validation_reason = is_valid_herbalism_topic(user_message)
+    VALIDATION_SECONDS.observe(time.perf_counter() - started)
+    if not is_valid:
+        logger.info("Off-topic question detected: %s", validation_reason)
+
+    return StreamingResponse(
+        _stream_chat_events(
+            user_message,
+            conversation_id,
+            is_valid,
+            user_id=chat_request.user_id,
+            client_ip=get_remote_address(request),
+            endpoint=request.url.path,
+            started=started
+        ),
+        media_type=SSE_MEDIA_TYPE,
+        headers=SSE_HEADERS
+    )
+
+
+@app.post("/diane/stream", response_class=StreamingResponse, dependencies=[Depends(capture_rate_limit_identity)])
+@limiter.limit(f"{settings.RATE_LIMIT_PER_MINUTE}/minute")
+async def diane_stream_endpoint(request: Request, chat_request: ChatRequest):
+    """
+    Legacy streaming endpoint for the old WordPress widget.
+    Redirects to /chat/stream endpoint logic.
+    """
+    logger.info("Legacy /diane/stream endpoint called - redirecting to /chat/stream logic")
+    return await chat_stream(request, chat_request)
+
+
+async def _stream_batch_lines(
+    plan: BatchPlan,
+    client_ip: Optional[str],
+    endpoint: str,
+    started: float
+) -> AsyncIterator[bytes]:
+    """Yield one NDJSON line per batch item as it completes, then the summary."""
+    results = []
+    try:
+        async for result in batch_processor.run(plan, client_ip):
+            results.append(result)
+            TOKENS_USED.inc(result["tokens_used"])
+            yield dumps(result) + b"\n"
+        yield dumps({"summary": summarize(plan, results, time.perf_counter() - started)}) + b"\n"
+    finally:
+        record_request(endpoint, batch_outcome(results), time.perf_counter() - started)
+
+
+@app.post("/chat/batch", response_model=BatchChatResponse, dependencies=[Depends(capture_rate_limit_identity)])
+@limiter.limit(f"{settings.BATCH_RATE_LIMIT_PER_MINUTE}/minute")
+async def chat_batch(request: Request, batch_request: BatchChatRequest):
+    """
+    Batch chat endpoint - Answer a list of questions in one request.
+
+    Questions are validated in one pass, duplicates (after normalization)
+    are answered once, and at most BATCH_CONCURRENCY questions are sent
+    to Groq at a time. Each answered question is charged to the token
+    budgets like a /chat request; failures are reported per item.
+
+    Args:
+        request: FastAPI request object (for rate limiting)
+        batch_request: Questions to answer
+
+    Returns:
+        Results in request order with the aggregate summary, or with
+        stream=true an application/x-ndjson stream of results in
+        completion order followed by a {"summary": ...} line
+    """
+    started = time.perf_counter()
+    plan = batch_processor.plan(batch_request.items, batch_request.user_id)
+    client_ip = get_remote_address(request)
+
+    if batch_request.stream:
+        return StreamingResponse(
+            _stream_batch_lines(plan, client_ip, request.url.path, started),
+            media_type="application/x-ndjson"
+        )
+
+    results = []
+    try:
+        async for result in batch_processor.run(plan, client_ip):
+            results.append(result)
+            TOKENS_USED.inc(result["tokens_used"])
+    finally:
+        record_request(request.url.path, batch_outcome(results), time.perf_counter() - started)
+
+    results.sort(key=lambda result: result["index"])
+    return FastJSONResponse({
+        "results": results,
+        "summary": summarize(plan, results, time.perf_counter() - started)
+    })
+
+
+class _SlowConsumerError(Exception):
+    """Raised when a WebSocket client does not read its frames in time."""
+
+
+async def _ws_send(websocket: WebSocket, event: str, data: Dict[str, Any]) -> None:
+    """
+    Send one event frame, waiting for the client to keep up.
+
+    The send completes once the server's write buffer has drained, so a
+    slow reader slows down the answer it receives (and the Groq stream
+    behind it) instead of buffering it in memory. A client that does not
+    read for WS_SEND_TIMEOUT is dropped, and a client that went away
+    mid-send ends the connection like a disconnect.
+    """
+    frame = dumps({"event": event, "data": data}).decode("utf-8")
+    try:
+        await asyncio.wait_for(websocket.send_text(frame), settings.WS_SEND_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise _SlowConsumerError()
+    except SEND_DISCONNECTED_ERRORS as e:
+        raise WebSocketDisconnect() from e
+
+
+async def _ws_send_rate_limited(websocket: WebSocket, retry_after: float) -> None:
+    """Tell the client its message was dropped by a rate limit."""
+    ws_hub.rate_limited += 1
+    await _ws_send(websocket, "error", {
+        "error": "Trop de requêtes",
+        "detail": "Vous envoyez trop de messages, veuillez patienter",
+        "retry_after": math.ceil(retry_after)
+    })
+
+
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket):
+    """
+    WebSocket chat endpoint - One connection per visitor session.
+
+    The client sends JSON messages with the /chat request fields; the
+    conversation_id defaults to the connection's (sent in the "ready"
+    event, or taken from the ?conversation_id= query parameter). Each
+    question is answered with the same events as /chat/stream ("chunk"
+    then "done", or "error"), as {"event": ..., "data": ...} frames.
+
+    Questions are answered one at a time: the next message is not read
+    until the current answer is sent, so a client sending faster than
+    it is answered is held back by the transport. Messages are limited
+    to WS_MESSAGES_PER_MINUTE per connection and count against the same
+    RATE_LIMIT_PER_MINUTE counter as /chat per IP (or RATE_LIMIT_KEY),
+    across connections. Connections idle for WS_IDLE_TIMEOUT seconds are
+    closed.
+    """
+    client_ip = websocket.client.host if websocket.client else "unknown"
+    rejected = ws_hub.open(websocket.headers.get("origin"), client_ip)
+    if rejected:
+        logger.warning("WebSocket connection rejected (%s) from %s", rejected, client_ip)
+        # Closing before accept() refuses the handshake
+        await websocket.close(code=CLOSE_POLICY_VIOLATION if rejected == "origin" else CLOSE_TRY_AGAIN_LATER)
+        return
+
+    conversation_id = websocket.query_params.get("conversation_id") or generate_conversation_id()
+    message_limiter = MessageRateLimiter(settings.WS_MESSAGES_PER_MINUTE)
+    close_reason = "client"
+
+    try:
+        await websocket.accept()
+        await _ws_send(websocket, "ready", {"conversation_id": conversation_id})
+
+        while True:
+            try:
+                message = await asyncio.wait_for(websocket.receive(), settings.WS_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                close_reason = "idle"
+                await websocket.close(code=CLOSE_NORMAL, reason="idle timeout")
+                return
+            if message["type"] == "websocket.disconnect":
+                return
+
+            retry_after = message_limiter.acquire()
+            if retry_after:
+                await _ws_send_rate_limited(websocket, retry_after)
+                continue
+
+            try:
+                chat_request = ChatRequest.model_validate_json(message.get("text") or message.get("bytes") or b"")
+            except ValidationError as e:
+                await _ws_send(websocket, "error", {
+                    "error": "Requête invalide",
+                    "detail": e.errors(include_url=False, include_context=False)[0]["msg"]
+                })
+                continue
+
+            # Counted on /chat's per-IP (or per-user) counter, whatever the number of connections
+            retry_after = hit_rate_limit(
+                limiter,
+                f"{settings.RATE_LIMIT_PER_MINUTE}/minute",
+                build_rate_limit_key(chat_request.model_dump(), client_ip),
+                "/chat"
+            )
+            if retry_after:
+                await _ws_send_rate_limited(websocket, retry_after)
+                continue
+
+            ws_hub.messages += 1
+            started = time.perf_counter()
+            user_message = chat_request.message.strip()
+            conversation_id = chat_request.conversation_id or conversation_id
+            sample_request_logs()
+            logger.info("WebSocket chat message from user: %s, conversation: %s", chat_request.user_id or "anonymous", conversation_id)
+
+            is_valid, validation_reason = is_valid_herbalism_topic(user_message)
+            VALIDATION_SECONDS.observe(time.perf_counter() - started)
+            if not is_valid:
+                logger.info("Off-topic question detected: %s", validation_reason)
+
+            events = _chat_events(
+                user_message,
+                conversation_id,
+                is_valid,
+                user_id=chat_request.user_id,
+                client_ip=client_ip,
+                endpoint="/ws/chat",
+                started=started
+            )
+            # Closing the generator releases its Groq slot and token reservation
+            async with aclosing(events):
+                async for event, data in events:
+                    await _ws_send(websocket, event, data)
+
+    except WebSocketDisconnect:
+        pass
+
+    except _SlowConsumerError:
+        close_reason = "slow_consumer"
+        logger.warning("Closing WebSocket of %s: client not reading", client_ip)
+        try:
+            # The close frame may itself be stuck behind unread data
+            await asyncio.wait_for(websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason="slow consumer"), 1.0)
+        except Exception:
+            pass
+
+    finally:
+        ws_hub.close(client_ip, close_reason)
+
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """
@@ -195,7 +765,8 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     """
     return JSONResponse(
         status_code=exc.status_code,
-        content=exc.detail if isinstance(exc.detail, dict) else {"error": str(exc.detail)}
+        content=exc.detail if isinstance(exc.detail, dict) else {"error": str(exc.detail)},
+        headers=getattr(exc, "headers", None)
     )
 
 
@@ -211,7 +782,7 @@ async def general_exception_handler(request: Request, exc: Exception):
     Returns:
         JSON error response
     """
-    logger.error(f"Unhandled exception: {str(exc)}")
+    logger.error("Unhandled exception: %s", exc)
     return JSONResponse(
         status_code=500,
         content={
@@ -225,16 +796,46 @@ async def general_exception_handler(request: Request, exc: Exception):
 @app.on_event("startup")
 async def startup_event():
     """Execute on application startup."""
-    logger.info(f"{settings.APP_NAME} started successfully")
-    logger.info(f"CORS enabled for origins: {settings.ALLOWED_ORIGINS}")
-    logger.info(f"Rate limit: {settings.RATE_LIMIT_PER_MINUTE} requests/minute")
+    logger.info("%s started successfully", settings.APP_NAME)
+    logger.info("CORS enabled for origins: %s", settings.ALLOWED_ORIGINS)
+    logger.info("Rate limit: %s requests/minute", settings.RATE_LIMIT_PER_MINUTE)
+
+    # Open the pooled Groq HTTP client once for the whole process
+    await groq_service.start()
+
+    # Probe Groq in the background; /health answers from the cached status
+    health_monitor.start()
+
+    if settings.CAPTURE_ENABLED:
+        capture_writer.start()
+
+    # Answers are read from disk on demand; only compaction is scheduled
+    if settings.ANSWER_STORE_ENABLED:
+        answer_store.start()
+
+    # Answer frequent questions in the background; requests are served meanwhile
+    if settings.WARMUP_ENABLED and settings.CACHE_ENABLED and settings.GROQ_API_KEY:
+        cache_warmer.start(settings.WARMUP_PATH, settings.WARMUP_MAX_QUESTIONS)
 
 
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
     """Execute on application shutdown."""
-    logger.info(f"{settings.APP_NAME} shutting down")
+    logger.info("%s shutting down", settings.APP_NAME)
+
+    await health_monitor.stop()
+    await cache_warmer.stop()
+
+    # Write the captures still queued
+    capture_writer.stop()
+
+    # Finish pending answer writes before the disk goes away
+    if settings.ANSWER_STORE_ENABLED:
+        await answer_store.close()
+
+    # Close pooled upstream connections
+    await groq_service.close()
 
 
 if __name__ == "__main__":
@@ -3,9 +3,10 @@ Pydantic models for request and response validation.
 """
 
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field
 import uuid
+from app.config import settings
 
 
 class ChatRequest(BaseModel):
@@ -39,6 +40,7 @@ class ChatResponse(BaseModel):
     timestamp: str = Field(..., description="ISO 8601 timestamp")
     is_valid_topic: bool = Field(..., description="Whether the question was about herbalism")
     tokens_used: int = Field(..., description="Number of tokens used in API call")
+    cached: bool = Field(default=False, description="Whether the answer was served from cache (no tokens spent)")
 
     class Config:
         json_schema_extra = {
@@ -47,7 +49,103 @@ class ChatResponse(BaseModel):
                 "conversation_id": "550e8400-e29b-41d4-a716-446655440000",
                 "timestamp": "2025-11-13T14:30:00Z",
                 "is_valid_topic": True,
-                "tokens_used": 380
+                "tokens_used": 380,
+                "cached": False
+            }
+        }
+
+
+class BatchChatRequest(BaseModel):
+    """Request model for /chat/batch endpoint."""
+
+    items: List[ChatRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=settings.BATCH_MAX_ITEMS,
+        description="Questions to answer, in order"
+    )
+    user_id: Optional[str] = Field(
+        default=None,
+        description="Optional WordPress user ID, for items without their own"
+    )
+    stream: bool = Field(
+        default=False,
+        description="Stream results as NDJSON, one line per item as it completes, then a summary line"
+    )
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "items": [
+                    {"message": "Bienfaits du thym ?"},
+                    {"message": "Quelles plantes pour le sommeil ?"}
+                ],
+                "user_id": "wp_editor_1",
+                "stream": False
+            }
+        }
+
+
+class BatchChatItem(BaseModel):
+    """Answer to one item of a batch."""
+
+    index: int = Field(..., description="Position of the item in the request")
+    response: str = Field(..., description="HTML-formatted response from Diane (empty on error)")
+    conversation_id: str = Field(..., description="Conversation UUID")
+    timestamp: str = Field(..., description="ISO 8601 timestamp")
+    is_valid_topic: bool = Field(..., description="Whether the question was about herbalism")
+    tokens_used: int = Field(..., description="Tokens spent on this item (0 for duplicates and cached answers)")
+    cached: bool = Field(..., description="Whether the answer came from cache or a duplicate question")
+    error: Optional[str] = Field(
+        default=None,
+        description="Failure code: quota_exceeded, overloaded, groq_error or error"
+    )
+
+
+class BatchSummary(BaseModel):
+    """Aggregate accounting of a batch."""
+
+    items: int = Field(..., description="Number of items")
+    unique_questions: int = Field(..., description="Distinct on-topic questions answered")
+    off_topic: int = Field(..., description="Items rejected as off-topic")
+    cached: int = Field(..., description="Items answered from cache or from a duplicate")
+    errors: int = Field(..., description="Items that failed")
+    tokens_used: int = Field(..., description="Tokens spent by the whole batch")
+    duration_ms: float = Field(..., description="Processing time in milliseconds")
+    timestamp: str = Field(..., description="ISO 8601 timestamp")
+
+
+class BatchChatResponse(BaseModel):
+    """Response model for /chat/batch endpoint."""
+
+    results: List[BatchChatItem] = Field(..., description="Answers in request order")
+    summary: BatchSummary = Field(..., description="Aggregate token and item accounting")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "results": [
+                    {
+                        "index": 0,
+                        "response": "<p>Le thym est antiseptique...</p>",
+                        "conversation_id": "550e8400-e29b-41d4-a716-446655440000",
+                        "timestamp": "2025-11-13T14:30:00Z",
+                        "is_valid_topic": True,
+                        "tokens_used": 380,
+                        "cached": False,
+                        "error": None
+                    }
+                ],
+                "summary": {
+                    "items": 1,
+                    "unique_questions": 1,
+                    "off_topic": 0,
+                    "cached": 0,
+                    "errors": 0,
+                    "tokens_used": 380,
+                    "duration_ms": 1240.5,
+                    "timestamp": "2025-11-13T14:30:01Z"
+                }
             }
         }
 
@@ -90,12 +188,184 @@ class HealthCheckResponse(BaseModel):
     api_status: str = Field(..., description="API status")
     groq_connection: bool = Field(..., description="Groq API connection status")
     timestamp: str = Field(..., description="ISO 8601 timestamp")
+    last_checked: Optional[str] = Field(None, description="ISO 8601 timestamp of the last Groq probe")
+    upstream_latency_ms: Optional[float] = Field(None, description="Latency of the last Groq probe")
 
     class Config:
         json_schema_extra = {
             "example": {
                 "api_status": "ok",
                 "groq_connection": True,
+                "timestamp": "2025-11-13T14:30:00Z",
+                "last_checked": "2025-11-13T14:29:40Z",
+                "upstream_latency_ms": 84.2
+            }
+        }
+
+
+class StatsResponse(BaseModel):
+    """Runtime statistics response model."""
+
+    groq_pool: Dict[str, Any] = Field(..., description="Groq HTTP connection pool statistics")
+    routing: Dict[str, Any] = Field(..., description="Model routing decisions and fallbacks")
+    output_budget: Dict[str, Any] = Field(..., description="Adaptive max_tokens and finish reason statistics")
+    cache: Dict[str, Any] = Field(..., description="Response cache statistics")
+    singleflight: Dict[str, Any] = Field(..., description="Coalesced in-flight request statistics")
+    health: Dict[str, Any] = Field(..., description="Background health monitor statistics")
+    conversations: Dict[str, Any] = Field(..., description="Conversation memory statistics")
+    resilience: Dict[str, Any] = Field(..., description="Retry and circuit breaker statistics")
+    admission: Dict[str, Any] = Field(..., description="Upstream concurrency and queue statistics")
+    token_budget: Dict[str, Any] = Field(..., description="Per-user and per-IP token budget statistics")
+    logging: Dict[str, Any] = Field(..., description="Log queue statistics")
+    capture: Dict[str, Any] = Field(..., description="Traffic capture statistics")
+    answer_store: Dict[str, Any] = Field(..., description="Persistent answer store statistics")
+    warmup: Dict[str, Any] = Field(..., description="Startup cache warm-up statistics")
+    knowledge_base: Dict[str, Any] = Field(..., description="Plant knowledge base statistics")
+    batch: Dict[str, Any] = Field(..., description="Batch chat statistics")
+    websocket: Dict[str, Any] = Field(..., description="WebSocket chat connection statistics")
+    timestamp: str = Field(..., description="ISO 8601 timestamp")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "groq_pool": {
+                    "client_open": True,
+                    "http2": True,
+                    "requests_sent": 120,
+                    "connections_opened": 2,
+                    "requests_reusing_connection": 118,
+                    "reuse_ratio": 0.983
+                },
+                "routing": {
+                    "enabled": True,
+                    "decisions": {"small:simple": 71, "large:sensitive": 18, "large:long": 6},
+                    "fallbacks": 1
+                },
+                "output_budget": {
+                    "enabled": True,
+                    "classes": {
+                        "simple": {"samples": 71, "p50_tokens": 310, "p95_tokens": 402, "ratio": 1.09, "max_tokens": 480}
+                    },
+                    "finish_reasons": {"simple:stop": 40, "simple:disclaimer": 31, "sensitive:length": 1},
+                    "truncation_rate": 0.011
+                },
+                "cache": {
+                    "entries": 42,
+                    "hits": 310,
+                    "misses": 95,
+                    "hit_ratio": 0.765
+                },
+                "singleflight": {
+                    "inflight": 1,
+                    "calls": 95,
+                    "coalesced": 12,
+                    "coalesced_ratio": 0.112
+                },
+                "health": {
+                    "groq_connection": True,
+                    "last_checked": "2025-11-13T14:29:40Z",
+                    "latency_ms": 84.2,
+                    "checks": 61
+                },
+                "conversations": {
+                    "backend": "memory",
+                    "conversations": 18,
+                    "size_bytes": 40210
+                },
+                "resilience": {
+                    "retries": 3,
+                    "circuit_breaker": {
+                        "state": "closed",
+                        "transitions": {"closed->open": 1, "open->half_open": 1, "half_open->closed": 1}
+                    }
+                },
+                "admission": {
+                    "active": 3,
+                    "queue_depth": 0,
+                    "rejected_queue_full": 0,
+                    "avg_wait_ms": 12.5
+                },
+                "token_budget": {
+                    "tracked_budgets": 57,
+                    "reservations": 95,
+                    "rejections": 2,
+                    "tokens_charged": 41230
+                },
+                "logging": {
+                    "queue_depth": 0,
+                    "enqueued": 5120,
+                    "dropped": 0
+                },
+                "capture": {
+                    "enabled": False,
+                    "captured": 0,
+                    "dropped": 0
+                },
+                "answer_store": {
+                    "enabled": True,
+                    "entries": 812,
+                    "hits": 57,
+                    "writes": 95
+                },
+                "warmup": {
+                    "state": "done",
+                    "warmed": 38,
+                    "already_cached": 12,
+                    "duration_seconds": 14.2
+                },
+                "knowledge_base": {
+                    "enabled": True,
+                    "plants": 22,
+                    "searches": 431,
+                    "avg_search_us": 11.8,
+                    "direct_answers": 0
+                },
+                "batch": {
+                    "batches": 3,
+                    "items": 120,
+                    "duplicates": 14,
+                    "tokens_used": 36400
+                },
+                "websocket": {
+                    "active": 42,
+                    "peak": 118,
+                    "messages": 930,
+                    "rate_limited": 3
+                },
+                "timestamp": "2025-11-13T14:30:00Z"
+            }
+        }
+
+
+class QuotaResponse(BaseModel):
+    """Token budget status response model."""
+
+    enabled: bool = Field(..., description="Whether token budgets are enforced")
+    budgets: Dict[str, Dict[str, Any]] = Field(..., description="Budgets charged to the caller, by scope")
+    timestamp: str = Field(..., description="ISO 8601 timestamp")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "enabled": True,
+                "budgets": {
+                    "user_id": {
+                        "key": "user_id:wp_user_123",
+                        "capacity": 20000,
+                        "remaining": 18460,
+                        "used": 1540,
+                        "window_seconds": 3600,
+                        "full_in_seconds": 277.2
+                    },
+                    "ip": {
+                        "key": "ip:203.0.113.7",
+                        "capacity": 60000,
+                        "remaining": 58460,
+                        "used": 1540,
+                        "window_seconds": 3600,
+                        "full_in_seconds": 92.4
+                    }
+                },
                 "timestamp": "2025-11-13T14:30:00Z"
             }
         }
@@ -2,6 +2,8 @@
 System prompts for Diane chatbot.
 """
 
+import hashlib
+
 DIANE_SYSTEM_PROMPT = """Tu es Diane, herboriste diplômée avec 15 ans d'expérience en phytothérapie.
 
 🎯 TON RÔLE EXCLUSIF :
@@ -55,4 +57,10 @@ Termine CHAQUE conseil médical par :
 "⚠️ Ces informations sont éducatives. Consultez un professionnel avant utilisation, surtout si enceinte, allaitante, sous traitement ou pour un enfant."
 """
 
+MEDICAL_DISCLAIMER = "⚠️ Ces informations sont éducatives. Consultez un professionnel avant utilisation, surtout si enceinte, allaitante, sous traitement ou pour un enfant."
+
 OFF_TOPIC_RESPONSE = """<p>Je suis désolée, mais je suis spécialisée exclusivement en herboristerie et plantes médicinales. Avez-vous une question sur les plantes médicinales ?</p>"""
+
+# Short fingerprint of the system prompt, used to invalidate cached answers
+# whenever the prompt is edited
+DIANE_PROMPT_VERSION = hashlib.sha256(DIANE_SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
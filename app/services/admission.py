@@ -0,0 +1,158 @@
+"""
+Admission control for upstream Groq calls.
+Bounds the number of concurrent calls and the number of requests waiting
+for a slot, so bursts queue briefly or fail fast instead of triggering
+cascading 429s from Groq.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict
+from app.config import settings
+from app.utils.logger import logger
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when a request cannot get an upstream slot in time."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Concurrency limiter with a bounded FIFO wait queue and queue deadline."""
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float, retry_after: float):
+        """
+        Initialize the controller.
+
+        Args:
+            max_concurrency: Maximum concurrent upstream calls
+            max_queue: Maximum requests waiting for a slot
+            queue_timeout: Maximum seconds a request may wait for a slot
+            retry_after: Retry-After hint (seconds) sent on rejection
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.max_queue_depth = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of requests currently waiting for a slot."""
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        """
+        Wait for an upstream slot.
+
+        Raises:
+            AdmissionRejectedError: If the queue is full or the wait times out
+        """
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_queue_full += 1
+            logger.warning("Upstream queue full (%s waiting), rejecting request", self.max_queue)
+            raise AdmissionRejectedError("Upstream queue full", retry_after=self.retry_after)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        started = time.perf_counter()
+
+        try:
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            self.rejected_timeout += 1
+            self._record_wait(time.perf_counter() - started)
+            logger.warning("Upstream queue wait exceeded %ss, rejecting request", self.queue_timeout)
+            raise AdmissionRejectedError("Upstream queue timeout", retry_after=self.retry_after)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled: pass it on
+                self.release()
+            else:
+                self._discard(waiter)
+            raise
+
+        self._record_wait(time.perf_counter() - started)
+        self.admitted += 1
+
+    def release(self) -> None:
+        """Release a slot, handing it directly to the next waiter if any."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot changes hands without active dropping
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold an upstream slot for the duration of the block."""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _discard(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _record_wait(self, seconds: float) -> None:
+        self.total_wait_seconds += seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get admission statistics.
+
+        Returns:
+            Dictionary with concurrency, queue depth and wait time metrics
+        """
+        return {
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "max_queue_depth_seen": self.max_queue_depth,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_wait_ms": round(self.total_wait_seconds / self.queued * 1000, 1) if self.queued else 0.0,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 1)
+        }
+
+
+# Create singleton instance
+groq_admission = AdmissionController(
+    max_concurrency=settings.UPSTREAM_MAX_CONCURRENCY,
+    max_queue=settings.UPSTREAM_MAX_QUEUE,
+    queue_timeout=settings.UPSTREAM_QUEUE_TIMEOUT,
+    retry_after=settings.UPSTREAM_RETRY_AFTER
+)
@@ -0,0 +1,257 @@
+"""
+Persistent answer store backing the in-memory response cache.
+Answers are kept in SQLite (WAL mode) so they survive restarts: after a
+cold start, questions already answered are served from disk instead of
+paying full Groq latency again.
+"""
+
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from app.config import settings
+from app.utils.logger import logger
+
+
+class PersistentAnswerStore:
+    """
+    SQLite answer store accessed from one dedicated thread.
+
+    Every database operation runs on a single-thread executor, so the
+    event loop never blocks on disk I/O and the connection is only used
+    from the thread that owns it. Nothing is loaded at startup: entries
+    are read on demand when the in-memory cache misses. Writes are
+    fire-and-forget. A background task periodically drops expired
+    entries and evicts the least recently used ones beyond the size bounds.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        compact_interval: float
+    ):
+        """
+        Initialize the store (the database is opened on first use).
+
+        Args:
+            path: SQLite database file
+            max_entries: Maximum number of stored answers
+            max_bytes: Maximum total size of stored answers (UTF-8 bytes)
+            ttl_seconds: Age after which an answer is no longer served
+            compact_interval: Seconds between compactions
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.compact_interval = compact_interval
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="answer-store")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.submitted = 0
+        self.writes = 0
+        self.write_errors = 0
+        self.read_errors = 0
+        self.evictions = 0
+        self.compactions = 0
+        self.entries = 0
+        self.size_bytes = 0
+
+    # The methods below run on the store thread only
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+            self._conn = conn
+        return self._conn
+
+    def _get(self, key: str, allow_expired: bool) -> Optional[str]:
+        conn = self._connection()
+        row = conn.execute("SELECT response, created_at FROM answers WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        response_text, created_at = row
+        now = time.time()
+        if not allow_expired and now - created_at > self.ttl_seconds:
+            return None
+        conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+        return response_text
+
+    def _put(self, key: str, response_text: str) -> None:
+        try:
+            now = time.time()
+            self._connection().execute(
+                "INSERT OR REPLACE INTO answers (key, response, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, response_text, len(response_text.encode("utf-8")), now, now)
+            )
+            self.writes += 1
+        except sqlite3.Error as e:
+            self.write_errors += 1
+            logger.error("Answer store write failed: %s", e)
+
+    def _compact(self) -> int:
+        conn = self._connection()
+        before = conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+        conn.execute("DELETE FROM answers WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        # Keep the most recently used answers that fit both bounds
+        conn.execute(
+            "DELETE FROM answers WHERE key IN ("
+            " SELECT key FROM ("
+            "  SELECT key,"
+            "   SUM(size) OVER (ORDER BY last_used DESC ROWS UNBOUNDED PRECEDING) AS running_bytes,"
+            "   ROW_NUMBER() OVER (ORDER BY last_used DESC) AS position"
+            "  FROM answers)"
+            " WHERE running_bytes > ? OR position > ?)",
+            (self.max_bytes, self.max_entries)
+        )
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        self.entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers").fetchone()
+        self.size_bytes = size
+        self.compactions += 1
+        return before - self.entries
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # Event loop API
+
+    async def _run_on_store_thread(self, fn: Any, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def get(self, key: str, allow_expired: bool = False) -> Optional[str]:
+        """
+        Look up an answer without blocking the event loop.
+
+        Args:
+            key: Cache key from make_cache_key
+            allow_expired: Also return answers older than the TTL (fallback
+                while Groq is unavailable)
+
+        Returns:
+            Stored response text, or None
+        """
+        try:
+            response_text = await self._run_on_store_thread(self._get, key, allow_expired)
+        except sqlite3.Error as e:
+            self.read_errors += 1
+            logger.error("Answer store read failed: %s", e)
+            return None
+
+        if response_text is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response_text
+
+    def put(self, key: str, response_text: str) -> Future:
+        """
+        Store an answer in the background.
+
+        Args:
+            key: Cache key from make_cache_key
+            response_text: HTML answer to store
+
+        Returns:
+            Future completed once the answer is written
+        """
+        self.submitted += 1
+        return self._executor.submit(self._put, key, response_text)
+
+    async def compact(self) -> int:
+        """
+        Drop expired answers and evict beyond max_entries / max_bytes.
+
+        Returns:
+            Number of answers removed
+        """
+        removed = await self._run_on_store_thread(self._compact)
+        self.evictions += removed
+        if removed:
+            logger.info("Answer store compacted - removed: %s, kept: %s", removed, self.entries)
+        return removed
+
+    async def _run(self) -> None:
+        """Background compaction loop."""
+        while True:
+            try:
+                await self.compact()
+            except Exception as e:
+                logger.error("Answer store compaction failed: %s", e)
+            await asyncio.sleep(self.compact_interval)
+
+    def start(self) -> None:
+        """Start scheduled compaction (called on application startup)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info("Answer store enabled - path: %s", self.path)
+
+    async def close(self) -> None:
+        """Stop compaction, finish pending writes and close the database."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._run_on_store_thread(self._close)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get store statistics.
+
+        Returns:
+            Dictionary with hit/miss counters and the size at last compaction
+        """
+        lookups = self.hits + self.misses
+        return {
+            "enabled": settings.ANSWER_STORE_ENABLED,
+            "path": self.path,
+            "entries": self.entries,
+            "size_bytes": self.size_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "writes": self.writes,
+            "pending_writes": self.submitted - self.writes - self.write_errors,
+            "evictions": self.evictions,
+            "compactions": self.compactions,
+            "read_errors": self.read_errors,
+            "write_errors": self.write_errors
+        }
+
+
+# Create singleton instance
+answer_store = PersistentAnswerStore(
+    path=settings.ANSWER_STORE_PATH,
+    max_entries=settings.ANSWER_STORE_MAX_ENTRIES,
+    max_bytes=settings.ANSWER_STORE_MAX_BYTES,
+    ttl_seconds=settings.ANSWER_STORE_TTL_SECONDS,
+    compact_interval=settings.ANSWER_STORE_COMPACT_INTERVAL
+)
@@ -0,0 +1,295 @@
+"""
+Batch answering for /chat/batch.
+Validates every question up front, answers each distinct question once and
+runs the Groq calls with bounded concurrency, yielding results as they
+complete.
+"""
+
+import asyncio
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional
+from app.config import settings
+from app.models import generate_conversation_id, get_current_timestamp
+from app.services.admission import AdmissionRejectedError
+from app.services.chat_pipeline import generate_answer, remember_exchange
+from app.services.groq_service import GroqServiceError
+from app.services.token_budget import TokenBudgetExceededError
+from app.services.validator import get_off_topic_response, is_valid_herbalism_topic
+from app.utils.logger import logger
+from app.utils.text import normalize_message
+
+
+class BatchItem(NamedTuple):
+    """One question of a batch, with its position in the request."""
+
+    index: int
+    message: str
+    conversation_id: str
+    user_id: Optional[str]
+    follow_up: bool
+
+
+class BatchPlan(NamedTuple):
+    """Validated batch: off-topic items and groups of on-topic items."""
+
+    items: int
+    off_topic: List[BatchItem]
+    groups: List[List[BatchItem]]
+
+    @property
+    def unique_questions(self) -> int:
+        """Questions needing their own answer (duplicates share one)."""
+        return sum(len(group) if group[0].follow_up else 1 for group in self.groups)
+
+    @property
+    def duplicates(self) -> int:
+        return self.items - len(self.off_topic) - self.unique_questions
+
+
+def summarize(plan: BatchPlan, results: List[Dict[str, Any]], seconds: float) -> Dict[str, Any]:
+    """
+    Build the aggregate accounting of a batch (the BatchSummary fields).
+
+    Args:
+        plan: Batch from BatchProcessor.plan()
+        results: Item results received so far
+        seconds: Processing time
+
+    Returns:
+        Summary dictionary
+    """
+    return {
+        "items": plan.items,
+        "unique_questions": plan.unique_questions,
+        "off_topic": len(plan.off_topic),
+        "cached": sum(1 for r in results if r["cached"]),
+        "errors": sum(1 for r in results if r["error"] is not None),
+        "tokens_used": sum(r["tokens_used"] for r in results),
+        "duration_ms": round(seconds * 1000, 1),
+        "timestamp": get_current_timestamp()
+    }
+
+
+def error_code(error: Exception) -> str:
+    """Map an answering failure to the code reported for the item."""
+    if isinstance(error, TokenBudgetExceededError):
+        return "quota_exceeded"
+    if isinstance(error, AdmissionRejectedError):
+        return "overloaded"
+    if isinstance(error, GroqServiceError):
+        return "groq_error"
+    return "error"
+
+
+def batch_outcome(results: List[Dict[str, Any]]) -> str:
+    """
+    Get the outcome recorded in the request metrics for a batch.
+
+    Args:
+        results: Item results received so far
+
+    Returns:
+        The most frequent item error code (quota_exceeded, overloaded,
+        groq_error or error) if any item failed, off_topic if every item
+        was off-topic, otherwise valid
+    """
+    errors = Counter(r["error"] for r in results if r["error"] is not None)
+    if errors:
+        return errors.most_common(1)[0][0]
+    if results and not any(r["is_valid_topic"] for r in results):
+        return "off_topic"
+    return "valid"
+
+
+def item_result(
+    item: BatchItem,
+    response: str = "",
+    is_valid_topic: bool = True,
+    tokens_used: int = 0,
+    cached: bool = False,
+    error: Optional[str] = None
+) -> Dict[str, Any]:
+    """Build the result of one item (the BatchChatItem fields)."""
+    return {
+        "index": item.index,
+        "response": response,
+        "conversation_id": item.conversation_id,
+        "timestamp": get_current_timestamp(),
+        "is_valid_topic": is_valid_topic,
+        "tokens_used": tokens_used,
+        "cached": cached,
+        "error": error
+    }
+
+
+class BatchProcessor:
+    """
+    Answer lists of questions with deduplication and bounded concurrency.
+
+    Questions without a conversation_id are grouped by normalized text:
+    each group is answered once and duplicates share the answer
+    (tokens_used=0, cached=True). Questions continuing a conversation
+    depend on its history, so the ones sharing a conversation_id are
+    answered in order, one after the other. At most `concurrency` groups
+    are answered at a time; the admission controller still bounds Groq
+    calls across all requests.
+    """
+
+    def __init__(self, concurrency: int):
+        """
+        Initialize the processor.
+
+        Args:
+            concurrency: Maximum groups answered at the same time per batch
+        """
+        self.concurrency = concurrency
+
+        self.batches = 0
+        self.items = 0
+        self.off_topic = 0
+        self.duplicates = 0
+        self.errors = 0
+        self.tokens_used = 0
+
+    async def _answer_group(
+        self,
+        items: List[BatchItem],
+        client_ip: Optional[str],
+        semaphore: asyncio.Semaphore,
+        results: "asyncio.Queue[Dict[str, Any]]"
+    ) -> None:
+        """Answer one group of items and queue their results."""
+        async with semaphore:
+            if items[0].follow_up:
+                for item in items:
+                    await results.put(await self._answer_item(item, client_ip))
+                return
+
+            leader, duplicates = items[0], items[1:]
+            result = await self._answer_item(leader, client_ip)
+            await results.put(result)
+            for item in duplicates:
+                if result["error"] is None:
+                    try:
+                        await remember_exchange(item.conversation_id, item.message, result["response"])
+                    except Exception as e:
+                        logger.warning("Could not record batch item %s: %s", item.index, e)
+                await results.put(item_result(
+                    item,
+                    response=result["response"],
+                    cached=result["error"] is None,
+                    error=result["error"]
+                ))
+
+    async def _answer_item(self, item: BatchItem, client_ip: Optional[str]) -> Dict[str, Any]:
+        """Answer one question, reporting failures in the result."""
+        try:
+            response_text, tokens_used, cached = await generate_answer(
+                item.message,
+                item.conversation_id,
+                user_id=item.user_id,
+                client_ip=client_ip
+            )
+        except Exception as e:
+            logger.warning("Batch item %s failed: %s", item.index, e)
+            return item_result(item, error=error_code(e))
+        return item_result(item, response=response_text, tokens_used=tokens_used, cached=cached)
+
+    def plan(self, requests: List[Any], user_id: Optional[str] = None) -> "BatchPlan":
+        """
+        Validate a batch in one pass and group its on-topic questions.
+
+        Args:
+            requests: ChatRequest items, in order
+            user_id: Default user ID charged for items without their own
+
+        Returns:
+            Off-topic items and groups of items answered together
+        """
+        groups: Dict[Any, List[BatchItem]] = {}
+        off_topic: List[BatchItem] = []
+
+        for index, request in enumerate(requests):
+            message = request.message.strip()
+            item = BatchItem(
+                index=index,
+                message=message,
+                conversation_id=request.conversation_id or generate_conversation_id(),
+                user_id=request.user_id or user_id,
+                follow_up=request.conversation_id is not None
+            )
+            is_valid, _ = is_valid_herbalism_topic(message)
+            if not is_valid:
+                off_topic.append(item)
+            elif item.follow_up:
+                groups.setdefault(("conversation", item.conversation_id), []).append(item)
+            else:
+                groups.setdefault(("question", normalize_message(message)), []).append(item)
+
+        return BatchPlan(len(requests), off_topic, list(groups.values()))
+
+    async def run(self, plan: "BatchPlan", client_ip: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Answer a planned batch, yielding item results as they complete.
+
+        Off-topic items come first. Closing the iterator (e.g. when a
+        streaming client disconnects) cancels the questions still pending.
+
+        Args:
+            plan: Batch from plan()
+            client_ip: Caller's IP address, charged for the tokens spent
+
+        Yields:
+            Item results (BatchChatItem fields), in completion order
+        """
+        self.batches += 1
+        self.items += plan.items
+        self.off_topic += len(plan.off_topic)
+        self.duplicates += plan.duplicates
+        logger.info(
+            "Batch of %s questions - off-topic: %s, unique: %s",
+            plan.items, len(plan.off_topic), plan.unique_questions
+        )
+
+        for item in plan.off_topic:
+            yield item_result(item, response=get_off_topic_response(), is_valid_topic=False)
+
+        results: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [
+            asyncio.create_task(self._answer_group(items, client_ip, semaphore, results))
+            for items in plan.groups
+        ]
+        remaining = plan.items - len(plan.off_topic)
+        try:
+            while remaining:
+                result = await results.get()
+                remaining -= 1
+                if result["error"] is not None:
+                    self.errors += 1
+                self.tokens_used += result["tokens_used"]
+                yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get batch statistics.
+
+        Returns:
+            Dictionary with batch, item and token counters
+        """
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "off_topic": self.off_topic,
+            "duplicates": self.duplicates,
+            "errors": self.errors,
+            "tokens_used": self.tokens_used,
+            "concurrency": self.concurrency
+        }
+
+
+# Create singleton instance
+batch_processor = BatchProcessor(concurrency=settings.BATCH_CONCURRENCY)
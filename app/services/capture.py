@@ -0,0 +1,186 @@
+"""
+Traffic capture for replay.
+An ASGI middleware samples chat requests and hands their body to a writer
+thread that appends them, with their arrival time, to a JSONL file.
+Replay them with python -m benchmarks.replay.
+"""
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+from app.config import settings
+from app.models import ChatRequest
+from app.utils.logger import logger
+
+
+CAPTURED_PATHS = ("/chat", "/diane", "/chat/stream", "/diane/stream")
+
+_CAPTURED_FIELDS = tuple(ChatRequest.model_fields)
+
+# (arrival epoch time, request path, raw body); None stops the writer
+CaptureItem = Optional[Tuple[float, str, bytes]]
+
+
+class CaptureWriter:
+    """
+    Append captured requests to a JSONL file from a background thread.
+
+    The request path only enqueues the raw body; JSON decoding, field
+    filtering and file writes happen in the writer thread, through a
+    buffered file flushed every flush_interval seconds. When the queue is
+    full, captures are dropped rather than delaying requests.
+    """
+
+    def __init__(self, path: str, max_queue: int, flush_interval: float = 1.0):
+        """
+        Initialize the writer.
+
+        Args:
+            path: JSONL file to append to (directories are created)
+            max_queue: Maximum captures waiting to be written
+            flush_interval: Maximum seconds a written line stays buffered
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[CaptureItem]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+
+        self.captured = 0
+        self.written = 0
+        self.dropped = 0
+        self.invalid = 0
+
+    def submit(self, arrived_at: float, path: str, body: bytes) -> None:
+        """Queue a request body for writing (never blocks)."""
+        try:
+            self._queue.put_nowait((arrived_at, path, body))
+            self.captured += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self) -> None:
+        """Start the writer thread (no-op if already running)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+        self._thread.start()
+        logger.info("Capturing chat requests to %s", self.path)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Write the queued captures and stop the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _format(self, item: Tuple[float, str, bytes]) -> Optional[str]:
+        arrived_at, path, body = item
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None
+        if not isinstance(data, dict) or not data.get("message"):
+            return None
+        payload = {field: data[field] for field in _CAPTURED_FIELDS if data.get(field) is not None}
+        return json.dumps({"ts": round(arrived_at, 3), "path": path, "payload": payload}, ensure_ascii=False)
+
+    def _run(self) -> None:
+        with open(self.path, "a", encoding="utf-8", buffering=64 * 1024) as capture_file:
+            last_flush = time.monotonic()
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = ()
+
+                if item is None:
+                    break
+                if item:
+                    line = self._format(item)
+                    if line is None:
+                        self.invalid += 1
+                    else:
+                        capture_file.write(line + "\n")
+                        self.written += 1
+
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    capture_file.flush()
+                    last_flush = time.monotonic()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get capture statistics.
+
+        Returns:
+            Dictionary with captured, written and dropped counts
+        """
+        return {
+            "enabled": settings.CAPTURE_ENABLED,
+            "path": self.path,
+            "sample_rate": settings.CAPTURE_SAMPLE_RATE,
+            "queue_depth": self._queue.qsize(),
+            "captured": self.captured,
+            "written": self.written,
+            "dropped": self.dropped,
+            "invalid": self.invalid
+        }
+
+
+class CaptureMiddleware:
+    """
+    ASGI middleware sampling chat request bodies into a CaptureWriter.
+
+    The body is collected as the application reads it, so the request is
+    neither buffered twice nor delayed. Responses are untouched, which
+    keeps streaming endpoints streaming.
+    """
+
+    def __init__(
+        self,
+        app: Any,
+        writer: CaptureWriter,
+        sample_rate: float = 1.0,
+        paths: Iterable[str] = CAPTURED_PATHS
+    ):
+        self.app = app
+        self.writer = writer
+        self.sample_rate = sample_rate
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"] not in self.paths
+            or (self.sample_rate < 1.0 and random.random() >= self.sample_rate)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        arrived_at = time.time()
+        chunks = []
+
+        async def capturing_receive() -> Dict[str, Any]:
+            message = await receive()
+            if message["type"] == "http.request":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    self.writer.submit(arrived_at, scope["path"], b"".join(chunks))
+            return message
+
+        await self.app(scope, capturing_receive, send)
+
+
+# Create singleton instance
+capture_writer = CaptureWriter(
+    path=settings.CAPTURE_PATH,
+    max_queue=settings.CAPTURE_MAX_QUEUE
+)
@@ -0,0 +1,223 @@
+"""
+Answer generation pipeline shared by the chat endpoints.
+Puts the response cache (backed by the persistent answer store), single-flight coalescing, token budgets and
+admission control in front of the Groq service, and keeps multi-turn
+conversation history.
+"""
+
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+from app.services.admission import groq_admission
+from app.services.answer_store import answer_store
+from app.services.conversation_store import conversation_store
+from app.prompts import DIANE_PROMPT_VERSION
+from app.services.groq_service import CircuitOpenError, groq_service
+from app.services.knowledge_base import knowledge_base
+from app.services.response_cache import make_cache_key, response_cache
+from app.services.singleflight import groq_singleflight
+from app.services.token_budget import token_budget
+from app.utils.logger import logger
+
+
+def get_cache_key(user_message: str) -> str:
+    """Build the cache key of a message for the model it is routed to."""
+    model = groq_service.router.route(user_message).model
+    prompt_version = DIANE_PROMPT_VERSION
+    if settings.KB_ENABLED:
+        # Editing the plant sheets changes the prompts, so the answers too
+        prompt_version = f"{DIANE_PROMPT_VERSION}-{knowledge_base.version}"
+    return make_cache_key(user_message, model, groq_service.temperature, prompt_version)
+
+
+async def get_cached_answer(user_message: str) -> Tuple[str, str]:
+    """
+    Look up a cached answer, in memory first, then in the answer store.
+
+    Answers found on disk are copied back into the memory cache. With
+    KB_DIRECT_ANSWERS, simple lookups about one plant are answered from
+    the knowledge base first.
+
+    Args:
+        user_message: User's question
+
+    Returns:
+        Tuple of (cache_key, cached_text); cached_text is empty on a miss
+        or when the cache is disabled
+    """
+    cache_key = get_cache_key(user_message)
+    if settings.KB_ENABLED and settings.KB_DIRECT_ANSWERS:
+        direct_text = knowledge_base.direct_answer(user_message, settings.KB_DIRECT_MAX_WORDS)
+        if direct_text:
+            return cache_key, direct_text
+    if not settings.CACHE_ENABLED:
+        return cache_key, ""
+
+    cached_text = response_cache.get(cache_key)
+    if cached_text is None and settings.ANSWER_STORE_ENABLED:
+        cached_text = await answer_store.get(cache_key)
+        if cached_text:
+            response_cache.set(cache_key, cached_text)
+    return cache_key, cached_text or ""
+
+
+async def get_stale_answer(cache_key: str) -> str:
+    """Get an expired answer to serve while Groq is unavailable (empty if none)."""
+    if not settings.CACHE_ENABLED:
+        return ""
+    stale_text = response_cache.get_stale(cache_key)
+    if stale_text is None and settings.ANSWER_STORE_ENABLED:
+        stale_text = await answer_store.get(cache_key, allow_expired=True)
+    return stale_text or ""
+
+
+def store_answer(cache_key: str, response_text: str) -> None:
+    """Store a freshly generated answer in the cache (and on disk in the background)."""
+    if settings.CACHE_ENABLED and response_text:
+        response_cache.set(cache_key, response_text)
+        if settings.ANSWER_STORE_ENABLED:
+            answer_store.put(cache_key, response_text)
+
+
+async def get_history(conversation_id: Optional[str]) -> List[Dict[str, str]]:
+    """Get the budget-trimmed history of a conversation (empty if disabled)."""
+    if not settings.CONVERSATION_MEMORY_ENABLED:
+        return []
+    return await conversation_store.get_history(conversation_id)
+
+
+async def remember_exchange(conversation_id: Optional[str], user_message: str, response_text: str) -> None:
+    """Record a question and its answer in the conversation history."""
+    if settings.CONVERSATION_MEMORY_ENABLED and response_text:
+        await conversation_store.append_exchange(conversation_id, user_message, response_text)
+
+
+async def _fetch_answer(cache_key: str, user_message: str) -> Tuple[str, int]:
+    """Call Groq and cache the answer (runs once per coalesced group)."""
+    async with groq_admission.slot():
+        response_text, tokens_used, finish_reason = await groq_service.get_response(user_message)
+    # A truncated answer is served once but never cached
+    if finish_reason != "length":
+        store_answer(cache_key, response_text)
+    return response_text, tokens_used
+
+
+async def warm_answer(user_message: str) -> bool:
+    """
+    Make sure a question is answered from cache (used by the startup warm-up).
+
+    The Groq call goes through coalescing and admission control like any
+    request but is not charged to a token budget.
+
+    Args:
+        user_message: Question to warm (already validated as on-topic)
+
+    Returns:
+        True if Groq was called, False if the answer was already cached
+    """
+    cache_key, cached_text = await get_cached_answer(user_message)
+    if cached_text:
+        return False
+    await groq_singleflight.do(cache_key, lambda: _fetch_answer(cache_key, user_message))
+    return True
+
+
+async def generate_answer(
+    user_message: str,
+    conversation_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    client_ip: Optional[str] = None
+) -> Tuple[str, int, bool]:
+    """
+    Answer a validated herbal question, from cache when possible.
+
+    Identical questions already being answered share the in-flight Groq
+    call instead of starting their own. Follow-up questions depend on the
+    conversation history, so they bypass the cache and coalescing.
+
+    Only requests that may reach Groq are charged to the caller's token
+    budgets: MAX_TOKENS is reserved first, then replaced by the tokens
+    actually spent (nothing for shared answers or failed calls). A caller
+    cancelled while its Groq call runs keeps the whole reservation, since
+    the call goes on without it.
+
+    Args:
+        user_message: User's question (already validated as on-topic)
+        conversation_id: Conversation UUID used to load and record history
+        user_id: Caller's user ID, charged for the tokens spent
+        client_ip: Caller's IP address, charged for the tokens spent
+
+    Returns:
+        Tuple of (response_text, tokens_used, cached). Cached answers and
+        answers shared from another request's call report tokens_used=0
+        since they spent no tokens of their own.
+
+    While the Groq circuit breaker is open, a stale cached answer is
+    served if one exists.
+
+    Raises:
+        TokenBudgetExceededError: If the caller's token budget is exhausted
+        AdmissionRejectedError: If no upstream slot is available in time
+        CircuitOpenError: If the circuit is open and no fallback exists
+        GroqServiceError: If the Groq API call fails
+    """
+    history = await get_history(conversation_id)
+    if history:
+        reservation = token_budget.reserve(user_id, client_ip, settings.MAX_TOKENS)
+        tokens_charged = reservation.amount
+        try:
+            async with groq_admission.slot():
+                response_text, tokens_used, _ = await groq_service.get_response(user_message, history)
+            tokens_charged = tokens_used
+        except Exception:
+            tokens_charged = 0
+            raise
+        finally:
+            token_budget.settle(reservation, tokens_charged)
+        await remember_exchange(conversation_id, user_message, response_text)
+        return response_text, tokens_used, False
+
+    cache_key, cached_text = await get_cached_answer(user_message)
+    if cached_text:
+        logger.info("Answer served from cache")
+        await remember_exchange(conversation_id, user_message, cached_text)
+        return cached_text, 0, True
+
+    reservation = token_budget.reserve(user_id, client_ip, settings.MAX_TOKENS)
+    leader = False
+
+    def fetch():
+        # Only called by the request that starts the shared call
+        nonlocal leader
+        leader = True
+        return _fetch_answer(cache_key, user_message)
+
+    tokens_charged = reservation.amount
+    try:
+        (response_text, tokens_used), shared = await groq_singleflight.do(cache_key, fetch)
+        tokens_charged = 0 if shared else tokens_used
+    except CircuitOpenError:
+        tokens_charged = 0
+        stale_text = await get_stale_answer(cache_key)
+        if not stale_text:
+            raise
+        logger.warning("Groq circuit open - serving stale cached answer")
+        await remember_exchange(conversation_id, user_message, stale_text)
+        return stale_text, 0, True
+    except Exception:
+        tokens_charged = 0
+        raise
+    except asyncio.CancelledError:
+        # A cancelled follower was only waiting for another request's call
+        if not leader:
+            tokens_charged = 0
+        raise
+    finally:
+        token_budget.settle(reservation, tokens_charged)
+    await remember_exchange(conversation_id, user_message, response_text)
+
+    if shared:
+        logger.info("Answer shared from an identical in-flight request")
+        return response_text, 0, True
+
+    return response_text, tokens_used, False
@@ -0,0 +1,263 @@
+"""
+Conversation memory for multi-turn chats.
+Keeps compact per-turn records keyed by conversation_id and trims the
+history to a token budget before it is sent to Groq.
+"""
+
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+from app.utils.logger import logger
+
+
+# Compact per-turn record: (role code, content); "u" = user, "a" = assistant
+Turn = Tuple[str, str]
+
+_ROLES = {"u": "user", "a": "assistant"}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimate the token count of a text.
+
+    Uses the common ~4 characters per token heuristic plus a small
+    per-message overhead, which is enough to keep the payload in budget.
+
+    Args:
+        text: Message content
+
+    Returns:
+        Estimated number of tokens
+    """
+    return len(text) // 4 + 4
+
+
+def _turns_size(turns: List[Turn]) -> int:
+    """Approximate memory footprint of a conversation in bytes."""
+    return sum(len(content) + 1 for _, content in turns)
+
+
+class InMemoryConversationBackend:
+    """Process-local conversation storage with TTL and a global memory cap."""
+
+    def __init__(self, ttl_seconds: float, max_conversations: int, max_total_bytes: int):
+        """
+        Initialize the backend.
+
+        Args:
+            ttl_seconds: Idle time after which a conversation is dropped
+            max_conversations: Maximum number of stored conversations
+            max_total_bytes: Maximum total size of stored turns
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_conversations = max_conversations
+        self.max_total_bytes = max_total_bytes
+
+        # conversation_id -> (turns, last_access, size_bytes), oldest access first
+        self._conversations: "OrderedDict[str, Tuple[List[Turn], float, int]]" = OrderedDict()
+        self._total_bytes = 0
+
+        self.expirations = 0
+        self.evictions = 0
+
+    async def load(self, conversation_id: str) -> List[Turn]:
+        """Return the stored turns of a conversation (empty if unknown)."""
+        self._expire(time.monotonic())
+        entry = self._conversations.get(conversation_id)
+        if entry is None:
+            return []
+        return list(entry[0])
+
+    async def save(self, conversation_id: str, turns: List[Turn]) -> None:
+        """Store the turns of a conversation and enforce the caps."""
+        now = time.monotonic()
+        if conversation_id in self._conversations:
+            self._remove(conversation_id)
+
+        size = _turns_size(turns)
+        self._conversations[conversation_id] = (turns, now, size)
+        self._total_bytes += size
+
+        self._expire(now)
+        while len(self._conversations) > self.max_conversations or self._total_bytes > self.max_total_bytes:
+            self._remove(next(iter(self._conversations)))
+            self.evictions += 1
+
+    def _expire(self, now: float) -> None:
+        """Drop idle conversations (they are ordered by last access)."""
+        while self._conversations:
+            oldest_id = next(iter(self._conversations))
+            if now - self._conversations[oldest_id][1] < self.ttl_seconds:
+                break
+            self._remove(oldest_id)
+            self.expirations += 1
+
+    def _remove(self, conversation_id: str) -> None:
+        _, _, size = self._conversations.pop(conversation_id)
+        self._total_bytes -= size
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get backend statistics."""
+        return {
+            "backend": "memory",
+            "conversations": len(self._conversations),
+            "size_bytes": self._total_bytes,
+            "max_conversations": self.max_conversations,
+            "max_total_bytes": self.max_total_bytes,
+            "expirations": self.expirations,
+            "evictions": self.evictions
+        }
+
+
+class RedisConversationBackend:
+    """
+    Conversation storage on a Redis-compatible async client.
+
+    Only get(key) and set(key, value, ex=seconds) are used, so any client
+    exposing those coroutines (redis.asyncio.Redis or a local stand-in)
+    works. Idle expiry is delegated to Redis key TTLs, and the memory cap
+    to the server's maxmemory policy.
+    """
+
+    def __init__(self, client: Any, ttl_seconds: float, key_prefix: str = "diane:conv:"):
+        """
+        Initialize the backend.
+
+        Args:
+            client: Redis-compatible async client
+            ttl_seconds: Idle time after which a conversation expires
+            key_prefix: Prefix of the Redis keys
+        """
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+
+    async def load(self, conversation_id: str) -> List[Turn]:
+        """Return the stored turns of a conversation (empty if unknown)."""
+        raw = await self.client.get(self.key_prefix + conversation_id)
+        if not raw:
+            return []
+        return [(role, content) for role, content in json.loads(raw)]
+
+    async def save(self, conversation_id: str, turns: List[Turn]) -> None:
+        """Store the turns of a conversation, refreshing its TTL."""
+        await self.client.set(
+            self.key_prefix + conversation_id,
+            json.dumps(turns, ensure_ascii=False, separators=(",", ":")),
+            ex=int(self.ttl_seconds)
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get backend statistics."""
+        return {"backend": "redis", "ttl_seconds": self.ttl_seconds}
+
+
+class ConversationStore:
+    """Multi-turn history on top of a pluggable backend."""
+
+    def __init__(self, backend: Any, max_turns: int, history_token_budget: int):
+        """
+        Initialize the store.
+
+        Args:
+            backend: InMemoryConversationBackend, RedisConversationBackend
+                or any object with the same load/save coroutines
+            max_turns: Maximum number of turns kept per conversation
+            history_token_budget: Maximum estimated tokens of history sent to Groq
+        """
+        self.backend = backend
+        self.max_turns = max_turns
+        self.history_token_budget = history_token_budget
+
+    async def get_history(self, conversation_id: Optional[str]) -> List[Dict[str, str]]:
+        """
+        Get the conversation history as Groq chat messages.
+
+        The most recent turns are kept until the token budget is reached;
+        the history always starts on a user turn.
+
+        Args:
+            conversation_id: Conversation UUID
+
+        Returns:
+            List of {"role", "content"} messages, oldest first
+        """
+        if not conversation_id:
+            return []
+
+        turns = await self.backend.load(conversation_id)
+
+        kept: List[Turn] = []
+        budget = self.history_token_budget
+        for role, content in reversed(turns):
+            cost = estimate_tokens(content)
+            if cost > budget:
+                break
+            kept.append((role, content))
+            budget -= cost
+
+        kept.reverse()
+        while kept and kept[0][0] != "u":
+            kept.pop(0)
+
+        return [{"role": _ROLES[role], "content": content} for role, content in kept]
+
+    async def append_exchange(self, conversation_id: Optional[str], user_message: str, response_text: str) -> None:
+        """
+        Record a question and its answer.
+
+        Args:
+            conversation_id: Conversation UUID
+            user_message: User's question
+            response_text: Diane's answer
+        """
+        if not conversation_id:
+            return
+
+        turns = await self.backend.load(conversation_id)
+        turns.append(("u", user_message))
+        turns.append(("a", response_text))
+        await self.backend.save(conversation_id, turns[-self.max_turns:])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get conversation store statistics."""
+        stats = self.backend.get_stats()
+        stats["enabled"] = settings.CONVERSATION_MEMORY_ENABLED
+        stats["history_token_budget"] = self.history_token_budget
+        return stats
+
+
+def create_conversation_backend() -> Any:
+    """
+    Create the configured conversation backend.
+
+    Falls back to the in-process backend if Redis is requested but the
+    redis package or URL is missing.
+    """
+    if settings.CONVERSATION_BACKEND == "redis":
+        if not settings.CONVERSATION_REDIS_URL:
+            logger.warning("CONVERSATION_BACKEND=redis but CONVERSATION_REDIS_URL is empty, using in-memory store")
+        else:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                logger.warning("CONVERSATION_BACKEND=redis but the 'redis' package is not installed, using in-memory store")
+            else:
+                client = redis.from_url(settings.CONVERSATION_REDIS_URL, decode_responses=True)
+                return RedisConversationBackend(client, ttl_seconds=settings.CONVERSATION_TTL_SECONDS)
+
+    return InMemoryConversationBackend(
+        ttl_seconds=settings.CONVERSATION_TTL_SECONDS,
+        max_conversations=settings.CONVERSATION_MAX_CONVERSATIONS,
+        max_total_bytes=settings.CONVERSATION_MAX_TOTAL_BYTES
+    )
+
+
+# Create singleton instance
+conversation_store = ConversationStore(
+    backend=create_conversation_backend(),
+    max_turns=settings.CONVERSATION_MAX_TURNS,
+    history_token_budget=settings.CONVERSATION_HISTORY_TOKEN_BUDGET
+)
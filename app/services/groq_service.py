@@ -1,79 +1,428 @@
 """
-Groq API service for communicating with Llama 3.3 70B model.
+Groq API service for communicating with Llama 3.3 70B model
+(and a smaller model for simple questions, see model_router.py).
 """
 
-from typing import Dict, Tuple, Optional
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List, Tuple, Optional
 import httpx
 from app.config import settings
 from app.prompts import DIANE_SYSTEM_PROMPT
+from app.services.knowledge_base import knowledge_base
+from app.services.metrics import HEDGES, record_route, record_upstream
+from app.services.model_router import LARGE_ROUTE, ModelRoute, ModelRouter
+from app.services.output_budget import DISCLAIMER_STOP, OutputBudget, restore_stop_sequence
+from app.services.upstream_pool import Upstream, UpstreamPool, parse_upstreams
+from app.services.resilience import CircuitBreaker, compute_backoff, parse_retry_after
+from app.utils.json_codec import dumps, loads
 from app.utils.logger import logger, mask_sensitive_data
 
 
+# Upstream statuses worth retrying (rate limited or temporarily unavailable)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
 class GroqServiceError(Exception):
     """Custom exception for Groq API errors."""
+
+    def __init__(
+        self,
+        message: str,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        retryable: bool = False
+    ):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+
+class CircuitOpenError(GroqServiceError):
+    """Raised without calling Groq while the circuit breaker is open."""
     pass
 
 
 class GroqService:
     """Service for interacting with Groq API."""
 
-    def __init__(self):
-        """Initialize Groq service with configuration."""
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        """
+        Initialize Groq service with configuration.
+
+        Args:
+            transport: Optional httpx transport override (used by tests)
+        """
         self.api_url = settings.GROQ_API_URL
+        self.models_url = settings.GROQ_MODELS_URL
         self.api_key = settings.GROQ_API_KEY
         self.model = settings.MODEL
         self.max_tokens = settings.MAX_TOKENS
         self.temperature = settings.TEMPERATURE
+        self.router = ModelRouter(
+            enabled=settings.ROUTING_ENABLED,
+            small_model=settings.ROUTING_SMALL_MODEL,
+            small_max_tokens=settings.ROUTING_SMALL_MAX_TOKENS,
+            large_model=self.model,
+            large_max_tokens=self.max_tokens,
+            simple_max_words=settings.ROUTING_SIMPLE_MAX_WORDS
+        )
+        self.output_budget = OutputBudget(
+            enabled=settings.OUTPUT_BUDGET_ENABLED,
+            min_tokens=settings.OUTPUT_BUDGET_MIN_TOKENS,
+            percentile=settings.OUTPUT_BUDGET_PERCENTILE,
+            headroom=settings.OUTPUT_BUDGET_HEADROOM
+        )
+        self.stop_sequences = [DISCLAIMER_STOP] if settings.OUTPUT_STOP_AT_DISCLAIMER else []
+
+        # Retries, deadlines and circuit breaker
+        self.max_retries = settings.GROQ_MAX_RETRIES
+        self.retry_base_delay = settings.GROQ_RETRY_BASE_DELAY
+        self.retry_max_delay = settings.GROQ_RETRY_MAX_DELAY
+        self.attempt_timeout = settings.GROQ_ATTEMPT_TIMEOUT
+        self.overall_timeout = settings.GROQ_OVERALL_TIMEOUT
+        self.circuit_breaker = CircuitBreaker(
+            name="groq",
+            failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+            recovery_timeout=settings.CIRCUIT_RECOVERY_TIMEOUT
+        )
+        self._retries = 0
+        self._retry_after_honoured = 0
+
+        # Upstream endpoints/keys and hedging of slow completions
+        self.pool = UpstreamPool(
+            parse_upstreams(settings.GROQ_UPSTREAMS),
+            hedge_enabled=settings.GROQ_HEDGE_ENABLED,
+            hedge_quantile=settings.GROQ_HEDGE_QUANTILE,
+            hedge_min_delay=settings.GROQ_HEDGE_MIN_DELAY,
+            hedge_max_delay=settings.GROQ_HEDGE_MAX_DELAY,
+            failure_threshold=settings.UPSTREAM_FAILURE_THRESHOLD,
+            cooldown_seconds=settings.UPSTREAM_COOLDOWN_SECONDS
+        )
+
+        # Pooled HTTP client, created at startup (or lazily on first call)
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._http2_enabled = False
+
+        # Encoded payload prefixes (model, sampling, system prompt), by route
+        self._payload_prefixes: Dict[Tuple[str, int, float, bool], bytes] = {}
+        self._requests_sent = 0
+        self._connections_opened = 0
 
         # Warn if API key is not configured (but allow service to start)
         if not self.api_key:
             logger.warning("⚠️ GROQ_API_KEY is not configured. API calls will fail until key is added.")
 
+    def _build_client(self) -> httpx.AsyncClient:
+        """Create the shared keep-alive HTTP client."""
+        http2 = settings.GROQ_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP/2 requested but 'h2' is not installed, falling back to HTTP/1.1")
+                http2 = False
+        self._http2_enabled = http2
+
+        return httpx.AsyncClient(
+            http2=http2,
+            transport=self.transport,
+            timeout=httpx.Timeout(settings.GROQ_TIMEOUT, connect=settings.GROQ_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.GROQ_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GROQ_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=settings.GROQ_KEEPALIVE_EXPIRY
+            ),
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            }
+        )
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Return the pooled client, creating it if needed.
+
+        A client is bound to the event loop it was created on, so a new one
+        is built if the service is used from a different loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._client = self._build_client()
+            self._client_loop = loop
+        return self._client
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        """httpcore trace hook used to count new upstream connections."""
+        if event_name == "connection.connect_tcp.complete":
+            self._connections_opened += 1
+
+    async def start(self) -> None:
+        """Open the pooled HTTP client (called on application startup)."""
+        self._get_client()
+        logger.info(
+            "Groq HTTP client ready - HTTP/2: %s, max connections: %s, keep-alive: %s",
+            self._http2_enabled,
+            settings.GROQ_POOL_MAX_CONNECTIONS,
+            settings.GROQ_POOL_MAX_KEEPALIVE
+        )
+
+    async def close(self) -> None:
+        """Close the pooled HTTP client (called on application shutdown)."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._client_loop = None
+
+    def _upstream_request(self, upstream: Upstream) -> Tuple[str, Dict[str, str]]:
+        """Get the URL and extra headers of an upstream (defaults to the service's own)."""
+        return upstream.api_url or self.api_url, upstream.headers
+
+    async def _post(
+        self,
+        payload: bytes,
+        timeout: Optional[float] = None,
+        upstream: Optional[Upstream] = None
+    ) -> httpx.Response:
+        """Send a POST to the Groq API (or another upstream) through the pooled client."""
+        client = self._get_client()
+        self._requests_sent += 1
+        url, headers = self._upstream_request(upstream or self.pool.upstreams[0])
+        kwargs: Dict[str, Any] = {"content": payload, "extensions": {"trace": self._trace}}
+        if headers:
+            kwargs["headers"] = headers
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        return await client.post(url, **kwargs)
+
+    async def _timed_post(self, payload: bytes, upstream: Upstream) -> httpx.Response:
+        """POST to one upstream and update its health and latency score."""
+        started = time.perf_counter()
+        try:
+            response = await self._post(payload, upstream=upstream)
+        except httpx.RequestError:
+            self.pool.record_failure(upstream)
+            raise
+
+        if response.status_code == 200:
+            self.pool.record_success(upstream, time.perf_counter() - started)
+        elif response.status_code in RETRYABLE_STATUS_CODES:
+            self.pool.record_failure(upstream)
+        return response
+
+    async def _post_hedged(self, payload: bytes, timeout: float) -> httpx.Response:
+        """
+        POST a completion to the best upstream, hedging if it is slow.
+
+        If the first upstream has not answered within the pool's hedge delay
+        (a high percentile of recent response times), the same request is
+        sent to the next best upstream. The first successful response wins
+        and the other request is cancelled. Without a success, the first
+        response received (or error raised) is returned.
+
+        Args:
+            payload: Encoded chat completion payload
+            timeout: Deadline of this attempt in seconds
+
+        Returns:
+            Upstream response
+
+        Raises:
+            asyncio.TimeoutError: If no upstream answered in time
+            httpx.RequestError: If the request failed on every upstream tried
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + timeout
+        primary = self.pool.pick()
+        primary_task = asyncio.create_task(self._timed_post(payload, primary))
+        tasks = {primary_task: primary}
+        hedge_task: Optional[asyncio.Task] = None
+        hedge_delay = self.pool.hedge_delay()
+        if hedge_delay is not None:
+            self.pool.hedgeable += 1
+
+        pending = {primary_task}
+        first_finished: Optional[asyncio.Task] = None
+        try:
+            while pending:
+                can_hedge = hedge_task is None and hedge_delay is not None
+                wait = deadline - loop.time()
+                if can_hedge:
+                    wait = min(wait, started + hedge_delay - loop.time())
+                done, pending = await asyncio.wait(pending, timeout=max(wait, 0), return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if can_hedge and loop.time() < deadline:
+                        secondary = self.pool.pick(exclude=primary)
+                        hedge_task = asyncio.create_task(self._timed_post(payload, secondary))
+                        tasks[hedge_task] = secondary
+                        pending.add(hedge_task)
+                        self.pool.hedges += 1
+                        logger.info("Hedging slow Groq call on %s after %.2fs", secondary.name, hedge_delay)
+                        continue
+                    for task in pending:
+                        self.pool.record_failure(tasks[task])
+                    if hedge_task is not None:
+                        HEDGES.labels("none").inc()
+                    raise asyncio.TimeoutError()
+
+                for task in done:
+                    if task.exception() is None and task.result().status_code == 200:
+                        if task is hedge_task:
+                            self.pool.hedge_wins += 1
+                            HEDGES.labels("hedge").inc()
+                        elif hedge_task is not None:
+                            HEDGES.labels("primary").inc()
+                        return task.result()
+                    first_finished = first_finished or task
+
+            if hedge_task is not None:
+                HEDGES.labels("none").inc()
+            if first_finished.exception() is not None:
+                raise first_finished.exception()
+            return first_finished.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Mark errors of discarded requests as retrieved
+                    task.exception()
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """
+        Get connection pool statistics.
+
+        Returns:
+            Dictionary with pool configuration and connection reuse counters
+        """
+        reused = max(self._requests_sent - self._connections_opened, 0)
+        return {
+            "client_open": self._client is not None and not self._client.is_closed,
+            "http2": self._http2_enabled,
+            "max_connections": settings.GROQ_POOL_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.GROQ_POOL_MAX_KEEPALIVE,
+            "keepalive_expiry": settings.GROQ_KEEPALIVE_EXPIRY,
+            "requests_sent": self._requests_sent,
+            "connections_opened": self._connections_opened,
+            "requests_reusing_connection": reused,
+            "reuse_ratio": round(reused / self._requests_sent, 3) if self._requests_sent else 0.0
+        }
+
     async def check_connection(self) -> bool:
         """
         Check if Groq API is accessible.
 
+        Uses the models listing endpoint, which validates the API key and
+        reachability without spending completion tokens.
+
         Returns:
             True if connection is successful, False otherwise
         """
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {"role": "user", "content": "test"}
-                ],
-                "max_tokens": 10
-            }
-
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(
-                    self.api_url,
-                    json=payload,
-                    headers=headers
-                )
+            client = self._get_client()
+            self._requests_sent += 1
+            response = await client.get(
+                self.models_url,
+                timeout=settings.HEALTH_CHECK_TIMEOUT,
+                extensions={"trace": self._trace}
+            )
 
             return response.status_code == 200
 
         except Exception as e:
-            logger.error(f"Groq connection check failed: {str(e)}")
+            logger.error("Groq connection check failed: %s", e)
             return False
 
-    async def get_response(self, user_message: str) -> Tuple[str, int]:
+    def _payload_prefix(self, route: ModelRoute, stream: bool) -> bytes:
+        """
+        Get the encoded start of a payload, up to and including the system prompt.
+
+        The model, sampling parameters and system prompt are the same for
+        every call on a route, so they are encoded once and reused (adaptive
+        max_tokens are multiples of the budget's step, so few prefixes exist).
+        """
+        key = (route.model, route.max_tokens, self.temperature, stream)
+        prefix = self._payload_prefixes.get(key)
+        if prefix is None:
+            params: Dict[str, Any] = {
+                "model": route.model,
+                "max_tokens": route.max_tokens,
+                "temperature": self.temperature
+            }
+            if self.stop_sequences:
+                params["stop"] = self.stop_sequences
+            if stream:
+                params["stream"] = True
+            # Drop the closing brace and open the messages list
+            prefix = (
+                dumps(params)[:-1]
+                + b',"messages":['
+                + dumps({"role": "system", "content": DIANE_SYSTEM_PROMPT})
+            )
+            self._payload_prefixes[key] = prefix
+        return prefix
+
+    def _build_payload(
+        self,
+        user_message: str,
+        history: Optional[List[Dict[str, str]]] = None,
+        stream: bool = False,
+        route: Optional[ModelRoute] = None
+    ) -> bytes:
+        """
+        Build the encoded chat completion payload for a user message.
+
+        Only the per-request messages (reference sheets, history, question)
+        are encoded here; they are spliced after the cached prefix.
+        """
+        route = route or self.router.large
+        messages: List[Dict[str, str]] = []
+        if settings.KB_ENABLED:
+            # Relevant plant sheets, only when the question matches some; a
+            # follow-up ("et pour un enfant ?") is searched with the previous question
+            query = user_message
+            previous = [m["content"] for m in history or [] if m.get("role") == "user"]
+            if previous:
+                query = f"{previous[-1]} {user_message}"
+            reference = knowledge_base.build_context(query, settings.KB_TOP_K, settings.KB_MIN_SCORE)
+            if reference:
+                messages.append({"role": "system", "content": reference})
+        messages.extend(history or ())
+        messages.append({"role": "user", "content": user_message})
+        return self._payload_prefix(route, stream) + b"," + dumps(messages)[1:] + b"}"
+
+    async def get_response(
+        self,
+        user_message: str,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> Tuple[str, int, Optional[str]]:
         """
         Get response from Groq API for a user message.
 
+        The model comes from the router and max_tokens from the router or
+        the adaptive output budget; an answer cut by the adaptive budget is
+        asked again once with the route's full max_tokens. Transient failures
+        (timeouts, network errors, 429 and 5xx) are retried with jittered
+        exponential backoff, honouring Retry-After, within an overall
+        deadline. A failed call on the small model is not retried but
+        handed to the large model. While the circuit breaker is open the
+        call fails fast with CircuitOpenError.
+
         Args:
             user_message: User's question
+            history: Previous conversation messages, oldest first
 
         Returns:
-            Tuple of (response_text, tokens_used)
+            Tuple of (response_text, tokens_used, finish_reason).
+            finish_reason is "length" for an answer that is still truncated.
 
         Raises:
+            CircuitOpenError: If the circuit breaker is open
             GroqServiceError: If API call fails
         """
         # Check if API key is configured
@@ -81,71 +430,395 @@ class GroqService:
             logger.error("Cannot call Groq API: GROQ_API_KEY is not configured")
             raise GroqServiceError("GROQ_API_KEY is not configured. Please add it to environment variables.")
 
+        if not self.circuit_breaker.allow_request():
+            raise CircuitOpenError(
+                "Circuit breaker open, Groq API calls suspended",
+                retry_after=self.circuit_breaker.retry_after()
+            )
+
+        route = self.router.route(user_message, history)
+        self.router.record(route)
+        deadline = asyncio.get_running_loop().time() + self.overall_timeout
+
+        if route.name != LARGE_ROUTE:
+            try:
+                return await self._complete_budgeted(route, user_message, history, deadline, max_retries=0)
+            except GroqServiceError as e:
+                self.router.record(route, fallback=True)
+                logger.warning("Model route %s failed (%s), falling back to %s", route.name, e, self.router.large.model)
+                route = self.router.large._replace(reason="fallback", features=route.features)
+
+        return await self._complete_budgeted(route, user_message, history, deadline, self.max_retries)
+
+    async def _complete_budgeted(
+        self,
+        route: ModelRoute,
+        user_message: str,
+        history: Optional[List[Dict[str, str]]],
+        deadline: float,
+        max_retries: int
+    ) -> Tuple[str, int, Optional[str]]:
+        """
+        Get a completion within the output budget (see get_response).
+
+        If the adaptive budget cut the answer, it is asked again once with
+        the route's full max_tokens; should that call fail, the cut answer
+        is returned. Both calls count in tokens_used.
+        """
+        planned = self.output_budget.plan(route)
+        response_text, tokens_used, finish_reason = await self._complete(
+            planned, user_message, history, deadline, max_retries
+        )
+        if finish_reason != "length" or planned.max_tokens >= route.max_tokens:
+            return response_text, tokens_used, finish_reason
+
+        self.output_budget.retries += 1
+        logger.warning("Answer cut at %s tokens, asking again with %s", planned.max_tokens, route.max_tokens)
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
+            retried_text, retried_tokens, finish_reason = await self._complete(
+                route, user_message, history, deadline, max_retries=0
+            )
+        except GroqServiceError as e:
+            logger.warning("Retry of a cut answer failed: %s", e)
+            return response_text, tokens_used, finish_reason
+        return retried_text, tokens_used + retried_tokens, finish_reason
+
+    async def _complete(
+        self,
+        route: ModelRoute,
+        user_message: str,
+        history: Optional[List[Dict[str, str]]],
+        deadline: float,
+        max_retries: int
+    ) -> Tuple[str, int, Optional[str]]:
+        """
+        Get a completion on one model route, retrying transient failures.
 
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {"role": "system", "content": DIANE_SYSTEM_PROMPT},
-                    {"role": "user", "content": user_message}
-                ],
-                "max_tokens": self.max_tokens,
-                "temperature": self.temperature
-            }
+        Args:
+            route: Model route to use
+            user_message: User's question
+            history: Previous conversation messages, oldest first
+            deadline: Event loop time after which no attempt is started
+            max_retries: Maximum retries after the first attempt
 
-            # Log request (with masked API key)
-            logger.info(f"Sending request to Groq API - Model: {self.model}, Temp: {self.temperature}")
-            logger.debug(f"User message: {user_message[:100]}...")
+        Returns:
+            Tuple of (response_text, tokens_used, finish_reason)
 
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    self.api_url,
-                    json=payload,
-                    headers=headers
-                )
+        Raises:
+            GroqServiceError: If the last attempt fails
+        """
+        payload = self._build_payload(user_message, history, route=route)
+
+        # Log request (with masked API key)
+        logger.info(
+            "Sending request to Groq API - Model: %s (%s: %s), Temp: %s",
+            route.model, route.name, route.reason, self.temperature
+        )
+        logger.debug("User message: %s...", user_message[:100])
+
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        attempt = 0
+
+        while True:
+            remaining = deadline - loop.time()
+            try:
+                result = await self._request_completion(payload, min(self.attempt_timeout, remaining))
+            except GroqServiceError as e:
+                if not e.retryable:
+                    # The upstream answered, it is just refusing this request
+                    if e.status_code is not None:
+                        self.circuit_breaker.record_success()
+                    else:
+                        self.circuit_breaker.record_failure()
+                    record_route(route.name, "error", time.perf_counter() - started)
+                    raise
+
+                delay = compute_backoff(attempt, self.retry_base_delay, self.retry_max_delay, e.retry_after)
+                if attempt >= max_retries or delay >= deadline - loop.time():
+                    self.circuit_breaker.record_failure()
+                    record_route(route.name, "error", time.perf_counter() - started)
+                    raise
+
+                self._retries += 1
+                if e.retry_after is not None:
+                    self._retry_after_honoured += 1
+                logger.warning("Retrying Groq API call in %.2fs (attempt %s): %s", delay, attempt + 2, e)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            self.circuit_breaker.record_success()
+            response_text, tokens_used, completion_tokens, finish_reason = result
+            stop_text = restore_stop_sequence(response_text, finish_reason)
+            if stop_text:
+                response_text += stop_text
+                finish_reason = "disclaimer"
+            self.output_budget.record(route, completion_tokens, finish_reason)
+            outcome = "fallback" if route.reason == "fallback" else "ok"
+            record_route(route.name, outcome, time.perf_counter() - started, tokens_used)
+            return response_text, tokens_used, finish_reason
+
+    async def _request_completion(self, payload: bytes, timeout: float) -> Tuple[str, int, int, Optional[str]]:
+        """
+        Perform a single chat completion attempt.
+
+        Args:
+            payload: Encoded chat completion payload
+            timeout: Deadline of this attempt in seconds
+
+        Returns:
+            Tuple of (response_text, tokens_used, completion_tokens, finish_reason)
+
+        Raises:
+            GroqServiceError: With retryable set for transient failures
+        """
+        started = time.perf_counter()
+        try:
+            response = await self._post_hedged(payload, timeout)
+            record_upstream(response.status_code, time.perf_counter() - started)
 
             # Handle non-200 responses
             if response.status_code != 200:
                 error_detail = response.text
                 # Mask API key if present in error
                 safe_error = mask_sensitive_data(error_detail, self.api_key)
-                logger.error(f"Groq API error - Status: {response.status_code}, Detail: {safe_error}")
-                raise GroqServiceError(f"API returned status {response.status_code}")
+                logger.error("Groq API error - Status: %s, Detail: %s", response.status_code, safe_error)
+                raise GroqServiceError(
+                    f"API returned status {response.status_code}",
+                    status_code=response.status_code,
+                    retry_after=parse_retry_after(response.headers.get("retry-after")),
+                    retryable=response.status_code in RETRYABLE_STATUS_CODES
+                )
 
             # Parse response
-            data = response.json()
+            data = loads(response.content)
 
             # Extract response text
             if "choices" not in data or len(data["choices"]) == 0:
                 logger.error("Invalid response structure from Groq API")
                 raise GroqServiceError("Invalid response structure")
 
-            response_text = data["choices"][0]["message"]["content"]
+            choice = data["choices"][0]
+            response_text = choice["message"]["content"]
 
             # Extract token usage
-            tokens_used = 0
-            if "usage" in data:
-                tokens_used = data["usage"].get("total_tokens", 0)
+            usage = data.get("usage") or {}
+            tokens_used = usage.get("total_tokens", 0)
 
-            logger.info(f"Groq API response received - Tokens used: {tokens_used}")
-            logger.debug(f"Response: {response_text[:100]}...")
+            logger.info("Groq API response received - Tokens used: %s", tokens_used)
+            logger.debug("Response: %s...", response_text[:100])
 
-            return response_text, tokens_used
+            return response_text, tokens_used, usage.get("completion_tokens", 0), choice.get("finish_reason")
 
-        except httpx.TimeoutException:
+        except GroqServiceError:
+            raise
+
+        except (httpx.TimeoutException, asyncio.TimeoutError):
+            record_upstream("timeout", time.perf_counter() - started)
             logger.error("Groq API request timeout")
-            raise GroqServiceError("Request timeout")
+            raise GroqServiceError("Request timeout", retryable=True)
+
+        except httpx.RequestError as e:
+            record_upstream("network_error", time.perf_counter() - started)
+            logger.error("Groq API request error: %s", e)
+            raise GroqServiceError("Network error", retryable=True)
+
+        except Exception as e:
+            logger.error("Unexpected error in Groq service: %s", e)
+            raise GroqServiceError(f"Unexpected error: {str(e)}")
+
+    def get_resilience_stats(self) -> Dict[str, Any]:
+        """
+        Get retry and circuit breaker statistics.
+
+        Returns:
+            Dictionary with retry counters and circuit breaker state
+        """
+        return {
+            "retries": self._retries,
+            "retry_after_honoured": self._retry_after_honoured,
+            "max_retries": self.max_retries,
+            "attempt_timeout": self.attempt_timeout,
+            "overall_timeout": self.overall_timeout,
+            "circuit_breaker": self.circuit_breaker.get_stats(),
+            "upstream_pool": self.pool.get_stats()
+        }
+
+    async def stream_response(
+        self,
+        user_message: str,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> AsyncIterator[Tuple[str, int, Optional[str]]]:
+        """
+        Stream a response from Groq API for a user message.
+
+        The model comes from the router and max_tokens from the router or
+        the adaptive output budget. If the small model
+        fails before sending any content, the large model takes over.
+
+        Args:
+            user_message: User's question
+            history: Previous conversation messages, oldest first
+
+        Yields:
+            Tuples of (content_chunk, tokens_used, finish_reason).
+            tokens_used stays 0 until Groq reports usage, and finish_reason
+            None until the end of the answer ("length" if it was cut); both
+            come with the last chunk.
+
+        Raises:
+            GroqServiceError: If API call fails
+        """
+        if not self.api_key:
+            logger.error("Cannot call Groq API: GROQ_API_KEY is not configured")
+            raise GroqServiceError("GROQ_API_KEY is not configured. Please add it to environment variables.")
+
+        if not self.circuit_breaker.allow_request():
+            raise CircuitOpenError(
+                "Circuit breaker open, Groq API calls suspended",
+                retry_after=self.circuit_breaker.retry_after()
+            )
+
+        route = self.router.route(user_message, history)
+        self.router.record(route)
+        route = self.output_budget.plan(route)
+
+        if route.name != LARGE_ROUTE:
+            started_streaming = False
+            try:
+                async for item in self._stream_route(route, user_message, history):
+                    started_streaming = True
+                    yield item
+                return
+            except GroqServiceError as e:
+                # Content already sent cannot be taken back
+                if started_streaming:
+                    raise
+                self.router.record(route, fallback=True)
+                logger.warning("Model route %s failed (%s), falling back to %s", route.name, e, self.router.large.model)
+                route = self.output_budget.plan(self.router.large._replace(reason="fallback", features=route.features))
+
+        async for item in self._stream_route(route, user_message, history):
+            yield item
+
+    async def _stream_route(
+        self,
+        route: ModelRoute,
+        user_message: str,
+        history: Optional[List[Dict[str, str]]]
+    ) -> AsyncIterator[Tuple[str, int, Optional[str]]]:
+        """Stream a completion on one model route (see stream_response)."""
+        payload = self._build_payload(user_message, history, stream=True, route=route)
+
+        logger.info(
+            "Sending streaming request to Groq API - Model: %s (%s: %s), Temp: %s",
+            route.model, route.name, route.reason, self.temperature
+        )
+
+        # Streams are not hedged: the pool only picks the healthiest upstream
+        upstream = self.pool.pick()
+        url, headers = self._upstream_request(upstream)
+
+        started = time.perf_counter()
+        tokens_reported = 0
+        completion_tokens = 0
+        finish_reason: Optional[str] = None
+        # End of the streamed text, enough to recognize a cut disclaimer
+        tail = ""
+        try:
+            client = self._get_client()
+            self._requests_sent += 1
+            async with client.stream(
+                "POST",
+                url,
+                content=payload,
+                headers=headers or None,
+                extensions={"trace": self._trace}
+            ) as response:
+                if response.status_code != 200:
+                    record_upstream(response.status_code, time.perf_counter() - started)
+                    error_detail = (await response.aread()).decode("utf-8", errors="replace")
+                    safe_error = mask_sensitive_data(error_detail, self.api_key)
+                    logger.error("Groq API error - Status: %s, Detail: %s", response.status_code, safe_error)
+                    retryable = response.status_code in RETRYABLE_STATUS_CODES
+                    if retryable:
+                        self.circuit_breaker.record_failure()
+                        self.pool.record_failure(upstream)
+                    else:
+                        self.circuit_breaker.record_success()
+                    raise GroqServiceError(
+                        f"API returned status {response.status_code}",
+                        status_code=response.status_code,
+                        retry_after=parse_retry_after(response.headers.get("retry-after")),
+                        retryable=retryable
+                    )
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+
+                    chunk = loads(data)
+                    content = ""
+                    chunk_finish_reason = None
+                    if chunk.get("choices"):
+                        choice = chunk["choices"][0]
+                        content = choice.get("delta", {}).get("content") or ""
+                        chunk_finish_reason = choice.get("finish_reason")
+                        if content:
+                            tail = (tail + content)[-64:]
+
+                    # Groq reports usage in x_groq on the last chunk, OpenAI in usage
+                    usage = chunk.get("usage") or chunk.get("x_groq", {}).get("usage") or {}
+                    tokens_used = usage.get("total_tokens", 0)
+                    tokens_reported = tokens_used or tokens_reported
+                    completion_tokens = usage.get("completion_tokens", 0) or completion_tokens
+
+                    if chunk_finish_reason:
+                        finish_reason = chunk_finish_reason
+                        stop_text = restore_stop_sequence(tail, finish_reason)
+                        if stop_text:
+                            finish_reason = "disclaimer"
+                            content += stop_text
+
+                    if content or tokens_used or chunk_finish_reason:
+                        yield content, tokens_used, finish_reason
+
+            # Streamed calls are timed until the last chunk
+            elapsed = time.perf_counter() - started
+            record_upstream(200, elapsed)
+            record_route(route.name, "fallback" if route.reason == "fallback" else "ok", elapsed, tokens_reported)
+            self.output_budget.record(route, completion_tokens, finish_reason)
+            self.circuit_breaker.record_success()
+            self.pool.record_success(upstream)
+
+        except GroqServiceError:
+            record_route(route.name, "error", time.perf_counter() - started)
+            raise
+
+        except httpx.TimeoutException:
+            record_upstream("timeout", time.perf_counter() - started)
+            record_route(route.name, "error", time.perf_counter() - started)
+            logger.error("Groq API streaming request timeout")
+            self.circuit_breaker.record_failure()
+            self.pool.record_failure(upstream)
+            raise GroqServiceError("Request timeout", retryable=True)
 
         except httpx.RequestError as e:
-            logger.error(f"Groq API request error: {str(e)}")
-            raise GroqServiceError("Network error")
+            record_upstream("network_error", time.perf_counter() - started)
+            record_route(route.name, "error", time.perf_counter() - started)
+            logger.error("Groq API streaming request error: %s", e)
+            self.circuit_breaker.record_failure()
+            self.pool.record_failure(upstream)
+            raise GroqServiceError("Network error", retryable=True)
 
         except Exception as e:
-            logger.error(f"Unexpected error in Groq service: {str(e)}")
+            record_route(route.name, "error", time.perf_counter() - started)
+            logger.error("Unexpected error in Groq streaming: %s", e)
+            self.circuit_breaker.record_failure()
             raise GroqServiceError(f"Unexpected error: {str(e)}")
 
 
@@ -0,0 +1,136 @@
+"""
+Background health monitoring of the Groq API.
+/health answers from the last known status instead of calling Groq.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.config import settings
+from app.models import get_current_timestamp
+from app.services.groq_service import groq_service
+from app.utils.logger import logger
+
+
+class HealthMonitor:
+    """Periodically probe the upstream and cache the last known status."""
+
+    def __init__(
+        self,
+        check: Callable[[], Awaitable[bool]],
+        interval: float,
+        deep_min_interval: float
+    ):
+        """
+        Initialize the monitor.
+
+        Args:
+            check: Coroutine function returning True if the upstream is up
+            interval: Seconds between background probes
+            deep_min_interval: Minimum seconds between forced (deep) checks
+        """
+        self.check = check
+        self.interval = interval
+        self.deep_min_interval = deep_min_interval
+
+        self.groq_connection = False
+        self.last_checked: Optional[str] = None
+        self.latency_ms: Optional[float] = None
+        self.checks = 0
+        self.deep_checks = 0
+        self.deep_checks_throttled = 0
+
+        self._last_check_at = 0.0
+        self._refreshing = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> bool:
+        """
+        Probe the upstream now and record the result.
+
+        Returns:
+            Upstream status after the probe
+        """
+        if self._refreshing:
+            return self.groq_connection
+
+        self._refreshing = True
+        try:
+            started = time.perf_counter()
+            status = await self.check()
+            self.latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        finally:
+            self._refreshing = False
+
+        if status != self.groq_connection:
+            logger.info("Groq connection status changed: %s -> %s", self.groq_connection, status)
+
+        self.groq_connection = status
+        self.last_checked = get_current_timestamp()
+        self._last_check_at = time.monotonic()
+        self.checks += 1
+        return status
+
+    async def deep_check(self) -> bool:
+        """
+        Force a fresh probe, at most once per deep_min_interval.
+
+        Returns:
+            Upstream status (cached if a probe ran too recently)
+        """
+        if self.last_checked is not None and time.monotonic() - self._last_check_at < self.deep_min_interval:
+            self.deep_checks_throttled += 1
+            return self.groq_connection
+
+        self.deep_checks += 1
+        return await self.refresh()
+
+    async def _run(self) -> None:
+        """Background probe loop."""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error("Health probe failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """Start the background prober (called on application startup)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info("Health monitor started - interval: %ss", self.interval)
+
+    async def stop(self) -> None:
+        """Stop the background prober (called on application shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get health monitor statistics.
+
+        Returns:
+            Dictionary with last status and probe counters
+        """
+        return {
+            "groq_connection": self.groq_connection,
+            "last_checked": self.last_checked,
+            "latency_ms": self.latency_ms,
+            "interval_seconds": self.interval,
+            "checks": self.checks,
+            "deep_checks": self.deep_checks,
+            "deep_checks_throttled": self.deep_checks_throttled
+        }
+
+
+# Create singleton instance
+health_monitor = HealthMonitor(
+    check=groq_service.check_connection,
+    interval=settings.HEALTH_CHECK_INTERVAL,
+    deep_min_interval=settings.HEALTH_DEEP_CHECK_MIN_INTERVAL
+)
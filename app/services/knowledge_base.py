@@ -0,0 +1,371 @@
+"""
+Local herbal knowledge base.
+Plant sheets (properties, uses, preparation, precautions) are loaded from a
+JSONL file and indexed with BM25 over accent-folded tokens. The best
+snippets are injected into Groq prompts, and simple lookups ("posologie de
+la valériane") can be answered directly without calling Groq.
+"""
+
+import hashlib
+import json
+import math
+import os
+import time
+from collections import defaultdict
+from typing import Any, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+from app.config import settings
+from app.prompts import MEDICAL_DISCLAIMER
+from app.utils.keyword_matcher import tokenize
+
+
+DEFAULT_KB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "plants.jsonl")
+
+# Section field -> label shown in snippets and direct answers
+SECTIONS = {
+    "properties": "Propriétés",
+    "uses": "Usages",
+    "preparation": "Préparation et posologie",
+    "precautions": "Précautions",
+}
+
+# Words of a question asking for a given section; they are also indexed
+# with the section so that retrieval favours it
+SECTION_TERMS = {
+    "properties": ("propriété", "bienfait", "vertu", "sert"),
+    "uses": ("usage", "utiliser", "indiqué", "soigner"),
+    "preparation": ("posologie", "dose", "dosage", "préparer", "quantité", "combien", "prendre"),
+    "precautions": (
+        "précaution", "contre-indication", "danger", "risque", "toxique",
+        "interaction", "secondaire", "indésirable"
+    ),
+}
+
+# Personal situations that need a tailored answer from the model
+PERSONAL_TERMS = (
+    "enceinte", "grossesse", "allaitement", "enfant", "bébé", "nourrisson",
+    "médicament", "traitement", "pilule", "maladie", "malade", "âge", "ans"
+)
+
+# Question words mapped to the wording used in the plant sheets
+SYNONYMS = {
+    "dormir": "sommeil",
+    "endormir": "sommeil",
+    "insomnie": "sommeil",
+    "angoisse": "anxiété",
+    "enceinte": "grossesse",
+    "immunité": "immunitaire",
+    "estomac": "digestion",
+    "ventre": "digestion",
+}
+
+STOPWORDS = frozenset(
+    word.encode("ascii") for word in (
+        "a", "au", "aux", "avec", "ce", "ces", "cette", "d", "dans", "de", "des", "du", "elle",
+        "en", "est", "et", "il", "j", "je", "l", "la", "le", "les", "leur", "m", "ma", "me",
+        "mes", "mon", "n", "ne", "on", "ou", "par", "pas", "pour", "qu", "que", "quel",
+        "quelle", "quelles", "quels", "qui", "quoi", "s", "sa", "se", "ses", "son", "sur",
+        "t", "ta", "te", "tu", "un", "une", "vous", "nous", "y", "comment", "faut", "peut",
+        "puis", "plante", "plantes", "temps", "fait", "mieux"
+    )
+)
+
+# Snippets scoring below this share of the best one are not returned
+RELATIVE_SCORE_FLOOR = 0.6
+
+# Terms are cut to this many letters, a crude but effective French stemmer
+# ("digestion", "digestif" and "digestive" all become "digest")
+STEM_LENGTH = 6
+
+# "contre-indication" is one term, so that "contre" alone (as in "tisane
+# contre le stress") does not point to precautions
+_CONTRAINDICATION = b"contre-indication"
+
+
+def fold_terms(text: str) -> List[bytes]:
+    """
+    Split a text into index terms.
+
+    Words are accent-folded and lowercased (see keyword_matcher.tokenize),
+    stopwords are dropped and the rest is stemmed by truncation. A term
+    with a synonym in SYNONYMS is followed by the synonym's term.
+
+    Args:
+        text: Text to split
+
+    Returns:
+        Terms as ASCII bytes
+    """
+    terms: List[bytes] = []
+    for word in tokenize(text):
+        if word[:10] == b"indication" and terms and terms[-1] == b"contre":
+            terms[-1] = _CONTRAINDICATION
+            continue
+        if word in STOPWORDS:
+            continue
+        term = word[:STEM_LENGTH]
+        terms.append(term)
+        synonym = _SYNONYM_TERMS.get(term)
+        if synonym is not None:
+            terms.append(synonym)
+    return terms
+
+
+def _fold_one(word: str) -> bytes:
+    return tokenize(word)[0][:STEM_LENGTH] if "-" not in word else _CONTRAINDICATION
+
+
+_SYNONYM_TERMS = {_fold_one(word): _fold_one(synonym) for word, synonym in SYNONYMS.items()}
+_SECTION_TERMS = {
+    section: frozenset(_fold_one(word) for word in words)
+    for section, words in SECTION_TERMS.items()
+}
+_PERSONAL_TERMS = frozenset(_fold_one(word) for word in PERSONAL_TERMS)
+
+
+class PlantEntry(NamedTuple):
+    """One plant sheet."""
+
+    name: str
+    latin: str
+    aliases: Tuple[str, ...]
+    sections: Dict[str, str]
+
+    @property
+    def title(self) -> str:
+        return f"{self.name} ({self.latin})"
+
+
+class Snippet(NamedTuple):
+    """One section of a plant sheet, the unit of retrieval."""
+
+    plant: PlantEntry
+    section: str
+    text: str
+
+    def render(self) -> str:
+        return f"{self.plant.title} - {SECTIONS[self.section]} : {self.text}"
+
+
+class KnowledgeBase:
+    """
+    BM25 index of plant sheet snippets.
+
+    Each snippet is indexed with its plant names (so "valériane" finds all
+    valerian snippets), its section terms (so "posologie" favours
+    preparation snippets) and its text. Postings and IDF weights are
+    computed once at load time, so a search only touches the postings of
+    the query terms.
+    """
+
+    def __init__(self, entries: Iterable[PlantEntry], k1: float = 1.2, b: float = 0.75):
+        """
+        Build the index.
+
+        Args:
+            entries: Plant sheets
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+        """
+        self.entries = list(entries)
+        self.snippets: List[Snippet] = []
+        # term -> list of (snippet index, precomputed BM25 weight)
+        self._postings: Dict[bytes, List[Tuple[int, float]]] = {}
+        # folded plant name -> entry
+        self._plant_names: Dict[Tuple[bytes, ...], PlantEntry] = {}
+
+        term_counts: List[Dict[bytes, int]] = []
+        for entry in self.entries:
+            names = (entry.name, entry.latin, *entry.aliases)
+            for name in names:
+                folded = tuple(fold_terms(name))
+                if folded:
+                    self._plant_names[folded] = entry
+            name_terms = [term for name in names for term in fold_terms(name)]
+
+            for section, text in entry.sections.items():
+                counts: Dict[bytes, int] = defaultdict(int)
+                for term in name_terms + fold_terms(text):
+                    counts[term] += 1
+                for term in _SECTION_TERMS[section]:
+                    counts[term] += 1
+                self.snippets.append(Snippet(entry, section, text))
+                term_counts.append(counts)
+
+        average_length = sum(sum(c.values()) for c in term_counts) / max(len(term_counts), 1)
+        document_frequency: Dict[bytes, int] = defaultdict(int)
+        for counts in term_counts:
+            for term in counts:
+                document_frequency[term] += 1
+
+        total = len(term_counts)
+        for index, counts in enumerate(term_counts):
+            length = sum(counts.values())
+            for term, frequency in counts.items():
+                idf = math.log(1 + (total - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+                weight = idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * length / average_length))
+                self._postings.setdefault(term, []).append((index, weight))
+
+        self.version = hashlib.sha256(
+            json.dumps([[e.name, e.latin, e.sections] for e in self.entries], ensure_ascii=False).encode("utf-8")
+        ).hexdigest()[:12]
+
+        self.searches = 0
+        self.search_seconds = 0.0
+        self.direct_answers = 0
+
+    def __len__(self) -> int:
+        return len(self.snippets)
+
+    def search(self, query: str, k: int = 3, min_score: float = 0.0) -> List[Tuple[Snippet, float]]:
+        """
+        Find the snippets best matching a question.
+
+        Args:
+            query: User's question
+            k: Maximum number of snippets
+            min_score: Minimum BM25 score of a returned snippet (snippets
+                below RELATIVE_SCORE_FLOOR of the best score are dropped too)
+
+        Returns:
+            List of (snippet, score), best first
+        """
+        started = time.perf_counter()
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(fold_terms(query)):
+            for index, weight in self._postings.get(term, ()):
+                scores[index] += weight
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        if best:
+            min_score = max(min_score, best[0][1] * RELATIVE_SCORE_FLOOR)
+        self.searches += 1
+        self.search_seconds += time.perf_counter() - started
+        return [(self.snippets[index], score) for index, score in best if score >= min_score]
+
+    def build_context(self, query: str, k: int, min_score: float) -> str:
+        """
+        Build the reference block injected into the Groq prompt.
+
+        Args:
+            query: User's question
+            k: Maximum number of snippets
+            min_score: Minimum BM25 score of an included snippet
+
+        Returns:
+            System message content, or "" if nothing relevant was found
+        """
+        results = self.search(query, k, min_score)
+        if not results:
+            return ""
+        lines = "\n".join(f"- {snippet.render()}" for snippet, _ in results)
+        return (
+            "Fiches de référence de l'herboristerie (fiables, à utiliser en priorité ; "
+            "reformule-les sans les citer) :\n" + lines
+        )
+
+    def _mentioned_plants(self, terms: List[bytes]) -> FrozenSet[str]:
+        """Names of the plants whose name or alias appears in the terms."""
+        found = set()
+        for name_terms, entry in self._plant_names.items():
+            size = len(name_terms)
+            if any(tuple(terms[i:i + size]) == name_terms for i in range(len(terms) - size + 1)):
+                found.add(entry.name)
+        return frozenset(found)
+
+    def direct_answer(self, question: str, max_words: int) -> Optional[str]:
+        """
+        Answer a pure lookup about one plant from its sheet.
+
+        Only short questions naming exactly one plant, asking for specific
+        sections (properties, uses, preparation, precautions) and
+        mentioning no personal situation (pregnancy, children, medication)
+        are answered. Precautions and the disclaimer are always included.
+
+        Args:
+            question: User's question
+            max_words: Longest question answered directly
+
+        Returns:
+            HTML answer, or None if the question needs the model
+        """
+        terms = fold_terms(question)
+        if len(tokenize(question)) > max_words or _PERSONAL_TERMS.intersection(terms):
+            return None
+
+        plants = self._mentioned_plants(terms)
+        if len(plants) != 1:
+            return None
+
+        requested = [section for section, section_terms in _SECTION_TERMS.items() if section_terms.intersection(terms)]
+        if not requested:
+            return None
+        if "precautions" not in requested:
+            requested.append("precautions")
+
+        entry = next(e for e in self.entries if e.name in plants)
+        paragraphs = [f"<p><strong>{entry.name}</strong> (<em>{entry.latin}</em>)</p>"]
+        paragraphs.extend(
+            f"<p><strong>{SECTIONS[section]} :</strong> {entry.sections[section]}</p>"
+            for section in requested
+        )
+        paragraphs.append(f"<p>{MEDICAL_DISCLAIMER}</p>")
+        self.direct_answers += 1
+        return "".join(paragraphs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get knowledge base statistics.
+
+        Returns:
+            Dictionary with index size, search timing and direct answers
+        """
+        return {
+            "enabled": settings.KB_ENABLED,
+            "direct_answers_enabled": settings.KB_DIRECT_ANSWERS,
+            "version": self.version,
+            "plants": len(self.entries),
+            "snippets": len(self.snippets),
+            "terms": len(self._postings),
+            "searches": self.searches,
+            "avg_search_us": round(self.search_seconds / self.searches * 1e6, 1) if self.searches else 0.0,
+            "direct_answers": self.direct_answers
+        }
+
+
+def load_knowledge_base(path: str) -> KnowledgeBase:
+    """
+    Load plant sheets from a JSONL file (one plant per line).
+
+    Each line has "name", "latin", optional "aliases" and one text field
+    per section in SECTIONS.
+
+    Args:
+        path: JSONL file
+
+    Returns:
+        Indexed knowledge base
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If a line is not a valid plant sheet
+    """
+    entries = []
+    with open(path, encoding="utf-8") as kb_file:
+        for line_number, line in enumerate(kb_file, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+                entries.append(PlantEntry(
+                    name=data["name"],
+                    latin=data["latin"],
+                    aliases=tuple(data.get("aliases", ())),
+                    sections={section: data[section] for section in SECTIONS}
+                ))
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{path}:{line_number}: invalid plant sheet ({e})") from e
+    return KnowledgeBase(entries)
+
+
+# Create singleton instance
+knowledge_base = load_knowledge_base(settings.KB_PATH or DEFAULT_KB_PATH)
@@ -0,0 +1,278 @@
+"""
+Prometheus metrics for the API, rendered in the text exposition format.
+
+Recording happens on the event loop thread only, so metrics need no
+locks: a labelled child is looked up once in a dict and updated with
+plain integer and float additions. Histogram buckets are preallocated
+and found by bisection.
+"""
+
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; validation is pure CPU, upstream calls take seconds
+VALIDATION_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # One slot per bucket plus the +Inf overflow
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    """Base of a metric family with optional labels."""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[Any, ...], Any] = {}
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: Any) -> Any:
+        """Get (creating on first use) the series for these label values."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonic counter."""
+
+    type_name = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        """Increment the unlabelled series."""
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_number(child.value)}"
+            for values, child in self._children.items()
+        ]
+
+
+class Histogram(_Metric):
+    """Histogram with fixed upper bounds."""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        """Record a value in the unlabelled series."""
+        self.labels().observe(value)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = 'le="' + _format_number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_number(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metric families rendered together."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float],
+        labelnames: Sequence[str] = ()
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, buckets, labelnames))
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            Exposition text ending with a newline
+        """
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+# Create singleton registry and the API's metric families
+metrics_registry = MetricsRegistry()
+
+REQUESTS = metrics_registry.counter(
+    "diane_requests_total",
+    "Chat and health requests by endpoint and outcome",
+    ("endpoint", "outcome")
+)
+REQUEST_SECONDS = metrics_registry.histogram(
+    "diane_request_duration_seconds",
+    "Total handler time by endpoint",
+    LATENCY_BUCKETS,
+    ("endpoint",)
+)
+VALIDATION_SECONDS = metrics_registry.histogram(
+    "diane_validation_duration_seconds",
+    "Time spent validating the question topic",
+    VALIDATION_BUCKETS
+)
+UPSTREAM_SECONDS = metrics_registry.histogram(
+    "diane_upstream_duration_seconds",
+    "Time of each Groq API call (one per attempt)",
+    LATENCY_BUCKETS
+)
+UPSTREAM_RESPONSES = metrics_registry.counter(
+    "diane_upstream_responses_total",
+    "Groq API calls by HTTP status code (or timeout / network_error)",
+    ("status",)
+)
+TOKENS_USED = metrics_registry.counter(
+    "diane_tokens_used_total",
+    "Groq tokens spent on answers"
+)
+HEDGES = metrics_registry.counter(
+    "diane_hedged_requests_total",
+    "Groq completions hedged on a second upstream, by winner (primary, hedge or none)",
+    ("winner",)
+)
+ROUTE_REQUESTS = metrics_registry.counter(
+    "diane_route_requests_total",
+    "Groq completions by model route and outcome (ok, error or fallback)",
+    ("route", "outcome")
+)
+ROUTE_SECONDS = metrics_registry.histogram(
+    "diane_route_duration_seconds",
+    "Groq completion time by model route, retries included (streams: until the last chunk)",
+    LATENCY_BUCKETS,
+    ("route",)
+)
+ROUTE_TOKENS = metrics_registry.counter(
+    "diane_route_tokens_total",
+    "Groq tokens spent by model route",
+    ("route",)
+)
+FINISH_REASONS = metrics_registry.counter(
+    "diane_finish_reasons_total",
+    "Groq completions by question class and finish reason (stop, length, disclaimer...)",
+    ("question_class", "finish_reason")
+)
+
+
+def record_request(endpoint: str, outcome: str, seconds: Optional[float] = None) -> None:
+    """
+    Count a handled request and its total handler time.
+
+    Args:
+        endpoint: Request path, e.g. "/chat"
+        outcome: valid, off_topic, rate_limited, quota_exceeded, overloaded,
+            groq_error or error (ok / degraded / starting for /health)
+        seconds: Handler time, if measured
+    """
+    REQUESTS.labels(endpoint, outcome).inc()
+    if seconds is not None:
+        REQUEST_SECONDS.labels(endpoint).observe(seconds)
+
+
+def record_route(route: str, outcome: str, seconds: float, tokens: int = 0) -> None:
+    """
+    Record one Groq completion on a model route.
+
+    Args:
+        route: Route name ("small" or "large")
+        outcome: ok, error, or fallback when the large model took over
+        seconds: Completion time, retries included
+        tokens: Tokens reported by Groq
+    """
+    ROUTE_REQUESTS.labels(route, outcome).inc()
+    ROUTE_SECONDS.labels(route).observe(seconds)
+    if tokens:
+        ROUTE_TOKENS.labels(route).inc(tokens)
+
+
+def record_upstream(status: Any, seconds: float) -> None:
+    """
+    Record one Groq API call.
+
+    Args:
+        status: HTTP status code, or "timeout" / "network_error"
+        seconds: Call duration
+    """
+    UPSTREAM_RESPONSES.labels(status).inc()
+    UPSTREAM_SECONDS.observe(seconds)
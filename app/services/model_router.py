@@ -0,0 +1,185 @@
+"""
+Model routing for Groq calls.
+Short factual questions ("bienfaits du thym") go to a small, fast model
+with a lower max_tokens; everything else keeps the large model.
+"""
+
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional
+from app.services.validator import HERBAL_KEYWORDS
+from app.utils.keyword_matcher import KeywordMatcher, tokenize
+
+
+SMALL_ROUTE = "small"
+LARGE_ROUTE = "large"
+
+# Questions where a wrong or thin answer matters (health conditions,
+# medication, vulnerable people) or that ask for reasoning, not a lookup
+COMPLEX_KEYWORDS = {
+    "grossesse", "enceinte", "allaitement", "allaiter", "enfant", "enfants",
+    "bébé", "nourrisson", "personne âgée",
+    "médicament", "médicaments", "traitement", "ordonnance", "interaction",
+    "interactions", "contre-indication", "contre-indications", "effet secondaire",
+    "effets secondaires", "posologie", "dosage", "dose", "surdosage",
+    "antidépresseur", "anticoagulant", "pilule", "chimiothérapie",
+    "maladie", "chronique", "diabète", "hypertension", "tension", "cancer",
+    "allergie", "asthme", "épilepsie", "foie", "rein", "reins",
+    "pourquoi", "différence", "comparer", "mélanger", "associer", "association",
+}
+
+_SIMPLE = "simple"
+_COMPLEX = "complex"
+_ROUTING_MATCHER = KeywordMatcher({
+    **{keyword: _SIMPLE for keyword in HERBAL_KEYWORDS},
+    **{keyword: _COMPLEX for keyword in COMPLEX_KEYWORDS},
+})
+
+
+class QuestionFeatures(NamedTuple):
+    """What a question looks like, for routing and output budgets."""
+
+    question_class: str
+    words: int
+    questions: int
+    herbal_terms: int
+    sensitive: int
+
+
+class ModelRoute(NamedTuple):
+    """Model tier chosen for a question."""
+
+    name: str
+    model: str
+    max_tokens: int
+    reason: str
+    features: Optional[QuestionFeatures] = None
+
+
+def question_features(
+    message: str,
+    history: Optional[List[Dict[str, str]]] = None,
+    simple_max_words: int = 12
+) -> QuestionFeatures:
+    """
+    Extract the features of a question and classify it.
+
+    The class is the first that applies of follow_up, several_questions,
+    long, sensitive, no_herbal_keyword and simple.
+
+    Args:
+        message: User's question
+        history: Previous conversation messages, if any
+        simple_max_words: Longest question (in words) that is not "long"
+
+    Returns:
+        Question class with word, question mark, herbal keyword and
+        sensitive keyword counts
+    """
+    words = len(tokenize(message))
+    questions = message.count("?")
+    matches = {keyword: category for keyword, category in _ROUTING_MATCHER.find_all(message)}
+    herbal_terms = sum(1 for category in matches.values() if category == _SIMPLE)
+    sensitive = len(matches) - herbal_terms
+
+    if history:
+        question_class = "follow_up"
+    elif questions > 1:
+        question_class = "several_questions"
+    elif words > simple_max_words:
+        question_class = "long"
+    elif sensitive:
+        question_class = "sensitive"
+    elif not herbal_terms:
+        question_class = "no_herbal_keyword"
+    else:
+        question_class = "simple"
+    return QuestionFeatures(question_class, words, questions, herbal_terms, sensitive)
+
+
+class ModelRouter:
+    """
+    Pick a model tier and max_tokens budget for each question.
+
+    A question goes to the small model only if it is short, asks a single
+    question, names a herbal keyword (the same signal the topic validator
+    uses) and mentions nothing from COMPLEX_KEYWORDS. Follow-ups with
+    conversation history always use the large model.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        small_model: str,
+        small_max_tokens: int,
+        large_model: str,
+        large_max_tokens: int,
+        simple_max_words: int
+    ):
+        """
+        Initialize the router.
+
+        Args:
+            enabled: If False, every question uses the large model
+            small_model: Model for simple questions
+            small_max_tokens: max_tokens for simple questions
+            large_model: Default model (also the fallback)
+            large_max_tokens: max_tokens for the default model
+            simple_max_words: Longest question (in words) routed to the small model
+        """
+        self.enabled = enabled
+        self.simple_max_words = simple_max_words
+        self.small = ModelRoute(SMALL_ROUTE, small_model, small_max_tokens, "")
+        self.large = ModelRoute(LARGE_ROUTE, large_model, large_max_tokens, "")
+
+        self.decisions: Counter = Counter()
+        self.fallbacks = 0
+
+    def route(self, message: str, history: Optional[List[Dict[str, str]]] = None) -> ModelRoute:
+        """
+        Choose the model route for a question.
+
+        Args:
+            message: User's question
+            history: Previous conversation messages, if any
+
+        Returns:
+            Route with model, max_tokens, the reason for the choice and the
+            question's features
+        """
+        features = question_features(message, history, self.simple_max_words)
+        if not self.enabled:
+            return self.large._replace(reason="routing_disabled", features=features)
+
+        route = self.small if features.question_class == "simple" else self.large
+        return route._replace(reason=features.question_class, features=features)
+
+    def record(self, route: ModelRoute, fallback: bool = False) -> None:
+        """
+        Count a route used for a Groq call.
+
+        Args:
+            route: Route chosen by route()
+            fallback: True if the call fell back from this route to the large model
+        """
+        if fallback:
+            self.fallbacks += 1
+        else:
+            self.decisions[(route.name, route.reason)] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get routing statistics.
+
+        Returns:
+            Dictionary with the route configuration, decision counts and fallbacks
+        """
+        return {
+            "enabled": self.enabled,
+            "routes": {
+                route.name: {"model": route.model, "max_tokens": route.max_tokens}
+                for route in (self.small, self.large)
+            },
+            "simple_max_words": self.simple_max_words,
+            "decisions": {f"{name}:{reason}": count for (name, reason), count in self.decisions.items()},
+            "fallbacks": self.fallbacks
+        }
@@ -0,0 +1,227 @@
+"""
+Adaptive max_tokens for Groq completions.
+Estimates the answer length of a question from its features, learns how
+long answers of each question class really are, and can stop generation
+once the closing disclaimer is written.
+"""
+
+import math
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Optional
+from app.prompts import MEDICAL_DISCLAIMER
+from app.services.metrics import FINISH_REASONS
+from app.services.model_router import ModelRoute, QuestionFeatures
+
+
+# Completion tokens expected per question class. The prompt asks for
+# 150-300 words of HTML: about 1.6 tokens per French word, plus the tags
+CLASS_ESTIMATES = {
+    "simple": 360,
+    "no_herbal_keyword": 400,
+    "follow_up": 400,
+    "long": 480,
+    "sensitive": 520,
+    "several_questions": 520,
+}
+DEFAULT_ESTIMATE = 450
+# Added per extra question, herbal keyword and sensitive topic (at most MAX_EXTRA_TERMS each)
+EXTRA_QUESTION_TOKENS = 120
+EXTRA_TERM_TOKENS = 40
+EXTRA_SENSITIVE_TOKENS = 60
+MAX_EXTRA_TERMS = 4
+
+# Ratio of actual to estimated length assumed until a class has samples
+COLD_START_RATIO = 1.3
+# A truncated answer needed more than its max_tokens, by an unknown amount
+TRUNCATED_GROWTH = 1.25
+
+# Stop sequence ending the disclaimer paragraph that closes medical
+# answers: its whole last clause, so that an ordinary paragraph ("...
+# déconseillée chez un enfant.</p>") cannot end the answer. Groq leaves
+# the stop sequence out of the text, so it is put back when the text
+# stopped right before it.
+_DISCLAIMER_END = "sous traitement ou pour un enfant."
+DISCLAIMER_STOP = _DISCLAIMER_END + "</p>"
+_DISCLAIMER_LEAD = MEDICAL_DISCLAIMER[:-len(_DISCLAIMER_END)][-24:]
+
+
+def restore_stop_sequence(text: str, finish_reason: Optional[str]) -> str:
+    """
+    Get the stop sequence cut from the end of a completion.
+
+    Args:
+        text: Completion text (for streams: at least its last characters)
+        finish_reason: Finish reason reported by Groq
+
+    Returns:
+        DISCLAIMER_STOP if the completion stopped on it, otherwise ""
+    """
+    if finish_reason == "stop" and text.endswith(_DISCLAIMER_LEAD):
+        return DISCLAIMER_STOP
+    return ""
+
+
+class OutputBudget:
+    """
+    Choose max_tokens per question from observed completion lengths.
+
+    Each question gets an estimate from its class and features (see
+    estimate()). For every completion, the ratio of actual to estimated
+    completion tokens is recorded per class; max_tokens is the estimate
+    times the `percentile` of recent ratios times `headroom`, rounded up to
+    `step` tokens (which also bounds the number of cached payload
+    prefixes) and kept between `min_tokens` and the route's max_tokens.
+    Truncated answers (finish_reason "length") count as longer than their
+    budget, so a class that gets cut grows its budget.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        min_tokens: int,
+        percentile: float,
+        headroom: float,
+        window: int = 200,
+        min_samples: int = 20,
+        step: int = 32
+    ):
+        """
+        Initialize the budget.
+
+        Args:
+            enabled: If False, routes keep their fixed max_tokens (lengths
+                and finish reasons are still recorded)
+            min_tokens: Smallest max_tokens sent
+            percentile: Percentile (0-100) of recent length ratios used
+            headroom: Multiplier applied on top of the percentile
+            window: Number of recent completions kept per class
+            min_samples: Completions needed before a class uses its own ratios
+            step: max_tokens is rounded up to a multiple of this
+        """
+        self.enabled = enabled
+        self.min_tokens = min_tokens
+        self.percentile = percentile
+        self.headroom = headroom
+        self.window = window
+        self.min_samples = min_samples
+        self.step = step
+
+        self._ratios: Dict[str, Deque[float]] = {}
+        self._lengths: Dict[str, Deque[int]] = {}
+        self._scales: Dict[str, float] = {}
+        self.finish_reasons: Counter = Counter()
+        # Cut answers asked again with the route's full max_tokens
+        self.retries = 0
+
+    def estimate(self, features: QuestionFeatures) -> int:
+        """
+        Estimate the completion tokens a question needs.
+
+        Args:
+            features: Features from model_router.question_features()
+
+        Returns:
+            Estimated completion tokens
+        """
+        return (
+            CLASS_ESTIMATES.get(features.question_class, DEFAULT_ESTIMATE)
+            + EXTRA_QUESTION_TOKENS * min(max(features.questions - 1, 0), MAX_EXTRA_TERMS)
+            + EXTRA_TERM_TOKENS * min(max(features.herbal_terms - 1, 0), MAX_EXTRA_TERMS)
+            + EXTRA_SENSITIVE_TOKENS * min(max(features.sensitive - 1, 0), MAX_EXTRA_TERMS)
+        )
+
+    def max_tokens_for(self, features: QuestionFeatures) -> int:
+        """
+        Get the max_tokens budget of a question (before the route's cap).
+
+        Args:
+            features: Features from model_router.question_features()
+
+        Returns:
+            max_tokens, a multiple of step and at least min_tokens
+        """
+        scale = self._scales.get(features.question_class, COLD_START_RATIO)
+        tokens = self.estimate(features) * scale * self.headroom
+        return max(math.ceil(tokens / self.step) * self.step, self.min_tokens)
+
+    def plan(self, route: ModelRoute) -> ModelRoute:
+        """
+        Apply the adaptive budget to a route.
+
+        Args:
+            route: Route from ModelRouter.route()
+
+        Returns:
+            The route with its max_tokens lowered to the question's budget
+        """
+        if not self.enabled or route.features is None:
+            return route
+        return route._replace(max_tokens=min(self.max_tokens_for(route.features), route.max_tokens))
+
+    def record(self, route: ModelRoute, completion_tokens: int, finish_reason: Optional[str]) -> None:
+        """
+        Record a finished completion.
+
+        Args:
+            route: Route the completion used (with the max_tokens sent)
+            completion_tokens: Completion tokens reported by Groq
+            finish_reason: Finish reason reported by Groq ("disclaimer" when
+                it stopped on DISCLAIMER_STOP)
+        """
+        question_class = route.features.question_class if route.features else "unknown"
+        reason = finish_reason or "unknown"
+        self.finish_reasons[(question_class, reason)] += 1
+        FINISH_REASONS.labels(question_class, reason).inc()
+        if route.features is None or not completion_tokens:
+            return
+
+        if question_class not in self._ratios:
+            self._ratios[question_class] = deque(maxlen=self.window)
+            self._lengths[question_class] = deque(maxlen=self.window)
+        self._lengths[question_class].append(completion_tokens)
+
+        needed = completion_tokens
+        if reason == "length":
+            needed = max(completion_tokens, route.max_tokens) * TRUNCATED_GROWTH
+        ratios = self._ratios[question_class]
+        ratios.append(needed / self.estimate(route.features))
+
+        if len(ratios) >= self.min_samples:
+            ordered = sorted(ratios)
+            self._scales[question_class] = ordered[min(int(len(ordered) * self.percentile / 100), len(ordered) - 1)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get output budget statistics.
+
+        Returns:
+            Dictionary with the configuration, completion lengths and
+            max_tokens per question class, finish reason counts and retries
+            of cut answers
+        """
+        classes = {}
+        for question_class, lengths in self._lengths.items():
+            ordered = sorted(lengths)
+            features = QuestionFeatures(question_class, 0, 1, 1, 1)
+            classes[question_class] = {
+                "samples": len(ordered),
+                "p50_tokens": ordered[len(ordered) // 2],
+                "p95_tokens": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+                "ratio": round(self._scales.get(question_class, COLD_START_RATIO), 3),
+                "max_tokens": self.max_tokens_for(features)
+            }
+        finished = sum(self.finish_reasons.values())
+        truncated = sum(count for (_, reason), count in self.finish_reasons.items() if reason == "length")
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "headroom": self.headroom,
+            "min_tokens": self.min_tokens,
+            "classes": classes,
+            "finish_reasons": {
+                f"{question_class}:{reason}": count
+                for (question_class, reason), count in self.finish_reasons.items()
+            },
+            "truncation_rate": round(truncated / finished, 4) if finished else 0.0,
+            "retries": self.retries
+        }
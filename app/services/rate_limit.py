@@ -0,0 +1,239 @@
+"""
+Rate limiting setup: storage backends shared across workers and
+configurable limiter keys (per IP, per user_id or per conversation_id).
+"""
+
+import sqlite3
+import threading
+import time
+import urllib.parse
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+from limits import parse
+from limits.storage import Storage
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+from app.config import settings
+from app.utils.logger import logger
+
+
+RATE_LIMIT_KEYS = ("ip", "user_id", "conversation_id")
+KEY_PREFIX = "diane"
+
+DEFAULT_SHM_PATH = "/dev/shm/diane_ratelimit.db"
+
+
+class SharedMemoryStorage(Storage):
+    """
+    Rate limit counters shared by every worker on one host.
+
+    Counters live in a small SQLite database on a tmpfs path (/dev/shm by
+    default), so they are memory-backed and visible to all uvicorn worker
+    processes. SQLite's file locking serializes concurrent increments.
+
+    URI: shm:///dev/shm/diane_ratelimit.db
+    """
+
+    STORAGE_SCHEME = ["shm"]
+
+    # Expired rows are purged every this many increments
+    _CLEANUP_EVERY = 1000
+
+    def __init__(self, uri: Optional[str] = None, wrap_exceptions: bool = False, **options: Any):
+        """
+        Open (or create) the shared counter database.
+
+        Args:
+            uri: shm:// URI whose path is the database file
+            wrap_exceptions: Wrap sqlite errors in limits.errors.StorageError
+        """
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        path = urllib.parse.urlparse(uri).path if uri else ""
+        self.path = path or DEFAULT_SHM_PATH
+
+        self._lock = threading.Lock()
+        self._increments = 0
+        self._conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS counters ("
+            "key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    @property
+    def base_exceptions(self) -> type:
+        return sqlite3.Error
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        """
+        Increment a counter, starting a new window if it expired.
+
+        Args:
+            key: Rate limit key
+            expiry: Window length in seconds
+            amount: Increment
+
+        Returns:
+            Counter value after the increment
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM counters WHERE key = ? AND expires_at <= ?", (key, now))
+                value = self._conn.execute(
+                    "INSERT INTO counters (key, value, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value "
+                    "RETURNING value",
+                    (key, amount, now + expiry)
+                ).fetchone()[0]
+
+                self._increments += 1
+                if self._increments % self._CLEANUP_EVERY == 0:
+                    self._conn.execute("DELETE FROM counters WHERE expires_at <= ?", (now,))
+
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return value
+
+    def get(self, key: str) -> int:
+        """Current counter value (0 if absent or expired)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM counters WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        """Epoch time at which the counter's window ends."""
+        with self._lock:
+            row = self._conn.execute("SELECT expires_at FROM counters WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self) -> bool:
+        """Check that the database is usable."""
+        try:
+            with self._lock:
+                self._conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        """Remove every counter."""
+        with self._lock:
+            return self._conn.execute("DELETE FROM counters").rowcount
+
+    def clear(self, key: str) -> None:
+        """Remove one counter."""
+        with self._lock:
+            self._conn.execute("DELETE FROM counters WHERE key = ?", (key,))
+
+
+async def capture_rate_limit_identity(request: Request) -> None:
+    """
+    Route dependency exposing the JSON body to the limiter key function.
+
+    FastAPI has already parsed the body when dependencies run, so
+    request.json() returns the cached value at no extra cost.
+    """
+    try:
+        body = await request.json()
+    except Exception:
+        body = None
+    request.state.rate_limit_body = body if isinstance(body, dict) else {}
+
+
+def get_rate_limit_key(request: Request) -> str:
+    """
+    Build the limiter key according to RATE_LIMIT_KEY.
+
+    Requests without the configured field (e.g. no user_id) fall back to
+    the client IP, so omitting it never bypasses the limit.
+
+    Args:
+        request: FastAPI request object
+
+    Returns:
+        Rate limit key such as "ip:1.2.3.4" or "user_id:wp_user_123"
+    """
+    body: Dict[str, Any] = getattr(request.state, "rate_limit_body", None) or {}
+    return build_rate_limit_key(body, get_remote_address(request))
+
+
+def build_rate_limit_key(fields: Dict[str, Any], client_ip: str) -> str:
+    """
+    Build the limiter key from request fields according to RATE_LIMIT_KEY.
+
+    Args:
+        fields: Request fields (user_id, conversation_id...)
+        client_ip: Client address, used when the field is missing
+
+    Returns:
+        Rate limit key such as "ip:1.2.3.4" or "user_id:wp_user_123"
+    """
+    key_type = settings.RATE_LIMIT_KEY
+    if key_type != "ip":
+        value = fields.get(key_type)
+        if value:
+            return f"{key_type}:{value}"
+    return f"ip:{client_ip}"
+
+
+def hit_rate_limit(limiter: Limiter, limit: str, key: str, scope: str) -> float:
+    """
+    Count one request against a limit kept in the limiter's storage.
+
+    For traffic outside the @limiter.limit route decorator (WebSocket
+    messages), with the same storage and keys as the HTTP endpoints.
+
+    Args:
+        limiter: Application limiter
+        limit: Limit string, e.g. "10/minute"
+        key: Rate limit key from build_rate_limit_key()
+        scope: Counter name; the path of a decorated endpoint (e.g. "/chat")
+            shares that endpoint's counter
+
+    Returns:
+        0 if the request is allowed, otherwise seconds until it would be
+    """
+    if not limiter.enabled:
+        return 0.0
+    item = parse(limit)
+    if limiter.limiter.hit(item, KEY_PREFIX, key, scope):
+        return 0.0
+    reset_at, _ = limiter.limiter.get_window_stats(item, KEY_PREFIX, key, scope)
+    return max(reset_at - time.time(), 1.0)
+
+
+def create_limiter() -> Limiter:
+    """
+    Create the slowapi limiter with the configured storage backend.
+
+    RATE_LIMIT_STORAGE_URI accepts any limits storage URI, e.g.
+    memory:// (per process), shm:///dev/shm/diane_ratelimit.db (all
+    workers on one host) or redis://host:6379/0 (all hosts, needs the
+    redis package).
+
+    Returns:
+        Configured Limiter
+    """
+    if settings.RATE_LIMIT_KEY not in RATE_LIMIT_KEYS:
+        logger.warning("Unknown RATE_LIMIT_KEY '%s', limiting per IP", settings.RATE_LIMIT_KEY)
+
+    logger.info(
+        "Rate limit storage: %s, key: %s",
+        urllib.parse.urlparse(settings.RATE_LIMIT_STORAGE_URI).scheme,
+        settings.RATE_LIMIT_KEY
+    )
+
+    return Limiter(
+        key_func=get_rate_limit_key,
+        storage_uri=settings.RATE_LIMIT_STORAGE_URI,
+        key_prefix=KEY_PREFIX
+    )
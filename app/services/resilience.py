@@ -0,0 +1,179 @@
+"""
+Resilience helpers for upstream calls: jittered backoff, Retry-After
+parsing and a circuit breaker.
+"""
+
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Deque, Dict, Optional
+from app.models import get_current_timestamp
+from app.utils.logger import logger
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header value.
+
+    Args:
+        value: Header value, either delay-seconds or an HTTP date
+
+    Returns:
+        Delay in seconds, or None if absent or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def compute_backoff(
+    attempt: int,
+    base_delay: float,
+    max_delay: float,
+    retry_after: Optional[float] = None
+) -> float:
+    """
+    Compute the delay before a retry.
+
+    Uses "full jitter" exponential backoff. When the upstream sent a
+    Retry-After, it is honoured as a minimum.
+
+    Args:
+        attempt: Retry number, starting at 0
+        base_delay: Delay of the first retry before jitter
+        max_delay: Upper bound of the exponential part
+        retry_after: Delay requested by the upstream, if any
+
+    Returns:
+        Delay in seconds
+    """
+    delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker failing fast while the upstream is down.
+
+    closed -> open after failure_threshold consecutive failures;
+    open -> half_open once recovery_timeout has elapsed, letting one trial
+    call through; half_open -> closed on success, back to open on failure.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float, history_size: int = 20):
+        """
+        Initialize the breaker.
+
+        Args:
+            name: Name used in logs
+            failure_threshold: Consecutive failures that open the circuit
+            recovery_timeout: Seconds to wait before a trial call
+            history_size: Number of recent transitions kept for export
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.rejected_calls = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started_at = 0.0
+
+        self.transition_counts: Dict[str, int] = {}
+        self.recent_transitions: Deque[Dict[str, str]] = deque(maxlen=history_size)
+
+    def _transition(self, new_state: str) -> None:
+        """Move to a new state and record the transition."""
+        old_state = self.state
+        if old_state == new_state:
+            return
+
+        self.state = new_state
+        transition = f"{old_state}->{new_state}"
+        self.transition_counts[transition] = self.transition_counts.get(transition, 0) + 1
+        self.recent_transitions.append({"transition": transition, "at": get_current_timestamp()})
+
+        if new_state == OPEN:
+            self._opened_at = time.monotonic()
+            logger.warning("Circuit breaker '%s' opened after %s failures", self.name, self.consecutive_failures)
+        else:
+            logger.info("Circuit breaker '%s' transition: %s", self.name, transition)
+
+    def allow_request(self) -> bool:
+        """
+        Check whether a call may go upstream.
+
+        Returns:
+            True if the call is allowed, False if it must fail fast
+        """
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._transition(HALF_OPEN)
+
+        if self.state == CLOSED:
+            return True
+
+        # A trial that never reported back (e.g. cancelled) is given up after
+        # recovery_timeout so the breaker cannot stay half-open forever
+        if self.state == HALF_OPEN and (
+            not self._trial_in_flight
+            or time.monotonic() - self._trial_started_at >= self.recovery_timeout
+        ):
+            self._trial_in_flight = True
+            self._trial_started_at = time.monotonic()
+            return True
+
+        self.rejected_calls += 1
+        return False
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a trial call through."""
+        if self.state != OPEN:
+            return 0.0
+        return max(self.recovery_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    def record_success(self) -> None:
+        """Record a successful upstream call."""
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+        self._transition(CLOSED)
+
+    def record_failure(self) -> None:
+        """Record a failed upstream call."""
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self._transition(OPEN)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get breaker state and transition history.
+
+        Returns:
+            Dictionary with state, counters and recent transitions
+        """
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "recovery_timeout": self.recovery_timeout,
+            "rejected_calls": self.rejected_calls,
+            "transitions": dict(self.transition_counts),
+            "recent_transitions": list(self.recent_transitions)
+        }
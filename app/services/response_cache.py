@@ -0,0 +1,170 @@
+"""
+In-memory answer cache for repeated herbal questions.
+Bounded LRU with TTL, keyed by normalized message and generation settings.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from app.config import settings
+from app.prompts import DIANE_PROMPT_VERSION
+from app.utils.text import normalize_message
+
+
+def make_cache_key(
+    message: str,
+    model: str,
+    temperature: float,
+    prompt_version: str = DIANE_PROMPT_VERSION
+) -> str:
+    """
+    Build the cache key for a user message.
+
+    Args:
+        message: User's question (raw, normalized here)
+        model: Groq model name
+        temperature: Sampling temperature
+        prompt_version: System prompt fingerprint
+
+    Returns:
+        Hex digest identifying the question and generation settings
+    """
+    raw = f"{normalize_message(message)}|{model}|{temperature}|{prompt_version}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU cache of generated answers with per-entry TTL."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached answers
+            max_bytes: Maximum total size of cached answers (UTF-8 bytes)
+            ttl_seconds: Lifetime of an entry
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        # key -> (response_text, expires_at, size_bytes)
+        self._entries: "OrderedDict[str, Tuple[str, float, int]]" = OrderedDict()
+        self._size_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached answer.
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            Cached response text, or None on miss or expiry
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        response_text, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            # Expired entries stay until evicted or replaced, so get_stale
+            # can still use them as a fallback while Groq is down
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return response_text
+
+    def get_stale(self, key: str) -> Optional[str]:
+        """
+        Look up an answer ignoring its TTL (fallback when Groq is unavailable).
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            Cached response text, possibly expired, or None
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self.stale_hits += 1
+        return entry[0]
+
+    def set(self, key: str, response_text: str) -> None:
+        """
+        Store an answer, evicting least recently used entries if needed.
+
+        Args:
+            key: Cache key from make_cache_key
+            response_text: HTML answer to cache
+        """
+        size = len(response_text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (response_text, time.monotonic() + self.ttl_seconds, size)
+        self._size_bytes += size
+
+        while len(self._entries) > self.max_entries or self._size_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove all entries (counters are kept)."""
+        self._entries.clear()
+        self._size_bytes = 0
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._size_bytes -= size
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dictionary with size, hit/miss and eviction counters
+        """
+        lookups = self.hits + self.misses
+        return {
+            "enabled": settings.CACHE_ENABLED,
+            "entries": len(self._entries),
+            "size_bytes": self._size_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "stale_hits": self.stale_hits
+        }
+
+
+# Create singleton instance
+response_cache = ResponseCache(
+    max_entries=settings.CACHE_MAX_ENTRIES,
+    max_bytes=settings.CACHE_MAX_BYTES,
+    ttl_seconds=settings.CACHE_TTL_SECONDS
+)
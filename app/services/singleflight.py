@@ -0,0 +1,83 @@
+"""
+Single-flight coalescing of identical in-flight upstream calls.
+Concurrent requests for the same key share one call and its result.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple, TypeVar
+
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Deduplicate concurrent calls sharing the same key."""
+
+    def __init__(self):
+        """Initialize with no calls in flight."""
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Run fn once per key, sharing its result with concurrent callers.
+
+        The shared call runs in its own task and every caller awaits it
+        through asyncio.shield, so a caller that is cancelled (client
+        disconnected) stops waiting without cancelling the call for others.
+
+        Args:
+            key: Identity of the call (e.g. the response cache key)
+            fn: Zero-argument coroutine function performing the call
+
+        Returns:
+            Tuple of (result, shared). shared is True when the result came
+            from a call started by another request.
+
+        Raises:
+            Whatever the shared call raises, re-raised in every caller
+        """
+        task = self._inflight.get(key)
+
+        # Tasks left over from another (finished) event loop cannot be awaited
+        if task is not None and task.get_loop() is not asyncio.get_running_loop():
+            task = None
+
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.calls += 1
+            shared = False
+        else:
+            self.coalesced += 1
+            shared = True
+
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        """Drop a finished call and mark its exception as retrieved."""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get coalescing statistics.
+
+        Returns:
+            Dictionary with in-flight, upstream call and coalesced counters
+        """
+        total = self.calls + self.coalesced
+        return {
+            "inflight": len(self._inflight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / total, 3) if total else 0.0
+        }
+
+
+# Create singleton instance
+groq_singleflight = SingleFlight()
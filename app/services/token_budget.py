@@ -0,0 +1,256 @@
+"""
+Token budgets per user and per IP.
+Charges the tokens actually spent by Groq calls against token buckets that
+refill continuously over a sliding window, so cheap requests (off-topic
+rejections, cached answers) cost nothing while long answers are capped.
+"""
+
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+from app.utils.logger import logger
+
+
+# Least recently used budgets examined when one must be evicted
+EVICTION_SCAN = 64
+
+
+class TokenBudgetExceededError(Exception):
+    """Raised when a caller's token budget cannot cover a new upstream call."""
+
+    def __init__(self, message: str, retry_after: float, scope: str):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.scope = scope
+
+
+class TokenReservation:
+    """Tokens held on one or more budgets for an upstream call in progress."""
+
+    __slots__ = ("keys", "amount", "settled")
+
+    def __init__(self, keys: Tuple[str, ...], amount: int):
+        self.keys = keys
+        self.amount = amount
+        self.settled = False
+
+
+class TokenBudgetLimiter:
+    """
+    Token buckets keyed by "user_id:<id>" and "ip:<address>".
+
+    Each bucket holds up to `capacity` tokens and refills at
+    capacity / window_seconds tokens per second, i.e. a sliding window of
+    `capacity` tokens. A call first reserves the worst case (MAX_TOKENS) on
+    every budget it is charged to, then settles the real usage: unused
+    tokens are refunded, and usage above the reservation (prompt tokens)
+    puts the bucket in debt until it refills.
+    """
+
+    def __init__(self, user_capacity: int, ip_capacity: int, window_seconds: float, max_keys: int):
+        """
+        Initialize the limiter.
+
+        Args:
+            user_capacity: Tokens per window for one user_id
+            ip_capacity: Tokens per window for one client IP
+            window_seconds: Time for an empty bucket to refill completely
+            max_keys: Maximum number of buckets kept (least recently used
+                full buckets evicted)
+        """
+        self.user_capacity = user_capacity
+        self.ip_capacity = ip_capacity
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+
+        # key -> [balance, updated_at]
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+        self.reservations = 0
+        self.rejections = 0
+        self.tokens_reserved = 0
+        self.tokens_charged = 0
+        self.evictions = 0
+
+    def _capacity(self, key: str) -> int:
+        return self.user_capacity if key.startswith("user_id:") else self.ip_capacity
+
+    def _refilled(self, key: str, bucket: List[float], now: float) -> float:
+        """Balance of a bucket refilled up to now, without updating it."""
+        capacity = self._capacity(key)
+        balance, updated_at = bucket
+        return min(float(capacity), balance + (now - updated_at) * capacity / self.window_seconds)
+
+    def _evict(self, keep: str, now: float) -> None:
+        """
+        Drop least recently used buckets beyond max_keys.
+
+        A dropped bucket comes back full, so only buckets that have
+        refilled completely are evicted: budgets still in use are kept
+        even if that leaves more than max_keys for a while.
+        """
+        excess = len(self._buckets) - self.max_keys
+        if excess <= 0:
+            return
+        for key in list(islice(self._buckets, EVICTION_SCAN)):
+            if key != keep and self._refilled(key, self._buckets[key], now) >= self._capacity(key):
+                del self._buckets[key]
+                self.evictions += 1
+                excess -= 1
+                if excess <= 0:
+                    return
+
+    def _balance(self, key: str, now: float) -> float:
+        """Refill a bucket up to now and return its balance."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [float(self._capacity(key)), now]
+            self._buckets[key] = bucket
+            self._evict(key, now)
+        else:
+            self._buckets.move_to_end(key)
+
+        bucket[0] = self._refilled(key, bucket, now)
+        bucket[1] = now
+        return bucket[0]
+
+    @staticmethod
+    def budget_keys(user_id: Optional[str], client_ip: Optional[str]) -> Tuple[str, ...]:
+        """Budgets a request is charged to (anonymous requests only by IP)."""
+        keys = []
+        if user_id:
+            keys.append(f"user_id:{user_id}")
+        if client_ip:
+            keys.append(f"ip:{client_ip}")
+        return tuple(keys)
+
+    def reserve(self, user_id: Optional[str], client_ip: Optional[str], amount: int) -> TokenReservation:
+        """
+        Hold tokens for an upstream call on the user and IP budgets.
+
+        Args:
+            user_id: Caller's user ID, if known
+            client_ip: Caller's IP address
+            amount: Tokens to hold (the most the call may spend)
+
+        Returns:
+            Reservation to pass to settle() once the call is over
+
+        Raises:
+            TokenBudgetExceededError: If a budget cannot cover the amount
+        """
+        if not settings.TOKEN_BUDGET_ENABLED:
+            return TokenReservation((), 0)
+
+        keys = self.budget_keys(user_id, client_ip)
+        now = time.monotonic()
+
+        for key in keys:
+            capacity = self._capacity(key)
+            # A reservation larger than the bucket could never succeed
+            needed = min(amount, capacity)
+            balance = self._balance(key, now)
+            if balance < needed:
+                self.rejections += 1
+                retry_after = (needed - balance) * self.window_seconds / capacity
+                logger.warning("Token budget exhausted for %s (%.0f/%s left)", key, balance, capacity)
+                raise TokenBudgetExceededError(
+                    f"Token budget exhausted for {key}",
+                    retry_after=retry_after,
+                    scope=key.split(":", 1)[0]
+                )
+
+        for key in keys:
+            self._buckets[key][0] -= amount
+
+        self.reservations += 1
+        self.tokens_reserved += amount
+        return TokenReservation(keys, amount)
+
+    def settle(self, reservation: TokenReservation, tokens_used: int) -> None:
+        """
+        Replace a reservation by the tokens actually spent.
+
+        Calling it with tokens_used=0 (failed call, cached or shared
+        answer) releases the whole reservation. Settling twice is a no-op.
+
+        Args:
+            reservation: Reservation returned by reserve()
+            tokens_used: Tokens reported by Groq for the call
+        """
+        if reservation.settled:
+            return
+        reservation.settled = True
+
+        adjustment = reservation.amount - tokens_used
+        now = time.monotonic()
+        for key in reservation.keys:
+            if key not in self._buckets:
+                continue
+            balance = self._balance(key, now)
+            self._buckets[key][0] = min(float(self._capacity(key)), balance + adjustment)
+
+        if reservation.keys:
+            self.tokens_charged += tokens_used
+
+    def get_quota(self, user_id: Optional[str], client_ip: Optional[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the state of the budgets a caller is charged to.
+
+        Read-only: unknown budgets are reported full without being created,
+        and no bucket is refreshed or evicted.
+
+        Args:
+            user_id: Caller's user ID, if known
+            client_ip: Caller's IP address
+
+        Returns:
+            Dictionary keyed by scope ("user_id", "ip") with capacity,
+            remaining tokens and seconds until the budget is full again
+        """
+        now = time.monotonic()
+        quota = {}
+        for key in self.budget_keys(user_id, client_ip):
+            capacity = self._capacity(key)
+            bucket = self._buckets.get(key)
+            balance = self._refilled(key, bucket, now) if bucket is not None else float(capacity)
+            quota[key.split(":", 1)[0]] = {
+                "key": key,
+                "capacity": capacity,
+                "remaining": max(int(balance), 0),
+                "used": int(capacity - balance),
+                "window_seconds": self.window_seconds,
+                "full_in_seconds": round((capacity - balance) * self.window_seconds / capacity, 1)
+            }
+        return quota
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get budget statistics.
+
+        Returns:
+            Dictionary with tracked budgets, reservations and charged tokens
+        """
+        return {
+            "enabled": settings.TOKEN_BUDGET_ENABLED,
+            "user_capacity": self.user_capacity,
+            "ip_capacity": self.ip_capacity,
+            "window_seconds": self.window_seconds,
+            "tracked_budgets": len(self._buckets),
+            "reservations": self.reservations,
+            "rejections": self.rejections,
+            "tokens_reserved": self.tokens_reserved,
+            "tokens_charged": self.tokens_charged,
+            "evictions": self.evictions
+        }
+
+
+# Create singleton instance
+token_budget = TokenBudgetLimiter(
+    user_capacity=settings.TOKEN_BUDGET_PER_USER,
+    ip_capacity=settings.TOKEN_BUDGET_PER_IP,
+    window_seconds=settings.TOKEN_BUDGET_WINDOW_SECONDS,
+    max_keys=settings.TOKEN_BUDGET_MAX_KEYS
+)
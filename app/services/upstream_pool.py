@@ -0,0 +1,209 @@
+"""
+Pool of OpenAI-compatible upstreams (Groq endpoints or API keys).
+Scores each upstream by latency and recent failures, and derives the
+hedging delay from the observed latency distribution.
+"""
+
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+
+class Upstream:
+    """One endpoint/key pair with its health and latency score."""
+
+    def __init__(self, name: str, api_url: Optional[str] = None, api_key: Optional[str] = None):
+        """
+        Initialize the upstream.
+
+        Args:
+            name: Label used in logs and stats
+            api_url: Chat completions URL (None: the service's GROQ_API_URL)
+            api_key: API key (None: the service's GROQ_API_KEY)
+        """
+        self.name = name
+        self.api_url = api_url
+        self.api_key = api_key
+        # Built once: the default key is already set on the HTTP client
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+        self.latency_ewma: Optional[float] = None
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def available(self, now: float) -> bool:
+        """Whether the upstream is out of its failure cooldown."""
+        return now >= self.cooldown_until
+
+    def score(self) -> float:
+        """Lower is better: smoothed latency, penalized by recent failures."""
+        latency = self.latency_ewma if self.latency_ewma is not None else 0.0
+        return latency * (1 + self.consecutive_failures) + self.consecutive_failures
+
+
+class UpstreamPool:
+    """
+    Choose upstreams by score and track the latency used for hedging.
+
+    An upstream failing failure_threshold times in a row is skipped for
+    cooldown_seconds (unless every upstream is cooling down). The hedging
+    delay is the hedge_quantile of recent successful response times,
+    clamped to [hedge_min_delay, hedge_max_delay].
+    """
+
+    def __init__(
+        self,
+        upstreams: List[Upstream],
+        hedge_enabled: bool,
+        hedge_quantile: float,
+        hedge_min_delay: float,
+        hedge_max_delay: float,
+        failure_threshold: int,
+        cooldown_seconds: float,
+        latency_window: int = 200,
+        min_samples: int = 20,
+        ewma_alpha: float = 0.2
+    ):
+        """
+        Initialize the pool.
+
+        Args:
+            upstreams: Upstreams in order of preference (at least one)
+            hedge_enabled: Whether slow completions are hedged
+            hedge_quantile: Latency percentile (0-100) after which to hedge
+            hedge_min_delay: Shortest hedging delay in seconds
+            hedge_max_delay: Longest hedging delay (used until enough samples)
+            failure_threshold: Consecutive failures before a cooldown
+            cooldown_seconds: Time a failing upstream is skipped
+            latency_window: Number of recent response times kept
+            min_samples: Samples needed before the percentile is used
+            ewma_alpha: Weight of the latest sample in the latency score
+        """
+        self.upstreams = upstreams
+        self.hedge_enabled = hedge_enabled
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.min_samples = min_samples
+        self.ewma_alpha = ewma_alpha
+
+        self._latencies: Deque[float] = deque(maxlen=latency_window)
+
+        self.hedgeable = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def pick(self, exclude: Optional[Upstream] = None) -> Upstream:
+        """
+        Choose the best-scored available upstream.
+
+        Args:
+            exclude: Upstream already in use (ignored if it is the only one)
+
+        Returns:
+            Upstream to call
+        """
+        now = time.monotonic()
+        candidates = [u for u in self.upstreams if u is not exclude] or self.upstreams
+        available = [u for u in candidates if u.available(now)] or candidates
+        # min keeps configuration order among equal scores
+        return min(available, key=Upstream.score)
+
+    def record_success(self, upstream: Upstream, seconds: Optional[float] = None) -> None:
+        """
+        Record a successful response.
+
+        Args:
+            upstream: Upstream that answered
+            seconds: Response time of a plain completion (streams pass None,
+                their duration is not comparable)
+        """
+        upstream.requests += 1
+        upstream.consecutive_failures = 0
+        if seconds is None:
+            return
+        if upstream.latency_ewma is None:
+            upstream.latency_ewma = seconds
+        else:
+            upstream.latency_ewma += self.ewma_alpha * (seconds - upstream.latency_ewma)
+        self._latencies.append(seconds)
+
+    def record_failure(self, upstream: Upstream) -> None:
+        """Record a failed call (timeout, network error, 429 or 5xx)."""
+        upstream.requests += 1
+        upstream.failures += 1
+        upstream.consecutive_failures += 1
+        if upstream.consecutive_failures >= self.failure_threshold:
+            upstream.cooldown_until = time.monotonic() + self.cooldown_seconds
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        Get how long to wait for the first upstream before hedging.
+
+        Returns:
+            Delay in seconds, or None if hedging is disabled
+        """
+        if not self.hedge_enabled:
+            return None
+        if len(self._latencies) < self.min_samples:
+            return self.hedge_max_delay
+        ordered = sorted(self._latencies)
+        index = min(int(len(ordered) * self.hedge_quantile / 100), len(ordered) - 1)
+        return min(max(ordered[index], self.hedge_min_delay), self.hedge_max_delay)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get pool statistics.
+
+        Returns:
+            Dictionary with per-upstream scores and hedging counters
+        """
+        now = time.monotonic()
+        hedge_delay = self.hedge_delay()
+        return {
+            "upstreams": [
+                {
+                    "name": upstream.name,
+                    "available": upstream.available(now),
+                    "latency_ewma_ms": round(upstream.latency_ewma * 1000, 1) if upstream.latency_ewma is not None else None,
+                    "requests": upstream.requests,
+                    "failures": upstream.failures,
+                    "consecutive_failures": upstream.consecutive_failures
+                }
+                for upstream in self.upstreams
+            ],
+            "hedging_enabled": self.hedge_enabled,
+            "hedge_delay_ms": round(hedge_delay * 1000, 1) if hedge_delay is not None else None,
+            "hedges": self.hedges,
+            "hedge_rate": round(self.hedges / self.hedgeable, 3) if self.hedgeable else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "hedge_win_rate": round(self.hedge_wins / self.hedges, 3) if self.hedges else 0.0
+        }
+
+
+def parse_upstreams(spec: str) -> List[Upstream]:
+    """
+    Build the upstream list from the GROQ_UPSTREAMS setting.
+
+    The first upstream is always GROQ_API_URL with GROQ_API_KEY. The
+    setting adds comma-separated "url|api_key" entries; an empty url or key
+    means the default one, so "|gsk_second_key" adds a second key on the
+    default endpoint.
+
+    Args:
+        spec: Setting value
+
+    Returns:
+        Upstreams in order of preference
+    """
+    upstreams = [Upstream("default")]
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        api_url, _, api_key = entry.strip().partition("|")
+        upstreams.append(Upstream(f"upstream-{len(upstreams)}", api_url.strip() or None, api_key.strip() or None))
+    return upstreams
@@ -4,6 +4,7 @@ This helps save API tokens by filtering out irrelevant questions early.
 """
 
 from typing import Tuple
+from app.utils.keyword_matcher import KeywordMatcher
 
 
 # Keywords that indicate off-topic questions
@@ -53,6 +54,14 @@ HERBAL_KEYWORDS = {
     "bio", "naturel", "naturelle", "traditionnel",
 }
 
+# Both keyword sets compiled once into a single matcher
+_OFF_TOPIC = "off_topic"
+_HERBAL = "herbal"
+_KEYWORD_MATCHER = KeywordMatcher({
+    **{keyword: _HERBAL for keyword in HERBAL_KEYWORDS},
+    **{keyword: _OFF_TOPIC for keyword in OFF_TOPIC_KEYWORDS},
+})
+
 
 def is_valid_herbalism_topic(message: str) -> Tuple[bool, str]:
     """
@@ -66,19 +75,20 @@ def is_valid_herbalism_topic(message: str) -> Tuple[bool, str]:
         - is_valid: True if topic is valid, False otherwise
         - reason: Explanation of validation result
     """
-    message_lower = message.lower()
-
     # Check for very short messages
     if len(message.strip()) < 3:
         return False, "Message too short"
 
+    # Single pass over the message (whole words, accent-insensitive)
+    matches = _KEYWORD_MATCHER.find_all(message)
+
     # Check for clear off-topic keywords
-    off_topic_found = [kw for kw in OFF_TOPIC_KEYWORDS if kw in message_lower]
+    off_topic_found = [kw for kw, category in matches if category == _OFF_TOPIC]
     if off_topic_found:
         return False, f"Off-topic keywords detected: {', '.join(off_topic_found[:3])}"
 
     # Check for herbal keywords (positive indication)
-    herbal_found = [kw for kw in HERBAL_KEYWORDS if kw in message_lower]
+    herbal_found = [kw for kw, category in matches if category == _HERBAL]
     if herbal_found:
         return True, f"Herbal keywords detected: {', '.join(herbal_found[:3])}"
 
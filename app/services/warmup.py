@@ -0,0 +1,191 @@
+"""
+Cache warm-up of frequent questions at startup.
+Answers a list of frequent questions in the background so that the first
+visitors after a restart are served from cache instead of waiting on Groq.
+"""
+
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.config import settings
+from app.services.chat_pipeline import warm_answer
+from app.services.validator import is_valid_herbalism_topic
+from app.utils.logger import logger
+from app.utils.text import normalize_message
+
+
+def load_warmup_questions(path: str, limit: int) -> List[str]:
+    """
+    Load the questions to warm, most frequent first.
+
+    A .jsonl file is read as a traffic capture (see services/capture.py):
+    questions are ranked by how often they were asked. Any other file is
+    read as one question per line, in order; blank lines and lines
+    starting with "#" are ignored. Questions sharing a cache key are
+    kept once.
+
+    Args:
+        path: Question list or capture file
+        limit: Maximum number of questions
+
+    Returns:
+        Up to `limit` distinct questions
+    """
+    counts: Counter = Counter()
+    first_seen: Dict[str, str] = {}
+
+    with open(path, encoding="utf-8") as questions_file:
+        for line in questions_file:
+            if path.endswith(".jsonl"):
+                try:
+                    record = json.loads(line)
+                    message = record["payload"]["message"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+            else:
+                message = line.strip()
+                if message.startswith("#"):
+                    continue
+            if not isinstance(message, str) or not message.strip():
+                continue
+
+            normalized = normalize_message(message)
+            counts[normalized] += 1
+            first_seen.setdefault(normalized, message.strip())
+
+    # most_common keeps first-seen order among equal counts
+    return [first_seen[normalized] for normalized, _ in counts.most_common(limit)]
+
+
+class CacheWarmer:
+    """
+    Answer a list of questions in the background with bounded concurrency.
+
+    Off-topic questions are skipped (they never reach Groq) and answers
+    already in the cache or the answer store are not requested again.
+    """
+
+    def __init__(self, warm: Callable[[str], Awaitable[bool]], concurrency: int):
+        """
+        Initialize the warmer.
+
+        Args:
+            warm: Coroutine function answering a question; returns True if
+                Groq was called, False if the answer was already cached
+            concurrency: Maximum questions being answered at once
+        """
+        self.warm = warm
+        self.concurrency = concurrency
+
+        self.state = "idle"
+        self.questions = 0
+        self.warmed = 0
+        self.already_cached = 0
+        self.off_topic = 0
+        self.failed = 0
+        self.duration_seconds: Optional[float] = None
+
+        self._task: Optional[asyncio.Task] = None
+
+    async def _warm_one(self, question: str, slots: asyncio.Semaphore) -> None:
+        if not is_valid_herbalism_topic(question)[0]:
+            self.off_topic += 1
+            return
+        async with slots:
+            try:
+                if await self.warm(question):
+                    self.warmed += 1
+                else:
+                    self.already_cached += 1
+            except Exception as e:
+                self.failed += 1
+                logger.warning("Cache warm-up failed for a question: %s", e)
+
+    async def run(self, questions: List[str]) -> None:
+        """
+        Warm all questions and record the outcome.
+
+        Args:
+            questions: Questions to answer
+        """
+        self.state = "running"
+        self.questions = len(questions)
+        started = time.perf_counter()
+
+        slots = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(self._warm_one(question, slots) for question in questions))
+
+        self.duration_seconds = round(time.perf_counter() - started, 2)
+        self.state = "done"
+        logger.info(
+            "Cache warm-up done - warmed: %s, already cached: %s, off-topic: %s, failed: %s, in %.1fs",
+            self.warmed, self.already_cached, self.off_topic, self.failed, self.duration_seconds
+        )
+
+    async def load_and_run(self, path: str, limit: int) -> None:
+        """
+        Load the questions in a worker thread, then warm them.
+
+        Reading and ranking a large capture file does not block the event
+        loop, so the application is ready before the file is loaded.
+
+        Args:
+            path: Question list or capture file (see load_warmup_questions)
+            limit: Maximum number of questions
+        """
+        try:
+            questions = await asyncio.to_thread(load_warmup_questions, path, limit)
+        except OSError as e:
+            self.state = "failed"
+            logger.warning("Cache warm-up skipped - cannot read %s: %s", path, e)
+            return
+
+        logger.info("Cache warm-up started - %s questions from %s", len(questions), path)
+        await self.run(questions)
+
+    def start(self, path: str, limit: int) -> None:
+        """
+        Load the questions and warm them in the background (called on startup).
+
+        Args:
+            path: Question list or capture file (see load_warmup_questions)
+            limit: Maximum number of questions
+        """
+        if self._task is not None and not self._task.done():
+            return
+        self.state = "running"
+        self._task = asyncio.create_task(self.load_and_run(path, limit))
+
+    async def stop(self) -> None:
+        """Cancel a warm-up still running (called on application shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                self.state = "cancelled"
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get warm-up statistics.
+
+        Returns:
+            Dictionary with the warm-up state, outcome counts and duration
+        """
+        return {
+            "enabled": settings.WARMUP_ENABLED,
+            "state": self.state,
+            "questions": self.questions,
+            "warmed": self.warmed,
+            "already_cached": self.already_cached,
+            "off_topic": self.off_topic,
+            "failed": self.failed,
+            "duration_seconds": self.duration_seconds
+        }
+
+
+# Create singleton instance
+cache_warmer = CacheWarmer(warm=warm_answer, concurrency=settings.WARMUP_CONCURRENCY)
@@ -0,0 +1,163 @@
+"""
+Connection bookkeeping for the /ws/chat WebSocket channel.
+Caps the number of open connections, rate-limits messages per connection
+with a token bucket and counts how connections end.
+"""
+
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from starlette.websockets import WebSocketDisconnect
+from app.config import settings
+
+try:
+    from websockets.exceptions import ConnectionClosed
+except ImportError:  # pragma: no cover - depends on the environment
+    ConnectionClosed = OSError
+
+
+# Close codes (RFC 6455 and the IANA registry)
+CLOSE_NORMAL = 1000
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_TRY_AGAIN_LATER = 1013
+
+# Raised when sending to a client that went away: WebSocketDisconnect,
+# ClientDisconnected (an OSError, recent uvicorn) or ConnectionClosed
+# (uvicorn's websockets implementation)
+SEND_DISCONNECTED_ERRORS = (WebSocketDisconnect, OSError, ConnectionClosed)
+
+
+class MessageRateLimiter:
+    """
+    Token bucket limiting the messages of one connection.
+
+    The bucket holds up to `per_minute` messages and refills continuously,
+    so a visitor can send a short burst, then one message every
+    60 / per_minute seconds.
+    """
+
+    __slots__ = ("capacity", "refill_per_second", "tokens", "updated")
+
+    def __init__(self, per_minute: int):
+        """
+        Initialize a full bucket.
+
+        Args:
+            per_minute: Messages allowed per minute (and burst size)
+        """
+        self.capacity = float(per_minute)
+        self.refill_per_second = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def acquire(self) -> float:
+        """
+        Take one message from the bucket.
+
+        Returns:
+            0 if the message is allowed, otherwise seconds until it would be
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.refill_per_second
+
+
+class WebSocketHub:
+    """Track open chat connections and their outcomes."""
+
+    def __init__(self, max_connections: int, max_connections_per_ip: int, allowed_origins: List[str]):
+        """
+        Initialize the hub.
+
+        Args:
+            max_connections: Open connections allowed per process
+            max_connections_per_ip: Open connections allowed per client IP
+            allowed_origins: Origins allowed to connect ("*" allows any)
+        """
+        self.max_connections = max_connections
+        self.max_connections_per_ip = max_connections_per_ip
+        self.allowed_origins = allowed_origins
+
+        self._per_ip: Counter = Counter()
+        self.active = 0
+        self.peak = 0
+        self.opened = 0
+        self.rejected: Counter = Counter()
+        self.closed: Counter = Counter()
+        self.messages = 0
+        self.rate_limited = 0
+
+    def origin_allowed(self, origin: Optional[str]) -> bool:
+        """
+        Check the Origin header of a handshake.
+
+        CORS does not apply to WebSockets, so the allowed origins are
+        enforced here. Clients that send no Origin (not browsers) are let
+        through, like CORS does for them.
+        """
+        return origin is None or "*" in self.allowed_origins or origin in self.allowed_origins
+
+    def open(self, origin: Optional[str], client_ip: str) -> Optional[str]:
+        """
+        Register a new connection.
+
+        Args:
+            origin: Origin header of the handshake
+            client_ip: Client address
+
+        Returns:
+            None if accepted, otherwise the rejection reason
+        """
+        if not self.origin_allowed(origin):
+            reason = "origin"
+        elif self.active >= self.max_connections:
+            reason = "capacity"
+        elif self._per_ip[client_ip] >= self.max_connections_per_ip:
+            reason = "ip_limit"
+        else:
+            self._per_ip[client_ip] += 1
+            self.active += 1
+            self.opened += 1
+            self.peak = max(self.peak, self.active)
+            return None
+        self.rejected[reason] += 1
+        return reason
+
+    def close(self, client_ip: str, reason: str) -> None:
+        """Unregister a connection opened with open()."""
+        self._per_ip[client_ip] -= 1
+        if self._per_ip[client_ip] <= 0:
+            del self._per_ip[client_ip]
+        self.active -= 1
+        self.closed[reason] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get WebSocket statistics.
+
+        Returns:
+            Dictionary with connection counts, message counters and close reasons
+        """
+        return {
+            "active": self.active,
+            "peak": self.peak,
+            "max_connections": self.max_connections,
+            "client_ips": len(self._per_ip),
+            "opened": self.opened,
+            "rejected": dict(self.rejected),
+            "closed": dict(self.closed),
+            "messages": self.messages,
+            "rate_limited": self.rate_limited
+        }
+
+
+# Create singleton instance
+ws_hub = WebSocketHub(
+    max_connections=settings.WS_MAX_CONNECTIONS,
+    max_connections_per_ip=settings.WS_MAX_CONNECTIONS_PER_IP,
+    allowed_origins=settings.ALLOWED_ORIGINS
+)
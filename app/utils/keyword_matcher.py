@@ -0,0 +1,159 @@
+"""
+Single-pass keyword matcher with word-boundary and accent-insensitive matching.
+"""
+
+import unicodedata
+from typing import Dict, List, Tuple
+
+
+# Byte table mapping every non-alphanumeric ASCII byte to a space
+_SEPARATORS = bytes(
+    c if chr(c).isascii() and chr(c).isalnum() else ord(" ")
+    for c in range(256)
+)
+
+_PLURAL_SUFFIXES = (b"s", b"x")
+
+
+def _latin1_tables() -> Tuple[bytes, bytes]:
+    """
+    Build the byte tables folding Latin-1 text like tokenize's NFKD path.
+
+    Returns:
+        Tuple of (translation table, bytes to delete). Letters are
+        lowercased and stripped of their accents, characters with no ASCII
+        decomposition (e.g. "æ", "«") are deleted like NFKD + ASCII does,
+        and the rest become separators.
+    """
+    table = bytearray(_SEPARATORS)
+    delete = bytearray()
+    for c in range(256):
+        folded = unicodedata.normalize("NFKD", chr(c)).encode("ascii", "ignore").lower().translate(_SEPARATORS)
+        if len(folded) == 1:
+            table[c] = folded[0]
+        elif not folded:
+            delete.append(c)
+    return bytes(table), bytes(delete)
+
+
+_LATIN1_FOLD, _LATIN1_DELETE = _latin1_tables()
+
+
+def tokenize(text: str) -> List[bytes]:
+    """
+    Split a text into accent-folded, lowercased ASCII words.
+
+    Every step runs in C, which keeps the cost per character low. Text
+    that fits in Latin-1 (most French messages) is folded by a single
+    byte translation; other text goes through NFKD decomposition and
+    ASCII encoding. Non-Latin characters with no ASCII decomposition are
+    dropped, which is fine for matching French keywords.
+
+    Args:
+        text: Text to tokenize
+
+    Returns:
+        List of words as ASCII bytes ("Valériane," -> b"valeriane")
+    """
+    try:
+        return text.encode("latin-1").translate(_LATIN1_FOLD, _LATIN1_DELETE).split()
+    except UnicodeEncodeError:
+        ascii_text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").lower()
+        return ascii_text.translate(_SEPARATORS).split()
+
+
+def _same_word(word: bytes, keyword_word: bytes) -> bool:
+    """Compare a message word to a keyword word, allowing a plural suffix."""
+    return word == keyword_word or (word[-1:] in _PLURAL_SUFFIXES and word[:-1] == keyword_word)
+
+
+class KeywordMatcher:
+    """
+    Match a fixed set of keywords against messages in one pass.
+
+    Keywords are compiled once into a hash index keyed by their first
+    folded word (and its plural forms). A message is tokenized once and
+    intersected with the index keys, so the cost is linear in the message
+    length and independent of the number of keywords. Matching whole words
+    only avoids substring false positives such as "parti" inside
+    "partie" or "sport" inside "transport".
+    """
+
+    def __init__(self, keywords: Dict[str, str]):
+        """
+        Compile the keywords.
+
+        Args:
+            keywords: Mapping of keyword (as written) to a category label
+        """
+        # word -> list of (following words, keyword, category)
+        self._index: Dict[bytes, List[Tuple[Tuple[bytes, ...], str, str]]] = {}
+
+        compiled = []
+        for keyword, category in keywords.items():
+            words = tuple(tokenize(keyword))
+            if words:
+                compiled.append((words, keyword, category))
+
+        # Exact forms are registered before plural forms so that, for a
+        # message word like "plantes", the keyword "plantes" wins over "plante"
+        for words, keyword, category in compiled:
+            self._index.setdefault(words[0], []).append((words[1:], keyword, category))
+        for words, keyword, category in compiled:
+            for suffix in _PLURAL_SUFFIXES:
+                self._index.setdefault(words[0] + suffix, []).append((words[1:], keyword, category))
+
+        # Longest phrases first so "site web" is tried before a shorter keyword
+        for entries in self._index.values():
+            entries.sort(key=lambda entry: len(entry[0]), reverse=True)
+
+        self._keys = frozenset(self._index)
+
+    @staticmethod
+    def _phrase_follows(words: List[bytes], start: int, rest: Tuple[bytes, ...]) -> bool:
+        """Check whether words[start] is followed by rest at one of its occurrences."""
+        first_word = words[start]
+        for position in range(start, len(words)):
+            if words[position] != first_word:
+                continue
+            following = words[position + 1:position + 1 + len(rest)]
+            if len(following) == len(rest) and all(_same_word(w, r) for w, r in zip(following, rest)):
+                return True
+        return False
+
+    def find_all(self, text: str) -> List[Tuple[str, str]]:
+        """
+        Find every keyword occurring in a text.
+
+        Args:
+            text: Text to scan
+
+        Returns:
+            List of (keyword, category) in order of first appearance,
+            without duplicates
+        """
+        words = tokenize(text)
+        hits = self._keys.intersection(words)
+        if not hits:
+            return []
+
+        # First position of each matched word, recorded in one scan; the
+        # dict keeps them in order of first appearance
+        first_positions: Dict[bytes, int] = {}
+        for position, word in enumerate(words):
+            if word in hits and word not in first_positions:
+                first_positions[word] = position
+
+        found: List[Tuple[str, str]] = []
+        seen = set()
+
+        for word, position in first_positions.items():
+            for rest, keyword, category in self._index[word]:
+                if rest and not self._phrase_follows(words, position, rest):
+                    continue
+                if keyword not in seen:
+                    seen.add(keyword)
+                    found.append((keyword, category))
+                break
+
+        return found
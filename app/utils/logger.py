@@ -1,19 +1,112 @@
 """
 Logging configuration for Diane API.
+
+Records are handed to a bounded in-memory queue and written to stdout by
+a background listener thread, so a slow stdout (pipe backpressure on the
+hosting platform) never blocks the event loop.
 """
 
+import atexit
+import contextvars
+import copy
+import json
 import logging
+import queue
+import random
 import sys
-from typing import Optional
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional, TextIO
+from app.config import settings
+
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Whether the INFO lines of the current request are kept (see sample_request_logs)
+_request_sampled: contextvars.ContextVar[bool] = contextvars.ContextVar("request_sampled", default=True)
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
 
+class RequestSamplingFilter(logging.Filter):
+    """Drop INFO and DEBUG records of requests that were not sampled."""
 
-def setup_logger(name: str = "diane_api", level: int = logging.INFO) -> logging.Logger:
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or _request_sampled.get()
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Queue handler that never blocks the caller.
+
+    Records are only merged with their arguments here; timestamp and line
+    formatting happen in the listener thread. When the queue is full the
+    record is dropped and counted rather than waiting.
+    """
+
+    _exception_formatter = logging.Formatter()
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.enqueued = 0
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks cannot cross threads safely, render them now
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+
+def create_formatter(log_format: str) -> logging.Formatter:
+    """Create the formatter for LOG_FORMAT ("text" or "json")."""
+    if log_format == "json":
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT)
+
+
+def setup_logger(
+    name: str = "diane_api",
+    level: int = logging.INFO,
+    stream: Optional[TextIO] = None,
+    log_format: str = "text",
+    queue_size: int = 10000
+) -> logging.Logger:
     """
     Configure and return a logger instance.
 
     Args:
         name: Logger name
         level: Logging level (default: INFO)
+        stream: Output stream (default: stdout)
+        log_format: "text" or "json"
+        queue_size: Maximum records waiting for the writer thread
 
     Returns:
         Configured logger instance
@@ -26,23 +119,63 @@ def setup_logger(name: str = "diane_api", level: int = logging.INFO) -> logging.
     if logger.handlers:
         return logger
 
-    # Create console handler
-    console_handler = logging.StreamHandler(sys.stdout)
+    # The stream handler runs in the listener thread only
+    console_handler = logging.StreamHandler(stream or sys.stdout)
     console_handler.setLevel(level)
+    console_handler.setFormatter(create_formatter(log_format))
 
-    # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    console_handler.setFormatter(formatter)
+    queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    queue_handler.addFilter(RequestSamplingFilter())
+    logger.addHandler(queue_handler)
 
-    # Add handler to logger
-    logger.addHandler(console_handler)
+    listener = QueueListener(queue_handler.queue, console_handler, respect_handler_level=True)
+    listener.start()
+    # Flush queued records on interpreter exit
+    atexit.register(listener.stop)
 
     return logger
 
 
+def sample_request_logs(rate: Optional[float] = None) -> bool:
+    """
+    Decide whether the INFO lines of the current request are logged.
+
+    The decision is stored in a context variable, so it applies to every
+    line logged while handling the request (including in services) and
+    the lines of one request are kept or dropped together. Warnings and
+    errors are always logged.
+
+    Args:
+        rate: Share of requests to keep (default: LOG_SAMPLE_RATE)
+
+    Returns:
+        True if the request's INFO lines are kept
+    """
+    rate = settings.LOG_SAMPLE_RATE if rate is None else rate
+    sampled = rate >= 1.0 or random.random() < rate
+    _request_sampled.set(sampled)
+    return sampled
+
+
+def get_logging_stats() -> Dict[str, Any]:
+    """
+    Get logging queue statistics.
+
+    Returns:
+        Dictionary with queue depth and dropped record counts
+    """
+    for handler in logger.handlers:
+        if isinstance(handler, NonBlockingQueueHandler):
+            return {
+                "format": settings.LOG_FORMAT,
+                "sample_rate": settings.LOG_SAMPLE_RATE,
+                "queue_depth": handler.queue.qsize(),
+                "enqueued": handler.enqueued,
+                "dropped": handler.dropped
+            }
+    return {}
+
+
 def mask_sensitive_data(text: str, key_to_mask: Optional[str] = None) -> str:
     """
     Mask sensitive data in log messages.
@@ -66,4 +199,8 @@ def mask_sensitive_data(text: str, key_to_mask: Optional[str] = None) -> str:
 
 
 # Create default logger instance
-logger = setup_logger()
+logger = setup_logger(
+    level=logging.getLevelName(settings.LOG_LEVEL),
+    log_format=settings.LOG_FORMAT,
+    queue_size=settings.LOG_QUEUE_SIZE
+)
@@ -0,0 +1,71 @@
+"""
+Pre-encoded JSON responses for the chat endpoints.
+Endpoints keep their response_model for the OpenAPI schema, but return a
+Response built here so FastAPI neither re-validates the data nor runs it
+through its generic encoder.
+"""
+
+from typing import Any
+from starlette.responses import JSONResponse, Response
+from app.services.validator import get_off_topic_response
+from app.utils.json_codec import dumps
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with app.utils.json_codec (orjson when installed)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def chat_response(
+    response: str,
+    conversation_id: str,
+    timestamp: str,
+    is_valid_topic: bool,
+    tokens_used: int,
+    cached: bool = False
+) -> Response:
+    """
+    Encode a ChatResponse body (same fields, same order) without Pydantic.
+
+    Args:
+        response: HTML answer
+        conversation_id: Conversation UUID
+        timestamp: ISO 8601 timestamp
+        is_valid_topic: Whether the question was about herbalism
+        tokens_used: Tokens spent on the answer
+        cached: Whether the answer was served from cache
+
+    Returns:
+        JSON response
+    """
+    return FastJSONResponse({
+        "response": response,
+        "conversation_id": conversation_id,
+        "timestamp": timestamp,
+        "is_valid_topic": is_valid_topic,
+        "tokens_used": tokens_used,
+        "cached": cached
+    })
+
+
+# The off-topic answer is constant: only the conversation ID and timestamp
+# are encoded per request
+_OFF_TOPIC_HEAD = b'{"response":' + dumps(get_off_topic_response()) + b',"conversation_id":'
+_OFF_TOPIC_TAIL = b',"is_valid_topic":false,"tokens_used":0,"cached":false}'
+
+
+def off_topic_response(conversation_id: str, timestamp: str) -> Response:
+    """
+    Build the off-topic ChatResponse from pre-encoded bytes.
+
+    Args:
+        conversation_id: Conversation UUID
+        timestamp: ISO 8601 timestamp
+
+    Returns:
+        JSON response
+    """
+    body = _OFF_TOPIC_HEAD + dumps(conversation_id) + b',"timestamp":' + dumps(timestamp) + _OFF_TOPIC_TAIL
+    return Response(body, media_type="application/json")
@@ -0,0 +1,29 @@
+"""
+Server-sent events helpers for streaming responses.
+"""
+
+from typing import Any, Dict
+from app.utils.json_codec import dumps
+
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+# Headers that keep proxies (Render, nginx) from buffering the stream
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse_event(event: str, data: Dict[str, Any]) -> str:
+    """
+    Format one server-sent event.
+
+    Args:
+        event: Event name (chunk, done, error)
+        data: JSON-serializable event payload
+
+    Returns:
+        SSE-encoded event string
+    """
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
@@ -0,0 +1,43 @@
+"""
+Text normalization helpers shared by the cache and validation layers.
+"""
+
+import re
+import unicodedata
+
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def fold_accents(text: str) -> str:
+    """
+    Lowercase text and strip diacritics.
+
+    Args:
+        text: Text to fold
+
+    Returns:
+        Lowercased text without accents ("Valériane" -> "valeriane")
+    """
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def normalize_message(message: str) -> str:
+    """
+    Normalize a user message so that trivially different phrasings match.
+
+    Case, accents, punctuation and whitespace are folded, so
+    "Quelles plantes pour le sommeil ?" and "quelles plantes pour le sommeil"
+    give the same result.
+
+    Args:
+        message: User's question
+
+    Returns:
+        Normalized message
+    """
+    folded = fold_accents(message)
+    folded = _PUNCTUATION_RE.sub(" ", folded).replace("_", " ")
+    return _WHITESPACE_RE.sub(" ", folded).strip()
@@ -0,0 +1,4 @@
+"""
+Benchmarks and load-testing tools for Diane API.
+Run from the repository root, e.g. python -m benchmarks.bench_validator
+"""
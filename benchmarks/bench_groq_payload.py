@@ -0,0 +1,96 @@
+"""
+Per-request CPU spent encoding Groq payloads and decoding responses.
+
+Compares the previous path (payload dict passed to httpx with json=, then
+response.json()) with the pre-encoded payload prefix of GroqService and
+the JSON codec of app.utils.json_codec (orjson when installed). Each
+measurement builds the httpx request and parses a realistic response, so
+the numbers include httpx's own per-request work.
+
+Usage:
+    python -m benchmarks.bench_groq_payload [--number 5000]
+"""
+
+import argparse
+import json
+import timeit
+from typing import Dict, List, Tuple
+
+import httpx
+
+from app.config import settings
+from app.prompts import DIANE_SYSTEM_PROMPT
+from app.services.groq_service import GroqService
+from app.utils.json_codec import JSON_BACKEND, loads
+
+
+QUESTION = "Quelles plantes pour mieux dormir sans somnolence le lendemain ?"
+
+HISTORY = [
+    {"role": "user", "content": "Bienfaits de la camomille ?"},
+    {"role": "assistant", "content": "<p>La camomille est apaisante et digestive. " * 8 + "</p>"},
+]
+
+RESPONSE = json.dumps({
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 1731500000,
+    "model": settings.MODEL,
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": "<p>🌿 La valériane favorise l'endormissement. " * 20 + "</p>"},
+        "finish_reason": "stop"
+    }],
+    "usage": {"prompt_tokens": 812, "completion_tokens": 380, "total_tokens": 1192},
+    "x_groq": {"id": "req_bench"}
+}, ensure_ascii=False).encode("utf-8")
+
+
+def legacy_request(service: GroqService, history: List[Dict[str, str]]) -> Tuple[bytes, str, int]:
+    """Previous path: build the dict, let httpx encode it, parse with response.json()."""
+    payload = {
+        "model": service.model,
+        "messages": [
+            {"role": "system", "content": DIANE_SYSTEM_PROMPT},
+            *history,
+            {"role": "user", "content": QUESTION}
+        ],
+        "max_tokens": service.max_tokens,
+        "temperature": service.temperature
+    }
+    request = httpx.Request("POST", service.api_url, json=payload, headers={"Authorization": "Bearer gsk_bench"})
+    data = httpx.Response(200, content=RESPONSE).json()
+    return request.content, data["choices"][0]["message"]["content"], data["usage"]["total_tokens"]
+
+
+def fast_request(service: GroqService, history: List[Dict[str, str]]) -> Tuple[bytes, str, int]:
+    """Current path: spliced payload bytes, codec decoding."""
+    payload = service._build_payload(QUESTION, history)
+    request = httpx.Request("POST", service.api_url, content=payload)
+    data = loads(httpx.Response(200, content=RESPONSE).content)
+    return request.content, data["choices"][0]["message"]["content"], data["usage"]["total_tokens"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=5000, help="Requests per measurement")
+    args = parser.parse_args()
+
+    # Measure the encoding only, not knowledge base retrieval
+    settings.KB_ENABLED = False
+    service = GroqService()
+    legacy_size = len(legacy_request(service, [])[0])
+    fast_size = len(fast_request(service, [])[0])
+    print(f"codec: {JSON_BACKEND}, request body: {legacy_size} B before, {fast_size} B after\n")
+
+    print(f"{'request':<16}{'before µs':>11}{'after µs':>11}{'speedup':>10}")
+    for label, history in (("single turn", []), ("follow-up", HISTORY)):
+        legacy = min(timeit.repeat(lambda: legacy_request(service, history), number=args.number, repeat=5))
+        fast = min(timeit.repeat(lambda: fast_request(service, history), number=args.number, repeat=5))
+        legacy_us = legacy / args.number * 1e6
+        fast_us = fast / args.number * 1e6
+        print(f"{label:<16}{legacy_us:>11.2f}{fast_us:>11.2f}{legacy_us / fast_us:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Micro-benchmark of the plant knowledge base.
+
+Measures the retrieval latency added to each Groq call, the size of the
+reference block injected into the prompt, and which questions would be
+answered directly (KB_DIRECT_ANSWERS) without calling Groq.
+
+Usage:
+    python -m benchmarks.bench_knowledge_base [--number 20000]
+"""
+
+import argparse
+import timeit
+
+from app.config import settings
+from app.services.conversation_store import estimate_tokens
+from app.services.knowledge_base import DEFAULT_KB_PATH, load_knowledge_base
+
+
+QUESTIONS = [
+    "Posologie de la valériane ?",
+    "Contre-indications du millepertuis",
+    "Quelles plantes pour mieux dormir ?",
+    "Quelle plante contre le rhume et la toux ?",
+    "Quelles plantes pour une bonne digestion ?",
+    "Puis-je prendre de la valériane enceinte ?",
+    "Bonjour Diane, quelles plantes me conseillez-vous pour mieux dormir ? "
+    "Je prends déjà de la camomille le soir sans effet.",
+    "Quel temps fait-il ?",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="Calls per measurement")
+    args = parser.parse_args()
+
+    kb = load_knowledge_base(settings.KB_PATH or DEFAULT_KB_PATH)
+    print(f"{len(kb.entries)} plants, {len(kb.snippets)} snippets\n")
+    print(f"{'question':<46}{'search µs':>11}{'snippets':>10}{'tokens':>8}  direct")
+    for question in QUESTIONS:
+        seconds = min(timeit.repeat(
+            lambda: kb.search(question, settings.KB_TOP_K, settings.KB_MIN_SCORE),
+            number=args.number,
+            repeat=5
+        ))
+        snippets = len(kb.search(question, settings.KB_TOP_K, settings.KB_MIN_SCORE))
+        context = kb.build_context(question, settings.KB_TOP_K, settings.KB_MIN_SCORE)
+        direct = kb.direct_answer(question, settings.KB_DIRECT_MAX_WORDS) is not None
+        label = question if len(question) <= 44 else question[:41] + "..."
+        print(
+            f"{label:<46}{seconds / args.number * 1e6:>11.2f}{snippets:>10}"
+            f"{estimate_tokens(context) if context else 0:>8}  {'yes' if direct else 'no'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
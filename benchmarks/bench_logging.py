@@ -0,0 +1,119 @@
+"""
+Event-loop stall caused by logging to a slow stdout.
+
+Simulates concurrent chat requests that each log the usual per-request
+lines while a heartbeat task measures how late the event loop wakes it
+up. The output stream sleeps on every write to emulate pipe backpressure.
+Compares a synchronous StreamHandler (previous setup) with the queue
+handler and background writer thread of app.utils.logger.
+
+Usage:
+    python -m benchmarks.bench_logging [--requests 2000] [--write-delay-ms 0.2]
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from typing import Dict, List
+
+from app.utils.logger import DATE_FORMAT, TEXT_FORMAT, setup_logger
+
+
+class SlowStream:
+    """Text stream whose writes block, like a stdout pipe nobody drains fast enough."""
+
+    def __init__(self, write_delay: float):
+        self.write_delay = write_delay
+        self.lines = 0
+
+    def write(self, text: str) -> int:
+        time.sleep(self.write_delay)
+        self.lines += 1
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+def make_sync_logger(stream: SlowStream) -> logging.Logger:
+    """Logger writing in the calling thread, as before."""
+    logger = logging.getLogger("bench_sync")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT))
+    logger.addHandler(handler)
+    return logger
+
+
+async def fake_request(logger: logging.Logger, i: int) -> None:
+    logger.info("Chat request from user: %s, conversation: %s", f"user_{i}", f"conv-{i}")
+    logger.info("Message: %s...", "Quelles plantes pour mieux dormir ?")
+    logger.info("Topic validation passed: %s", "Herbal keywords detected: plantes")
+    await asyncio.sleep(0)
+    logger.info("Sending request to Groq API - Model: %s, Temp: %s", "llama-3.3-70b-versatile", 0.7)
+    await asyncio.sleep(0.001)
+    logger.info("Response generated successfully - Tokens: %s, cached: %s", 380, False)
+
+
+async def measure(logger: logging.Logger, requests: int, concurrency: int) -> Dict[str, float]:
+    """Run the simulated requests and record heartbeat lateness."""
+    lags: List[float] = []
+    done = asyncio.Event()
+
+    async def heartbeat() -> None:
+        interval = 0.001
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - started - interval)
+
+    async def worker(offset: int) -> None:
+        for i in range(offset, requests, concurrency):
+            await fake_request(logger, i)
+
+    beat = asyncio.create_task(heartbeat())
+    started = time.perf_counter()
+    await asyncio.gather(*[worker(offset) for offset in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    done.set()
+    await beat
+
+    lags.sort()
+    return {
+        "wall_s": elapsed,
+        "lag_p50_ms": statistics.median(lags) * 1000,
+        "lag_p99_ms": lags[int(len(lags) * 0.99) - 1] * 1000,
+        "lag_max_ms": lags[-1] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Simulated chat requests")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent requests")
+    parser.add_argument("--write-delay-ms", type=float, default=0.2, help="Blocking time of each stdout write")
+    args = parser.parse_args()
+
+    write_delay = args.write_delay_ms / 1000
+    queue_size = args.requests * 5
+
+    loggers = {
+        "sync": make_sync_logger(SlowStream(write_delay)),
+        "queue": setup_logger("bench_queue", stream=SlowStream(write_delay), queue_size=queue_size),
+    }
+    loggers["queue"].propagate = False
+
+    print(f"{'handler':<8}{'wall s':>9}{'lag p50 ms':>12}{'lag p99 ms':>12}{'lag max ms':>12}")
+    for name, logger in loggers.items():
+        result = asyncio.run(measure(logger, args.requests, args.concurrency))
+        print(
+            f"{name:<8}{result['wall_s']:>9.2f}{result['lag_p50_ms']:>12.2f}"
+            f"{result['lag_p99_ms']:>12.2f}{result['lag_max_ms']:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Throughput of off-topic /chat requests, the most common cheap path.
+
+Runs the API in-process and sends off-topic questions (rejected by the
+validator, no Groq call) from concurrent workers. Compares the current
+pre-encoded response with the previous path, where chat() returned a
+ChatResponse model that FastAPI validated again against response_model
+and serialized with its default encoder.
+
+Usage:
+    python -m benchmarks.bench_off_topic [--requests 5000] [--concurrency 20]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Dict
+
+import httpx
+
+import app.main as main_module
+from app.main import app, limiter
+from app.models import ChatResponse
+from app.utils.logger import logger
+
+
+QUESTIONS = [
+    "Qui a gagné le match de football hier ?",
+    "Quel est le meilleur smartphone cette année ?",
+    "Peux-tu m'aider avec mon code python ?",
+]
+
+
+def legacy_off_topic_response(conversation_id: str, timestamp: str) -> ChatResponse:
+    """Previous off-topic path: a model validated and encoded by FastAPI."""
+    return ChatResponse(
+        response=main_module.get_off_topic_response(),
+        conversation_id=conversation_id,
+        timestamp=timestamp,
+        is_valid_topic=False,
+        tokens_used=0
+    )
+
+
+async def run(requests: int, concurrency: int) -> Dict[str, float]:
+    """Send off-topic requests and measure throughput and CPU per request."""
+    sent = 0
+    errors = 0
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        nonlocal sent, errors
+        while sent < requests:
+            message = QUESTIONS[sent % len(QUESTIONS)]
+            sent += 1
+            response = await client.post("/chat", json={"message": message})
+            if response.status_code != 200 or response.json()["is_valid_topic"]:
+                errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://diane.test") as client:
+        # Warm up imports and caches before measuring
+        await client.post("/chat", json={"message": QUESTIONS[0]})
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+
+    return {"rps": requests / elapsed, "cpu_us": cpu / requests * 1e6, "errors": errors}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000, help="Requests per measurement")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent workers")
+    args = parser.parse_args()
+
+    logger.setLevel(logging.ERROR)
+    limiter.enabled = False
+
+    current = main_module.off_topic_response
+    results = {}
+    for label, builder in (("before", legacy_off_topic_response), ("after", current)):
+        main_module.off_topic_response = builder
+        results[label] = asyncio.run(run(args.requests, args.concurrency))
+    main_module.off_topic_response = current
+
+    print(f"{'':<8}{'req/s':>10}{'CPU µs/req':>13}{'errors':>8}")
+    for label, result in results.items():
+        print(f"{label:<8}{result['rps']:>10.0f}{result['cpu_us']:>13.1f}{result['errors']:>8}")
+    print(f"speedup {results['after']['rps'] / results['before']['rps']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
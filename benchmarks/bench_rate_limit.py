@@ -0,0 +1,68 @@
+"""
+Micro-benchmark of the rate limit storage backends.
+
+Measures the cost of one limiter hit (fixed window, as used by slowapi)
+for each storage: memory:// (per process), shm:// (SQLite on tmpfs,
+shared by the workers of one host) and redis:// when REDIS_URL is set.
+
+Usage:
+    python -m benchmarks.bench_rate_limit [--number 20000] [--keys 100]
+    REDIS_URL=redis://localhost:6379/0 python -m benchmarks.bench_rate_limit
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Dict
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+# Registers the shm:// scheme
+from app.services.rate_limit import SharedMemoryStorage  # noqa: F401
+
+
+def bench(uri: str, number: int, keys: int) -> float:
+    """Return the mean cost of one hit in microseconds."""
+    storage = storage_from_string(uri)
+    storage.reset()
+    limiter = FixedWindowRateLimiter(storage)
+    # High enough that every hit is counted, never rejected
+    item = parse(f"{number * 10}/minute")
+
+    started = time.perf_counter()
+    for i in range(number):
+        limiter.hit(item, f"ip:10.0.{i % keys // 256}.{i % 256}")
+    elapsed = time.perf_counter() - started
+
+    storage.reset()
+    return elapsed / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="Hits per backend")
+    parser.add_argument("--keys", type=int, default=100, help="Distinct client keys")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir="/dev/shm" if os.path.isdir("/dev/shm") else None) as tmp:
+        backends: Dict[str, str] = {
+            "memory": "memory://",
+            "shm": f"shm://{os.path.join(tmp, 'bench_ratelimit.db')}",
+        }
+        if os.getenv("REDIS_URL"):
+            backends["redis"] = os.environ["REDIS_URL"]
+
+        print(f"{'storage':<10}{'µs/hit':>10}{'hits/s':>12}")
+        for name, uri in backends.items():
+            per_hit = bench(uri, args.number, args.keys)
+            print(f"{name:<10}{per_hit:>10.1f}{1e6 / per_hit:>12.0f}")
+
+        if "redis" not in backends:
+            print("(set REDIS_URL to include redis://)")
+
+
+if __name__ == "__main__":
+    main()
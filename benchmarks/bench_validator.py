@@ -0,0 +1,72 @@
+"""
+Micro-benchmark of is_valid_herbalism_topic.
+
+Compares the compiled single-pass matcher with the previous approach
+(one substring test per keyword) on realistic message lengths.
+
+Usage:
+    python -m benchmarks.bench_validator [--number 20000]
+"""
+
+import argparse
+import timeit
+from typing import Tuple
+
+from app.services.validator import HERBAL_KEYWORDS, OFF_TOPIC_KEYWORDS, is_valid_herbalism_topic
+
+
+MESSAGES = {
+    "short (30 chars)": "Bienfaits du thym pour la toux",
+    "typical (120 chars)": (
+        "Bonjour Diane, quelles plantes me conseillez-vous pour mieux dormir ? "
+        "Je prends déjà de la camomille le soir sans effet."
+    ),
+    "long (1000 chars)": (
+        "Bonjour, je souffre d'insomnie depuis plusieurs mois et mon médecin m'a "
+        "conseillé d'essayer la phytothérapie avant un traitement. J'ai lu que la "
+        "valériane, la passiflore et le tilleul pouvaient aider, mais je prends "
+        "aussi un antidépresseur léger et je me demande s'il existe des interactions "
+        "à connaître. Pouvez-vous m'expliquer la posologie habituelle en infusion "
+        "ou en décoction, le moment idéal pour la prise, et les précautions à "
+        "respecter, notamment pour une femme de 45 ans qui allaite encore son "
+        "dernier enfant ? Je voudrais aussi savoir si la mélisse ou la lavande "
+        "peuvent être associées sans risque, et pendant combien de semaines une "
+        "cure est raisonnable avant de faire une pause. Enfin, existe-t-il des "
+        "plantes pour réduire l'anxiété de la journée qui ne provoquent pas de "
+        "somnolence au travail ? Merci beaucoup pour vos conseils éclairés et "
+        "votre patience, je débute complètement dans ce domaine et je préfère "
+        "être prudente avant de commencer quoi que ce soit de nouveau chez moi."
+    ),
+}
+
+
+def legacy_is_valid_herbalism_topic(message: str) -> Tuple[bool, str]:
+    """Previous implementation: substring test per keyword."""
+    message_lower = message.lower()
+    if len(message.strip()) < 3:
+        return False, "Message too short"
+    off_topic_found = [kw for kw in OFF_TOPIC_KEYWORDS if kw in message_lower]
+    if off_topic_found:
+        return False, f"Off-topic keywords detected: {', '.join(off_topic_found[:3])}"
+    herbal_found = [kw for kw in HERBAL_KEYWORDS if kw in message_lower]
+    if herbal_found:
+        return True, f"Herbal keywords detected: {', '.join(herbal_found[:3])}"
+    return True, "No clear off-topic indicators, allowing through"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="Calls per measurement")
+    args = parser.parse_args()
+
+    print(f"{'message':<22}{'legacy µs':>12}{'compiled µs':>14}{'speedup':>10}")
+    for label, message in MESSAGES.items():
+        legacy = min(timeit.repeat(lambda: legacy_is_valid_herbalism_topic(message), number=args.number, repeat=5))
+        compiled = min(timeit.repeat(lambda: is_valid_herbalism_topic(message), number=args.number, repeat=5))
+        legacy_us = legacy / args.number * 1e6
+        compiled_us = compiled / args.number * 1e6
+        print(f"{label:<22}{legacy_us:>12.2f}{compiled_us:>14.2f}{legacy_us / compiled_us:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Local stand-in for the Groq OpenAI-compatible API.
+
+Serves /openai/v1/chat/completions (plain and streamed) and
+/openai/v1/models with configurable latency, token counts and error rate,
+so the API can be tested and load-tested offline.
+
+Usage:
+    python -m benchmarks.fake_groq [--port 8100] [--latency-ms 300] [--error-rate 0.05]
+
+Then start the API against it:
+    GROQ_API_KEY=fake GROQ_API_URL=http://127.0.0.1:8100/openai/v1/chat/completions \\
+    GROQ_MODELS_URL=http://127.0.0.1:8100/openai/v1/models uvicorn app.main:app
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+CHAT_COMPLETIONS_PATH = "/openai/v1/chat/completions"
+MODELS_PATH = "/openai/v1/models"
+
+# About 4 characters per token, like the real answers
+_ANSWER_SENTENCE = (
+    "<p>La <strong>valériane</strong> et la <strong>passiflore</strong> sont "
+    "traditionnellement utilisées pour favoriser l'endormissement.</p>"
+)
+
+
+def make_answer(completion_tokens: int) -> str:
+    """Build an HTML answer of roughly completion_tokens tokens."""
+    repeats = max(completion_tokens * 4 // len(_ANSWER_SENTENCE), 1)
+    return _ANSWER_SENTENCE * repeats
+
+
+def create_fake_groq_app(
+    latency_ms: float = 300.0,
+    latency_jitter_ms: float = 50.0,
+    prompt_tokens: int = 900,
+    completion_tokens: int = 380,
+    error_rate: float = 0.0,
+    error_status: int = 503,
+    stream_chunks: int = 20,
+    seed: Optional[int] = None
+) -> FastAPI:
+    """
+    Create the fake Groq application.
+
+    Args:
+        latency_ms: Mean response time (for streams: time to the last chunk)
+        latency_jitter_ms: Uniform jitter added to or removed from the latency
+        prompt_tokens: Prompt tokens reported in usage
+        completion_tokens: Completion tokens generated (capped by max_tokens, reported as finish_reason "length")
+        error_rate: Share of completion requests answered with error_status
+        error_status: Status of injected errors (429 and 503 carry Retry-After)
+        stream_chunks: Number of content chunks in streamed answers
+        seed: Random seed for reproducible latency and errors
+
+    Returns:
+        FastAPI app; app.state.stats counts served requests by outcome
+    """
+    app = FastAPI(title="Fake Groq API")
+    rng = random.Random(seed)
+    stats: Dict[str, int] = {"completions": 0, "streams": 0, "errors": 0, "models": 0}
+    app.state.stats = stats
+
+    def latency() -> float:
+        jitter = rng.uniform(-latency_jitter_ms, latency_jitter_ms)
+        return max(latency_ms + jitter, 0.0) / 1000
+
+    def finish_reason(payload: Dict[str, Any]) -> str:
+        return "length" if completion_tokens > int(payload.get("max_tokens") or completion_tokens) else "stop"
+
+    def usage(payload: Dict[str, Any]) -> Dict[str, int]:
+        completion = min(completion_tokens, int(payload.get("max_tokens") or completion_tokens))
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion,
+            "total_tokens": prompt_tokens + completion
+        }
+
+    async def stream_chunks_of(payload: Dict[str, Any], delay: float) -> AsyncIterator[str]:
+        token_usage = usage(payload)
+        answer = make_answer(token_usage["completion_tokens"])
+        size = max(len(answer) // stream_chunks, 1)
+        for start in range(0, len(answer), size):
+            await asyncio.sleep(delay / stream_chunks)
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "delta": {"content": answer[start:start + size]}, "finish_reason": None}]
+            }
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        final = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "model": payload.get("model"),
+            "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason(payload)}],
+            "x_groq": {"usage": token_usage}
+        }
+        yield f"data: {json.dumps(final)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    @app.post(CHAT_COMPLETIONS_PATH)
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        delay = latency()
+
+        if error_rate and rng.random() < error_rate:
+            stats["errors"] += 1
+            await asyncio.sleep(delay / 10)
+            headers = {"Retry-After": "1"} if error_status in (429, 503) else None
+            return JSONResponse(
+                status_code=error_status,
+                content={"error": {"message": "Injected error", "type": "fake_groq"}},
+                headers=headers
+            )
+
+        if payload.get("stream"):
+            stats["streams"] += 1
+            return StreamingResponse(stream_chunks_of(payload, delay), media_type="text/event-stream")
+
+        await asyncio.sleep(delay)
+        stats["completions"] += 1
+        token_usage = usage(payload)
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": make_answer(token_usage["completion_tokens"])},
+                "finish_reason": finish_reason(payload)
+            }],
+            "usage": token_usage
+        }
+
+    @app.get(MODELS_PATH)
+    async def models():
+        stats["models"] += 1
+        return {"object": "list", "data": [{"id": "llama-3.3-70b-versatile", "object": "model"}]}
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--prompt-tokens", type=int, default=900)
+    parser.add_argument("--completion-tokens", type=int, default=380)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--stream-chunks", type=int, default=20)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    app = create_fake_groq_app(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        prompt_tokens=args.prompt_tokens,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        stream_chunks=args.stream_chunks
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Load test of the /chat endpoint.
+
+Drives /chat at a fixed concurrency and reports latency percentiles,
+throughput and error rates. By default the API runs in-process with
+Groq replaced by the local fake (benchmarks.fake_groq), so it works
+offline. Rate limiting and token budgets are disabled in that mode.
+
+Usage:
+    python -m benchmarks.load_test [--requests 2000] [--concurrency 50] [--distinct 200]
+    python -m benchmarks.load_test --latency-ms 800 --error-rate 0.05
+    python -m benchmarks.load_test --url http://127.0.0.1:8000   # running server
+
+Against a running server, raise RATE_LIMIT_PER_MINUTE and the token
+budgets first or most requests will be rejected with 429.
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+
+from benchmarks.fake_groq import create_fake_groq_app
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(q / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def make_question(i: int, distinct: int) -> str:
+    """Question number i, cycling through `distinct` different questions."""
+    return f"Quelles plantes pour mieux dormir ? (variante {i % distinct})"
+
+
+async def build_in_process_client(args: argparse.Namespace) -> httpx.AsyncClient:
+    """Wire the API to the fake Groq app and return a client calling it in-process."""
+    from app.config import settings
+    from app.main import app, limiter
+    from app.services.groq_service import groq_service
+    from app.utils.logger import logger
+
+    logger.setLevel(logging.ERROR)
+    limiter.enabled = False
+    settings.TOKEN_BUDGET_ENABLED = False
+
+    fake_groq = create_fake_groq_app(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_ms / 5,
+        error_rate=args.error_rate,
+        seed=1
+    )
+    await groq_service.close()
+    groq_service.transport = httpx.ASGITransport(app=fake_groq)
+    groq_service.api_key = groq_service.api_key or "fake-key"
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://diane.test", timeout=60)
+
+
+async def run_load(client: httpx.AsyncClient, path: str, requests: int, concurrency: int, distinct: int) -> Dict[str, Any]:
+    """Send the requests and collect per-request results."""
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    cached = 0
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index, cached
+        while next_index < requests:
+            i = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, json={"message": make_question(i, distinct)})
+                status: Any = response.status_code
+                if status == 200 and response.json().get("cached"):
+                    cached += 1
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if status != 200)
+    return {
+        "requests": requests,
+        "elapsed_s": elapsed,
+        "rps": requests / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "error_rate": errors / requests,
+        "cached_ratio": cached / requests,
+        "statuses": dict(statuses)
+    }
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(f"requests      {result['requests']}")
+    print(f"elapsed       {result['elapsed_s']:.2f} s")
+    print(f"throughput    {result['rps']:.1f} req/s")
+    print(
+        f"latency ms    p50 {result['p50_ms']:.1f}  p95 {result['p95_ms']:.1f}  "
+        f"p99 {result['p99_ms']:.1f}  max {result['max_ms']:.1f}"
+    )
+    print(f"error rate    {result['error_rate']:.2%}")
+    print(f"cached        {result['cached_ratio']:.2%}")
+    print(f"statuses      {result['statuses']}")
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    client: Optional[httpx.AsyncClient] = None
+    try:
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        else:
+            client = await build_in_process_client(args)
+        return await run_load(client, args.path, args.requests, args.concurrency, args.distinct)
+    finally:
+        if client is not None:
+            await client.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running API (default: in-process with fake Groq)")
+    parser.add_argument("--path", default="/chat", help="Endpoint to drive")
+    parser.add_argument("--requests", type=int, default=2000, help="Total requests")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent clients")
+    parser.add_argument("--distinct", type=int, default=200, help="Distinct questions (controls cache hits)")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Fake Groq latency (in-process only)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fake Groq error rate (in-process only)")
+    args = parser.parse_args()
+
+    print_report(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
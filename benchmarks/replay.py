@@ -0,0 +1,191 @@
+"""
+Replay captured chat traffic.
+
+Reads a capture file written by the capture middleware (CAPTURE_ENABLED)
+and replays each request at its original arrival offset, scaled by
+--speed. The file is streamed, so large captures do not need to fit in
+memory. Reports latency percentiles, status counts, cache hit rate and
+how far the sender fell behind the original schedule.
+
+Usage:
+    python -m benchmarks.replay captures/chat_requests.jsonl [--speed 2]
+    python -m benchmarks.replay capture.jsonl --speed 0 --concurrency 50   # as fast as possible
+    python -m benchmarks.replay capture.jsonl --url http://127.0.0.1:8000
+
+Without --url the API runs in-process against the fake Groq (see
+benchmarks.load_test); --keep-limits keeps rate limits and token budgets
+enabled to test limiter changes.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+
+from benchmarks.load_test import build_in_process_client, percentile
+
+
+def iter_capture(path: str, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the valid records of a capture file.
+
+    Args:
+        path: JSONL capture file
+        limit: Maximum number of records
+
+    Yields:
+        Records with "ts", "path" and "payload" keys; malformed lines
+        and lines without a message are skipped
+    """
+    count = 0
+    with open(path, encoding="utf-8") as capture_file:
+        for line in capture_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(record, dict) or not isinstance(record.get("payload"), dict):
+                continue
+            if "ts" not in record or not record["payload"].get("message"):
+                continue
+            yield record
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+
+def is_cached(response: httpx.Response) -> bool:
+    """Whether a JSON or streamed chat response was served from cache."""
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        for event in reversed(response.text.split("\n\n")):
+            if event.startswith("event: done"):
+                return bool(json.loads(event.split("data: ", 1)[1]).get("cached"))
+        return False
+    return bool(response.json().get("cached"))
+
+
+async def replay(
+    client: httpx.AsyncClient,
+    records: Iterator[Dict[str, Any]],
+    speed: float,
+    concurrency: int
+) -> Dict[str, Any]:
+    """Replay the records and collect per-request results."""
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Counter = Counter()
+    lags: List[float] = []
+    cached = 0
+    in_flight = asyncio.Semaphore(concurrency)
+
+    async def send(record: Dict[str, Any]) -> None:
+        nonlocal cached
+        started = time.perf_counter()
+        try:
+            response = await client.post(record["path"], json=record["payload"])
+            status: Any = response.status_code
+            if status == 200 and is_cached(response):
+                cached += 1
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        finally:
+            in_flight.release()
+        latencies[record["path"]].append(time.perf_counter() - started)
+        statuses[status] += 1
+
+    tasks = []
+    first_ts: Optional[float] = None
+    started = time.perf_counter()
+
+    for record in records:
+        if first_ts is None:
+            first_ts = record["ts"]
+        if speed > 0:
+            due = started + (record["ts"] - first_ts) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lags.append(max(time.perf_counter() - due, 0.0))
+        await in_flight.acquire()
+        tasks.append(asyncio.create_task(send(record)))
+
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    total = sum(statuses.values())
+    errors = sum(count for status, count in statuses.items() if status != 200)
+    lags.sort()
+    return {
+        "requests": total,
+        "elapsed_s": elapsed,
+        "rps": total / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            path: {
+                "count": len(values),
+                "p50": percentile(sorted(values), 50) * 1000,
+                "p95": percentile(sorted(values), 95) * 1000,
+                "p99": percentile(sorted(values), 99) * 1000
+            }
+            for path, values in latencies.items()
+        },
+        "error_rate": errors / total if total else 0.0,
+        "cache_hit_rate": cached / total if total else 0.0,
+        "schedule_lag_p99_ms": percentile(lags, 99) * 1000,
+        "statuses": dict(statuses)
+    }
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(f"requests        {result['requests']}")
+    print(f"elapsed         {result['elapsed_s']:.2f} s")
+    print(f"throughput      {result['rps']:.1f} req/s")
+    for path, stats in sorted(result["latency_ms"].items()):
+        print(
+            f"{path:<16}n={stats['count']:<7} p50 {stats['p50']:.1f}  "
+            f"p95 {stats['p95']:.1f}  p99 {stats['p99']:.1f} ms"
+        )
+    print(f"error rate      {result['error_rate']:.2%}")
+    print(f"cache hit rate  {result['cache_hit_rate']:.2%}")
+    print(f"schedule lag    p99 {result['schedule_lag_p99_ms']:.1f} ms")
+    print(f"statuses        {result['statuses']}")
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    client: Optional[httpx.AsyncClient] = None
+    try:
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        else:
+            client = await build_in_process_client(args)
+            if args.keep_limits:
+                from app.config import settings
+                from app.main import limiter
+                limiter.enabled = True
+                settings.TOKEN_BUDGET_ENABLED = True
+        records = iter_capture(args.capture, args.limit)
+        return await replay(client, records, args.speed, args.concurrency)
+    finally:
+        if client is not None:
+            await client.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="JSONL capture file")
+    parser.add_argument("--url", help="Base URL of a running API (default: in-process with fake Groq)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time scale (2 = twice as fast, 0 = no pacing)")
+    parser.add_argument("--concurrency", type=int, default=200, help="Maximum requests in flight")
+    parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    parser.add_argument("--keep-limits", action="store_true", help="Keep rate limits and token budgets (in-process)")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Fake Groq latency (in-process only)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fake Groq error rate (in-process only)")
+    args = parser.parse_args()
+
+    print_report(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Hold thousands of mostly idle /ws/chat connections and measure memory.
+
+Starts the API with uvicorn in a subprocess (fake Groq key, no Groq
+calls needed), opens --connections WebSockets in waves, and reports the
+server's resident memory before and after, i.e. the cost of one open
+connection. While connections are held, a share of them (--active-share)
+sends an off-topic question every --interval seconds, so the server
+also answers traffic instead of only holding sockets.
+
+Usage:
+    python -m benchmarks.ws_idle_connections [--connections 2000] [--hold 30]
+    python -m benchmarks.ws_idle_connections --url ws://127.0.0.1:8000/ws/chat --pid 1234
+
+With --url, connections go to an already running server; pass its --pid
+to read its memory (Linux only).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import websockets
+
+
+def rss_kib(pid: int) -> Optional[int]:
+    """Resident memory of a process in KiB (None if unavailable)."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def raise_fd_limit(connections: int) -> None:
+    """Allow enough sockets for the client (and the server it starts)."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, max(soft, 2 * connections + 256))
+    if wanted > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+    if wanted < connections + 64:
+        print(f"warning: open file limit {wanted} is too low for {connections} connections")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, connections: int, ws_impl: str) -> subprocess.Popen:
+    """Start the API with limits sized for the test."""
+    env = dict(
+        os.environ,
+        GROQ_API_KEY=os.environ.get("GROQ_API_KEY", "fake-key"),
+        LOG_LEVEL="WARNING",
+        WS_MAX_CONNECTIONS=str(connections + 100),
+        WS_MAX_CONNECTIONS_PER_IP=str(connections + 100),
+        WS_IDLE_TIMEOUT="3600",
+        WS_MESSAGES_PER_MINUTE="1000",
+        HEALTH_CHECK_INTERVAL="3600",
+        WARMUP_ENABLED="false"
+    )
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--ws", ws_impl, "--log-level", "warning", "--no-access-log"
+        ],
+        env=env
+    )
+
+
+async def wait_until_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with websockets.connect(url) as websocket:
+                await websocket.recv()
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def hold(args: argparse.Namespace, url: str, pid: Optional[int]) -> Dict[str, Any]:
+    """Open the connections, keep some of them busy, then report."""
+    baseline = rss_kib(pid) if pid else None
+    sockets: List[Any] = []
+    failures = 0
+    started = time.perf_counter()
+
+    async def open_one() -> None:
+        nonlocal failures
+        try:
+            websocket = await websockets.connect(url, ping_interval=None, max_queue=4)
+            await websocket.recv()
+            sockets.append(websocket)
+        except (OSError, websockets.WebSocketException):
+            failures += 1
+
+    for wave_start in range(0, args.connections, args.wave):
+        wave = min(args.wave, args.connections - wave_start)
+        await asyncio.gather(*(open_one() for _ in range(wave)))
+    open_seconds = time.perf_counter() - started
+
+    # Let the server settle before reading its memory
+    await asyncio.sleep(1.0)
+    held = rss_kib(pid) if pid else None
+
+    latencies: List[float] = []
+    active = random.Random(1).sample(sockets, int(len(sockets) * args.active_share))
+
+    async def chat(websocket: Any) -> None:
+        deadline = time.monotonic() + args.hold
+        while time.monotonic() < deadline:
+            sent = time.perf_counter()
+            await websocket.send(json.dumps({"message": "Qui a gagné le match de football hier ?"}))
+            while json.loads(await websocket.recv())["event"] not in ("done", "error"):
+                pass
+            latencies.append(time.perf_counter() - sent)
+            await asyncio.sleep(args.interval)
+
+    await asyncio.gather(*(chat(websocket) for websocket in active), asyncio.sleep(args.hold))
+    after = rss_kib(pid) if pid else None
+
+    await asyncio.gather(*(websocket.close() for websocket in sockets), return_exceptions=True)
+
+    latencies.sort()
+    return {
+        "connections": len(sockets),
+        "failures": failures,
+        "open_seconds": open_seconds,
+        "rss_baseline_kib": baseline,
+        "rss_held_kib": held,
+        "rss_after_traffic_kib": after,
+        "messages": len(latencies),
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0
+    }
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(f"connections     {result['connections']} open, {result['failures']} failed "
+          f"({result['open_seconds']:.1f} s to open)")
+    baseline, held, after = result["rss_baseline_kib"], result["rss_held_kib"], result["rss_after_traffic_kib"]
+    if baseline is not None and held is not None and result["connections"]:
+        per_connection = (held - baseline) / result["connections"]
+        print(f"server RSS      {baseline / 1024:.1f} MiB idle -> {held / 1024:.1f} MiB held "
+              f"-> {after / 1024:.1f} MiB after traffic")
+        print(f"per connection  {per_connection:.1f} KiB")
+    print(f"messages        {result['messages']} (p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms)")
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    server: Optional[subprocess.Popen] = None
+    url, pid = args.url, args.pid
+    try:
+        if not url:
+            port = free_port()
+            server = start_server(port, args.connections, args.ws)
+            url, pid = f"ws://127.0.0.1:{port}/ws/chat", server.pid
+            await wait_until_ready(url)
+        return await hold(args, url, pid)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=2000, help="WebSocket connections to hold")
+    parser.add_argument("--wave", type=int, default=200, help="Connections opened concurrently")
+    parser.add_argument("--hold", type=float, default=30.0, help="Seconds to hold the connections")
+    parser.add_argument("--active-share", type=float, default=0.05, help="Share of connections sending messages")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between messages of an active connection")
+    parser.add_argument("--ws", default="websockets", help="uvicorn WebSocket implementation (websockets, wsproto)")
+    parser.add_argument("--url", help="WebSocket URL of a running API (default: start one)")
+    parser.add_argument("--pid", type=int, help="PID of the running API, to read its memory")
+    args = parser.parse_args()
+
+    raise_fd_limit(args.connections)
+    print_report(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,42 @@
 Unit tests for Diane API.
 """
 
+import asyncio
+import json
+from contextlib import aclosing
+import httpx
 import pytest
 from fastapi.testclient import TestClient
-from app.main import app
+from starlette.websockets import WebSocket, WebSocketDisconnect
+from app.config import settings
+from app import main
+from app.main import app, limiter
+from app.services import batch
+from app.services.groq_service import GroqServiceError, groq_service
+from app.services.metrics import REQUESTS
 from app.services.validator import is_valid_herbalism_topic
-from app.models import generate_conversation_id
+from app.models import BatchChatResponse, ChatResponse, generate_conversation_id
+from app.services.token_budget import TokenBudgetLimiter, token_budget
+from app.services.websocket import ws_hub
+from benchmarks.fake_groq import create_fake_groq_app
 
 
 # Create test client
 client = TestClient(app)
 
 
+@pytest.fixture(scope="module", autouse=True)
+def fake_groq():
+    """Answer Groq calls from the local fake so tests run offline without a key."""
+    saved = groq_service.transport, groq_service.api_key
+    groq_service.transport = httpx.ASGITransport(app=create_fake_groq_app(latency_ms=0, latency_jitter_ms=0))
+    groq_service.api_key = "test-key"
+    groq_service._client = None
+    yield
+    groq_service.transport, groq_service.api_key = saved
+    groq_service._client = None
+
+
 class TestHealthEndpoints:
     """Test health check endpoints."""
 
@@ -84,6 +109,17 @@ class TestChatEndpoint:
         assert data["tokens_used"] == 0
         assert "spécialisée exclusivement" in data["response"]
 
+    def test_chat_responses_match_the_model(self):
+        """Test that pre-encoded bodies are exactly what ChatResponse would produce."""
+        for message in ("Qui a gagné le match de football hier ?", "Bienfaits du thym ?"):
+            data = client.post("/chat", json={"message": message}).json()
+            assert list(data) == list(ChatResponse.model_fields)
+            assert ChatResponse(**data).model_dump() == data
+
+        schema = client.get("/openapi.json").json()
+        chat_schema = schema["paths"]["/chat"]["post"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert chat_schema == {"$ref": "#/components/schemas/ChatResponse"}
+
     def test_chat_invalid_json(self):
         """Test chat with invalid JSON."""
         response = client.post(
@@ -93,6 +129,305 @@ class TestChatEndpoint:
         )
         assert response.status_code == 422
 
+    def test_chat_token_budget_exhausted(self):
+        """Test that a user without token budget left gets a 429."""
+        token_budget.reserve("budget_test_user", None, token_budget.user_capacity)
+        payload = {
+            "message": "Quelle tisane de romarin après le repas ?",
+            "user_id": "budget_test_user"
+        }
+        response = client.post("/chat", json=payload)
+        assert response.status_code == 429
+        assert response.json()["error"] == "Quota de tokens dépassé"
+        assert int(response.headers["Retry-After"]) >= 1
+
+    def test_quota_endpoint(self):
+        """Test GET /quota reports only the caller's IP budget."""
+        response = client.get("/quota", params={"user_id": "quota_test_user"})
+        assert response.status_code == 200
+        data = response.json()
+        assert set(data["budgets"]) == {"ip"}
+        assert data["budgets"]["ip"]["key"] == "ip:testclient"
+
+    def test_quota_endpoint_is_rate_limited(self):
+        """Test that GET /quota has its own rate limit."""
+        enabled = limiter.enabled
+        limiter.enabled = True
+        limiter.reset()
+        statuses = [client.get("/quota").status_code for _ in range(settings.QUOTA_RATE_LIMIT_PER_MINUTE + 1)]
+        limiter.reset()
+        limiter.enabled = enabled
+        assert statuses[-1] == 429
+        assert set(statuses[:-1]) == {200}
+
+    def test_metrics_endpoint(self):
+        """Test GET /metrics exposes request outcomes and latencies."""
+        client.post("/chat", json={"message": "Qui a gagné le match de football hier ?"})
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'diane_requests_total{endpoint="/chat",outcome="off_topic"}' in response.text
+        assert "diane_validation_duration_seconds_count" in response.text
+        assert 'diane_request_duration_seconds_bucket{endpoint="/chat",le="+Inf"}' in response.text
+
+
+class TestChatStreamEndpoint:
+    """Test streaming chat endpoint."""
+
+    def test_stream_off_topic_single_event(self):
+        """Test that off-topic questions produce one final event."""
+        payload = {
+            "message": "Qui a gagné le match de football hier ?"
+        }
+        response = client.post("/chat/stream", json=payload)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [e for e in response.text.split("\n\n") if e]
+        assert len(events) == 1
+        assert events[0].startswith("event: done")
+        data = json.loads(events[0].split("data: ", 1)[1])
+        assert data["is_valid_topic"] == False
+        assert data["tokens_used"] == 0
+        assert "conversation_id" in data
+
+    def test_stream_valid_question_chunks(self):
+        """Test that a herbal question streams chunks then a final event."""
+        payload = {
+            "message": "Comment préparer une infusion de sauge ?"
+        }
+        response = client.post("/chat/stream", json=payload)
+        assert response.status_code == 200
+        events = [e for e in response.text.split("\n\n") if e]
+        assert events[0].startswith("event: chunk")
+        assert events[-1].startswith("event: done")
+        data = json.loads(events[-1].split("data: ", 1)[1])
+        assert data["is_valid_topic"] == True
+        assert data["tokens_used"] > 0
+
+    def test_stream_closed_early_is_charged(self, monkeypatch):
+        """Test that a client hanging up mid-stream keeps its reservation charged."""
+        budget = TokenBudgetLimiter(user_capacity=20_000, ip_capacity=20_000, window_seconds=3600, max_keys=10)
+        monkeypatch.setattr(main, "token_budget", budget)
+
+        async def read_first_chunk():
+            events = main._chat_events("Quelle dose de mélisse le soir ?", generate_conversation_id(), True, "hang_up")
+            async with aclosing(events):
+                async for event, _ in events:
+                    if event == "chunk":
+                        break
+
+        asyncio.run(read_first_chunk())
+        assert budget.get_quota("hang_up", None)["user_id"]["remaining"] <= 20_000 - settings.MAX_TOKENS
+        assert budget.get_stats()["tokens_charged"] == settings.MAX_TOKENS
+
+
+class TestChatBatchEndpoint:
+    """Test the batch chat endpoint."""
+
+    @pytest.fixture(autouse=True)
+    def no_rate_limit(self, monkeypatch):
+        monkeypatch.setattr(limiter, "enabled", False)
+
+    def test_batch_results_in_order_with_duplicates(self):
+        """Test that duplicates are answered once and results keep request order."""
+        items = [
+            {"message": "Bienfaits du romarin pour la mémoire ?"},
+            {"message": "Qui a gagné le match de football hier ?"},
+            {"message": "bienfaits du ROMARIN pour la memoire"},
+            {"message": "Quelle tisane de verveine le soir ?"}
+        ]
+        response = client.post("/chat/batch", json={"items": items})
+        assert response.status_code == 200
+        data = response.json()
+
+        assert [r["index"] for r in data["results"]] == [0, 1, 2, 3]
+        assert data["results"][1]["is_valid_topic"] is False
+        assert data["results"][2]["response"] == data["results"][0]["response"]
+        assert data["results"][2]["cached"] is True
+        assert data["results"][2]["tokens_used"] == 0
+        summary = data["summary"]
+        assert (summary["items"], summary["unique_questions"], summary["off_topic"]) == (4, 2, 1)
+        assert summary["errors"] == 0
+        assert summary["tokens_used"] == sum(r["tokens_used"] for r in data["results"])
+        assert BatchChatResponse(**data)
+
+    def test_batch_streams_ndjson(self):
+        """Test that stream=true returns one line per item, then the summary."""
+        items = [{"message": "Propriétés de l'ortie ?"}, {"message": "Qui a gagné le match de football hier ?"}]
+        response = client.post("/chat/batch", json={"items": items, "stream": True})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(line["index"] for line in lines[:-1]) == [0, 1]
+        assert lines[-1]["summary"]["items"] == 2
+
+    def test_batch_failures_are_recorded_in_metrics(self, monkeypatch):
+        """Test that a batch with failed items is not counted as valid."""
+        async def failing_generate_answer(*args, **kwargs):
+            raise GroqServiceError("API returned status 503", status_code=503)
+
+        monkeypatch.setattr(batch, "generate_answer", failing_generate_answer)
+        failures_before = REQUESTS.labels("/chat/batch", "groq_error").value
+        response = client.post("/chat/batch", json={"items": [{"message": "Propriétés de l'ortie ?"}]})
+
+        assert response.json()["summary"]["errors"] == 1
+        assert REQUESTS.labels("/chat/batch", "groq_error").value == failures_before + 1
+
+    def test_batch_limits(self):
+        """Test the item count bounds and the batch rate limit."""
+        assert client.post("/chat/batch", json={"items": []}).status_code == 422
+        too_many = [{"message": "Thym ?"}] * (settings.BATCH_MAX_ITEMS + 1)
+        assert client.post("/chat/batch", json={"items": too_many}).status_code == 422
+
+        limiter.enabled = True
+        limiter.reset()
+        statuses = [
+            client.post("/chat/batch", json={"items": [{"message": "Qui a gagné le match de football hier ?"}]}).status_code
+            for _ in range(settings.BATCH_RATE_LIMIT_PER_MINUTE + 1)
+        ]
+        limiter.reset()
+        assert statuses[-1] == 429
+        assert set(statuses[:-1]) == {200}
+
+
+def receive_answer(websocket):
+    """Collect the frames of one answer, up to its done or error event."""
+    frames = []
+    while True:
+        frames.append(websocket.receive_json())
+        if frames[-1]["event"] in ("done", "error"):
+            return frames
+
+
+class TestChatWebSocket:
+    """Test the WebSocket chat channel."""
+
+    def test_questions_are_streamed_on_one_connection(self):
+        """Test that several questions share a connection and conversation."""
+        with client.websocket_connect("/ws/chat") as websocket:
+            ready = websocket.receive_json()
+            assert ready["event"] == "ready"
+            conversation_id = ready["data"]["conversation_id"]
+
+            websocket.send_json({"message": "Comment utiliser la mélisse en tisane ?"})
+            frames = receive_answer(websocket)
+            assert {frame["event"] for frame in frames[:-1]} == {"chunk"}
+            done = frames[-1]["data"]
+            assert done["conversation_id"] == conversation_id
+            assert done["response"] == "".join(frame["data"]["content"] for frame in frames[:-1])
+            assert ChatResponse(**done)
+
+            websocket.send_json({"message": "Qui a gagné le match de football hier ?"})
+            frames = receive_answer(websocket)
+            assert len(frames) == 1
+            assert frames[0]["data"]["is_valid_topic"] is False
+
+    def test_invalid_message_keeps_connection(self):
+        """Test that a malformed message gets an error event, not a disconnect."""
+        with client.websocket_connect("/ws/chat") as websocket:
+            websocket.receive_json()
+            websocket.send_text("not json")
+            assert websocket.receive_json()["event"] == "error"
+            websocket.send_json({"message": ""})
+            assert websocket.receive_json()["event"] == "error"
+
+            websocket.send_json({"message": "Qui a gagné le match de football hier ?"})
+            assert websocket.receive_json()["event"] == "done"
+
+    def test_per_connection_rate_limit(self, monkeypatch):
+        """Test that messages beyond the connection's budget are refused."""
+        monkeypatch.setattr(settings, "WS_MESSAGES_PER_MINUTE", 1)
+        with client.websocket_connect("/ws/chat") as websocket:
+            websocket.receive_json()
+            websocket.send_json({"message": "Qui a gagné le match de football hier ?"})
+            assert websocket.receive_json()["event"] == "done"
+            websocket.send_json({"message": "Qui a gagné le match de football hier ?"})
+            error = websocket.receive_json()
+            assert error["event"] == "error"
+            assert error["data"]["retry_after"] >= 1
+
+    def test_rate_limit_is_shared_across_connections(self, monkeypatch):
+        """Test that opening more connections does not raise the per-IP message limit."""
+        monkeypatch.setattr(settings, "RATE_LIMIT_PER_MINUTE", 2)
+        enabled = limiter.enabled
+        limiter.enabled = True
+        limiter.reset()
+        events = []
+        try:
+            for _ in range(3):
+                with client.websocket_connect("/ws/chat") as websocket:
+                    websocket.receive_json()
+                    websocket.send_json({"message": "Qui a gagné le match de football hier ?"})
+                    events.append(websocket.receive_json())
+        finally:
+            limiter.reset()
+            limiter.enabled = enabled
+        assert [event["event"] for event in events] == ["done", "done", "error"]
+        assert events[-1]["data"]["retry_after"] >= 1
+
+    def test_rate_limit_is_shared_with_chat(self, monkeypatch):
+        """Test that /chat requests and WebSocket messages use one counter."""
+        monkeypatch.setattr(settings, "RATE_LIMIT_PER_MINUTE", 2)
+        enabled = limiter.enabled
+        limiter.enabled = True
+        limiter.reset()
+        try:
+            statuses = [client.post("/chat", json={"message": "Qui a gagné le match de football hier ?"}).status_code
+                        for _ in range(2)]
+            with client.websocket_connect("/ws/chat") as websocket:
+                websocket.receive_json()
+                websocket.send_json({"message": "Qui a gagné le match de football hier ?"})
+                event = websocket.receive_json()
+        finally:
+            limiter.reset()
+            limiter.enabled = enabled
+        assert statuses == [200, 200]
+        assert event["event"] == "error"
+
+    def test_client_gone_mid_send_ends_cleanly(self, monkeypatch):
+        """Test that a send to a client that went away closes the handler without an error."""
+        sent = []
+        send_text = WebSocket.send_text
+
+        async def failing_send_text(websocket, data):
+            if sent:
+                raise OSError("client disconnected")
+            sent.append(data)
+            await send_text(websocket, data)
+
+        monkeypatch.setattr(WebSocket, "send_text", failing_send_text)
+        closed = ws_hub.get_stats()["closed"].get("client", 0)
+        with client.websocket_connect("/ws/chat") as websocket:
+            websocket.receive_json()
+            websocket.send_json({"message": "Qui a gagné le match de football hier ?"})
+            with pytest.raises(WebSocketDisconnect):
+                websocket.receive_json()
+        assert ws_hub.get_stats()["closed"]["client"] == closed + 1
+
+    def test_idle_connection_is_closed(self, monkeypatch):
+        """Test that a connection without messages is closed after the idle timeout."""
+        monkeypatch.setattr(settings, "WS_IDLE_TIMEOUT", 0.05)
+        closed_before = ws_hub.closed["idle"]
+        with client.websocket_connect("/ws/chat") as websocket:
+            websocket.receive_json()
+            with pytest.raises(WebSocketDisconnect) as exc_info:
+                websocket.receive_json()
+        assert exc_info.value.code == 1000
+        assert ws_hub.closed["idle"] == closed_before + 1
+        assert ws_hub.active == 0
+
+    def test_disallowed_origin_is_refused(self, monkeypatch):
+        """Test that the allowed origins apply to WebSocket handshakes."""
+        monkeypatch.setattr(ws_hub, "allowed_origins", ["https://herboristerie.example"])
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            with client.websocket_connect("/ws/chat", headers={"origin": "https://evil.example"}):
+                pass
+        assert exc_info.value.code == 1008
+
+        with client.websocket_connect("/ws/chat", headers={"origin": "https://herboristerie.example"}) as websocket:
+            assert websocket.receive_json()["event"] == "ready"
+
 
 class TestValidator:
     """Test topic validation service."""
@@ -135,6 +470,39 @@ class TestValidator:
         is_valid, _ = is_valid_herbalism_topic("")
         assert is_valid == False
 
+    def test_whole_word_matching(self):
+        """Test that keywords inside longer words are not matched."""
+        # Off-topic "parti" inside "partie", "sport" inside "transport"
+        is_valid, reason = is_valid_herbalism_topic("Quelle partie de la plante utiliser ?")
+        assert is_valid == True
+        assert reason == "Herbal keywords detected: plante"
+        is_valid, reason = is_valid_herbalism_topic("Le transport des plantes séchées")
+        assert is_valid == True
+
+        # Herbal "bio" inside "biologie"
+        is_valid, reason = is_valid_herbalism_topic("Une question de biologie végétale")
+        assert reason == "No clear off-topic indicators, allowing through"
+
+        # Plurals and multi-word keywords still match
+        is_valid, _ = is_valid_herbalism_topic("Vos recettes préférées ?")
+        assert is_valid == False
+        is_valid, _ = is_valid_herbalism_topic("Un bon site web sur le jardin ?")
+        assert is_valid == False
+
+    def test_accent_insensitive_matching(self):
+        """Test that accents and case do not affect matching."""
+        is_valid, reason = is_valid_herbalism_topic("VALERIANE ou MELISSE pour l'anxiete ?")
+        assert is_valid == True
+        assert "valériane" in reason
+
+        is_valid, _ = is_valid_herbalism_topic("Quelle meteo pour demain ?")
+        assert is_valid == False
+
+        # Text beyond Latin-1 ("œ", "…") is folded the same way
+        is_valid, reason = is_valid_herbalism_topic("Une infusion de Valériane pour le cœur…")
+        assert is_valid == True
+        assert reason.startswith("Herbal keywords detected: infusion, valériane")
+
 
 class TestModels:
     """Test Pydantic models."""
@@ -0,0 +1,1614 @@
+"""
+Unit tests for Diane API services.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import queue
+import time
+import httpx
+import pytest
+from app.services import batch, chat_pipeline
+from app.services.groq_service import CircuitOpenError, GroqService, GroqServiceError
+from app.services.answer_store import PersistentAnswerStore
+from app.services.admission import AdmissionController, AdmissionRejectedError
+from app.services.resilience import CircuitBreaker, compute_backoff, parse_retry_after
+from app.services.response_cache import ResponseCache, make_cache_key
+from app.services.singleflight import SingleFlight
+from app.services.capture import CaptureMiddleware, CaptureWriter
+from app.services.health import HealthMonitor
+from app.services.metrics import ROUTE_REQUESTS, MetricsRegistry
+from app.services.model_router import ModelRouter, question_features
+from app.services.output_budget import DISCLAIMER_STOP, OutputBudget
+from app.services.upstream_pool import Upstream, UpstreamPool, parse_upstreams
+from app.services.rate_limit import SharedMemoryStorage, get_rate_limit_key
+from app.services.token_budget import TokenBudgetExceededError, TokenBudgetLimiter
+from app.services.warmup import CacheWarmer, load_warmup_questions
+from app.services.knowledge_base import DEFAULT_KB_PATH, load_knowledge_base
+from app.services.conversation_store import (
+    ConversationStore,
+    InMemoryConversationBackend,
+    RedisConversationBackend
+)
+from app.config import settings
+from app.models import ChatRequest
+from app.prompts import DIANE_SYSTEM_PROMPT, MEDICAL_DISCLAIMER
+from app.utils import json_codec
+from app.utils.logger import JsonFormatter, NonBlockingQueueHandler, RequestSamplingFilter, sample_request_logs
+from app.utils.text import normalize_message
+from benchmarks.fake_groq import create_fake_groq_app
+from starlette.requests import Request
+
+
+def make_groq_handler(content: str = "<p>Réponse</p>", total_tokens: int = 42):
+    """Build an httpx mock handler answering like the Groq chat completions API."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={
+            "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"total_tokens": total_tokens}
+        })
+    return handler
+
+
+def make_groq_service(handler=None) -> GroqService:
+    """Create a GroqService backed by an in-process mock transport."""
+    service = GroqService(transport=httpx.MockTransport(handler or make_groq_handler()))
+    service.api_key = "gsk_test_key_0000"
+    service.retry_base_delay = 0.001
+    service.retry_max_delay = 0.001
+    return service
+
+
+def make_sequence_handler(*responses):
+    """Build a handler returning the given responses in order, then successes."""
+    remaining = list(responses)
+
+    def handler(request):
+        if remaining:
+            return remaining.pop(0)
+        return make_groq_handler()(request)
+    return handler
+
+
+class TestGroqConnectionPool:
+    """Test the pooled Groq HTTP client."""
+
+    def test_client_is_reused_across_calls(self):
+        """Test that consecutive calls share one client."""
+        service = make_groq_service()
+
+        async def scenario():
+            await service.start()
+            client = service._client
+            text, tokens, _ = await service.get_response("Bienfaits du thym ?")
+            await service.get_response("Bienfaits de la sauge ?")
+            assert service._client is client
+            assert text == "<p>Réponse</p>"
+            assert tokens == 42
+            await service.close()
+
+        asyncio.run(scenario())
+
+        stats = service.get_pool_stats()
+        assert stats["requests_sent"] == 2
+        assert stats["client_open"] is False
+
+    def test_client_rebuilt_on_new_event_loop(self):
+        """Test that a client bound to a finished loop is replaced."""
+        service = make_groq_service()
+
+        asyncio.run(service.get_response("Bienfaits du thym ?"))
+        first_client = service._client
+        asyncio.run(service.get_response("Bienfaits du thym ?"))
+
+        assert service._client is not first_client
+
+
+class TestGroqPayload:
+    """Test the pre-encoded Groq request payloads."""
+
+    def test_payload_is_valid_json_with_cached_prefix(self, monkeypatch):
+        """Test that spliced payloads decode to the full request."""
+        monkeypatch.setattr(settings, "KB_ENABLED", False)
+        service = make_groq_service()
+        history = [{"role": "user", "content": "Thym ?"}, {"role": "assistant", "content": "<p>Oui</p>"}]
+
+        payload = service._build_payload('Et la "sauge" ? 🌿', history)
+
+        assert json.loads(payload) == {
+            "model": service.model,
+            "max_tokens": service.max_tokens,
+            "temperature": service.temperature,
+            "messages": [
+                {"role": "system", "content": DIANE_SYSTEM_PROMPT},
+                *history,
+                {"role": "user", "content": 'Et la "sauge" ? 🌿'}
+            ]
+        }
+        # UTF-8 is sent as is, not as \u escapes
+        assert "🌿".encode("utf-8") in payload
+
+        streamed = json.loads(service._build_payload("Sauge ?", stream=True))
+        assert streamed["stream"] is True
+        service._build_payload("Thym ?")
+        assert len(service._payload_prefixes) == 2
+
+    def test_stdlib_fallback_matches(self, monkeypatch):
+        """Test that the json fallback encodes like orjson."""
+        value = {"content": "Valériane ⚠️", "tokens": 42, "cached": False, "items": [1.5, None]}
+        fast = json_codec.dumps(value)
+        monkeypatch.setattr(json_codec, "orjson", None)
+
+        assert json_codec.dumps(value) == fast
+        assert json_codec.loads(fast) == value
+        with pytest.raises(ValueError):
+            json_codec.loads(b"{not json")
+
+
+class TestGroqStreaming:
+    """Test streamed Groq responses."""
+
+    def test_stream_yields_chunks_and_usage(self):
+        """Test parsing of Groq server-sent events."""
+        body = (
+            'data: {"choices":[{"delta":{"role":"assistant","content":""}}]}\n\n'
+            'data: {"choices":[{"delta":{"content":"<p>Camo"}}]}\n\n'
+            'data: {"choices":[{"delta":{"content":"mille</p>"}}]}\n\n'
+            'data: {"choices":[{"delta":{},"finish_reason":"stop"}],"x_groq":{"usage":{"total_tokens":57}}}\n\n'
+            'data: [DONE]\n\n'
+        )
+        service = make_groq_service(
+            lambda request: httpx.Response(200, content=body.encode(), headers={"content-type": "text/event-stream"})
+        )
+
+        async def collect():
+            return [item async for item in service.stream_response("Camomille ?")]
+
+        items = asyncio.run(collect())
+        assert "".join(content for content, _, _ in items) == "<p>Camomille</p>"
+        assert items[-1][1] == 57
+
+    def test_stream_error_status(self):
+        """Test that upstream errors surface as GroqServiceError."""
+        service = make_groq_service(lambda request: httpx.Response(503, text="unavailable"))
+
+        async def collect():
+            return [item async for item in service.stream_response("Camomille ?")]
+
+        with pytest.raises(GroqServiceError):
+            asyncio.run(collect())
+
+
+class TestModelRouting:
+    """Test routing of simple questions to the small model."""
+
+    def make_router(self, enabled=True):
+        return ModelRouter(
+            enabled=enabled,
+            small_model="small-model",
+            small_max_tokens=400,
+            large_model="large-model",
+            large_max_tokens=800,
+            simple_max_words=12
+        )
+
+    def test_classification(self):
+        """Test that only short, single, non-sensitive herbal questions use the small model."""
+        router = self.make_router()
+        routes = {
+            "Bienfaits du thym ?": ("small", "simple"),
+            "Camomille, propriétés": ("small", "simple"),
+            "Thym et grossesse ?": ("large", "sensitive"),
+            "Puis-je prendre du millepertuis avec mes médicaments ?": ("large", "sensitive"),
+            "Bienfaits du thym ? Et de la sauge ?": ("large", "several_questions"),
+            "Comment faire ?": ("large", "no_herbal_keyword"),
+            "Quelle tisane me conseilleriez-vous pour retrouver un sommeil profond après une longue journée ?": (
+                "large", "long"
+            )
+        }
+        for message, expected in routes.items():
+            route = router.route(message)
+            assert (route.name, route.reason) == expected, message
+
+        small = router.route("Bienfaits du thym ?")
+        assert (small.model, small.max_tokens) == ("small-model", 400)
+        follow_up = router.route("Bienfaits du thym ?", [{"role": "user", "content": "Bonjour"}])
+        assert (follow_up.name, follow_up.reason) == ("large", "follow_up")
+        assert self.make_router(enabled=False).route("Bienfaits du thym ?").model == "large-model"
+
+    def test_payload_uses_route(self):
+        """Test that the routed model and max_tokens are sent to Groq."""
+        payloads = []
+
+        def handler(request):
+            payloads.append(json.loads(request.content))
+            return make_groq_handler()(request)
+
+        service = make_groq_service(handler)
+        service.router = self.make_router()
+        asyncio.run(service.get_response("Bienfaits du thym ?"))
+        asyncio.run(service.get_response("Thym pendant la grossesse ?"))
+
+        assert [(p["model"], p["max_tokens"]) for p in payloads] == [("small-model", 400), ("large-model", 800)]
+        assert service.router.get_stats()["decisions"] == {"small:simple": 1, "large:sensitive": 1}
+
+    def test_small_model_failure_falls_back_without_retry(self):
+        """Test that a failing small model hands the question to the large model."""
+        models = []
+
+        def handler(request):
+            model = json.loads(request.content)["model"]
+            models.append(model)
+            if model == "small-model":
+                return httpx.Response(503, text="unavailable")
+            return make_groq_handler()(request)
+
+        service = make_groq_service(handler)
+        service.router = self.make_router()
+        fallbacks_before = ROUTE_REQUESTS.labels("large", "fallback").value
+
+        assert asyncio.run(service.get_response("Bienfaits du thym ?")) == ("<p>Réponse</p>", 42, "stop")
+        assert models == ["small-model", "large-model"]
+        assert service.router.fallbacks == 1
+        assert ROUTE_REQUESTS.labels("large", "fallback").value == fallbacks_before + 1
+
+    def test_stream_falls_back_before_first_chunk(self):
+        """Test that a streamed answer is retried on the large model if the small one fails."""
+        body = (
+            'data: {"choices":[{"delta":{"content":"<p>Thym</p>"}}]}\n\n'
+            'data: {"choices":[{"delta":{},"finish_reason":"stop"}],"x_groq":{"usage":{"total_tokens":30}}}\n\n'
+            'data: [DONE]\n\n'
+        )
+
+        def handler(request):
+            if json.loads(request.content)["model"] == "small-model":
+                return httpx.Response(400, text="model_decommissioned")
+            return httpx.Response(200, content=body.encode(), headers={"content-type": "text/event-stream"})
+
+        service = make_groq_service(handler)
+        service.router = self.make_router()
+
+        async def collect():
+            return [item async for item in service.stream_response("Bienfaits du thym ?")]
+
+        assert asyncio.run(collect()) == [("<p>Thym</p>", 0, None), ("", 30, "stop")]
+        assert service.router.fallbacks == 1
+
+
+class TestOutputBudget:
+    """Test adaptive max_tokens and the disclaimer stop sequence."""
+
+    def make_budget(self, enabled=True):
+        return OutputBudget(enabled=enabled, min_tokens=128, percentile=95, headroom=1.15, min_samples=5)
+
+    def test_estimates_follow_features(self):
+        """Test that longer answers are expected for richer questions."""
+        budget = self.make_budget()
+        simple = budget.estimate(question_features("Bienfaits du thym ?"))
+        sensitive = budget.estimate(question_features("Thym et grossesse ?"))
+        several = budget.estimate(question_features("Thym et grossesse ? Et avec un anticoagulant ?"))
+
+        assert simple < sensitive < several
+        assert budget.max_tokens_for(question_features("Bienfaits du thym ?")) % 32 == 0
+
+    def test_budget_learns_from_completions(self):
+        """Test that max_tokens follows recorded lengths and grows after truncations."""
+        router = ModelRouter(False, "small-model", 400, "large-model", 800, 12)
+        route = router.route("Bienfaits du thym ?")
+        budget = self.make_budget()
+        assert self.make_budget(enabled=False).plan(route) == route
+
+        cold = budget.plan(route).max_tokens
+        for _ in range(5):
+            budget.record(route, 200, "stop")
+        learned = budget.plan(route).max_tokens
+        assert learned < cold
+        assert learned >= 200
+
+        for _ in range(5):
+            budget.record(route._replace(max_tokens=learned), learned, "length")
+        assert budget.plan(route).max_tokens > learned
+        assert budget.plan(route).max_tokens <= 800
+
+        stats = budget.get_stats()
+        assert stats["finish_reasons"] == {"simple:stop": 5, "simple:length": 5}
+        assert stats["truncation_rate"] == 0.5
+        assert stats["classes"]["simple"]["samples"] == 10
+
+    def test_service_sends_budget_and_restores_disclaimer(self):
+        """Test that the budget is sent and a cut disclaimer is completed."""
+        payloads = []
+        cut = "<p>Thym.</p><p>" + MEDICAL_DISCLAIMER[:-len("sous traitement ou pour un enfant.")]
+
+        def handler(request):
+            payloads.append(json.loads(request.content))
+            return httpx.Response(200, json={
+                "choices": [{"message": {"role": "assistant", "content": cut}, "finish_reason": "stop"}],
+                "usage": {"completion_tokens": 180, "total_tokens": 900}
+            })
+
+        service = make_groq_service(handler)
+        service.output_budget = self.make_budget()
+        service.stop_sequences = [DISCLAIMER_STOP]
+        text, tokens, _ = asyncio.run(service.get_response("Bienfaits du thym ?"))
+
+        assert text == "<p>Thym.</p><p>" + MEDICAL_DISCLAIMER + "</p>"
+        assert tokens == 900
+        assert payloads[0]["stop"] == [DISCLAIMER_STOP]
+        assert payloads[0]["max_tokens"] == service.output_budget.max_tokens_for(question_features("Bienfaits du thym ?"))
+        assert service.output_budget.get_stats()["finish_reasons"] == {"simple:disclaimer": 1}
+
+    def test_stream_restores_disclaimer(self):
+        """Test that a streamed answer stopped on the disclaimer is completed."""
+        lead = json.dumps(MEDICAL_DISCLAIMER[:-len("sous traitement ou pour un enfant.")], ensure_ascii=False)
+        body = (
+            'data: {"choices":[{"delta":{"content":"<p>Thym.</p><p>"}}]}\n\n'
+            'data: {"choices":[{"delta":{"content":' + lead + '}}]}\n\n'
+            'data: {"choices":[{"delta":{},"finish_reason":"stop"}],'
+            '"x_groq":{"usage":{"completion_tokens":120,"total_tokens":57}}}\n\n'
+            'data: [DONE]\n\n'
+        )
+        service = make_groq_service(
+            lambda request: httpx.Response(200, content=body.encode(), headers={"content-type": "text/event-stream"})
+        )
+        service.output_budget = self.make_budget()
+        service.stop_sequences = [DISCLAIMER_STOP]
+
+        async def collect():
+            return [item async for item in service.stream_response("Bienfaits du thym ?")]
+
+        items = asyncio.run(collect())
+        assert "".join(content for content, _, _ in items) == "<p>Thym.</p><p>" + MEDICAL_DISCLAIMER + "</p>"
+        assert service.output_budget.get_stats()["finish_reasons"] == {"simple:disclaimer": 1}
+        assert service.output_budget.get_stats()["classes"]["simple"]["p50_tokens"] == 120
+
+
+    def test_stop_sequence_ignores_other_paragraphs(self):
+        """Test that a paragraph ending like the disclaimer does not stop the answer."""
+        answer = (
+            "<p>La <strong>sauge</strong> est déconseillée chez un enfant.</p>"
+            "<p>Préférez le <strong>thym</strong>.</p><p>" + MEDICAL_DISCLAIMER + "</p>"
+        )
+
+        def handler(request):
+            # Cut at the first stop sequence, like Groq does
+            cut = answer
+            for stop in json.loads(request.content).get("stop", []):
+                if stop in cut:
+                    cut = cut[:cut.index(stop)]
+            return httpx.Response(200, json={
+                "choices": [{"message": {"role": "assistant", "content": cut}, "finish_reason": "stop"}],
+                "usage": {"completion_tokens": 150, "total_tokens": 800}
+            })
+
+        service = make_groq_service(handler)
+        service.stop_sequences = [DISCLAIMER_STOP]
+
+        assert asyncio.run(service.get_response("Sauge pour un enfant ?"))[0] == answer
+        assert service.output_budget.get_stats()["finish_reasons"] == {"sensitive:disclaimer": 1}
+        assert make_groq_service().stop_sequences == []
+
+    def make_fake_groq_service(self, completion_tokens):
+        service = GroqService(transport=httpx.ASGITransport(app=create_fake_groq_app(
+            latency_ms=0, latency_jitter_ms=0, completion_tokens=completion_tokens
+        )))
+        service.api_key = "gsk_test_key_0000"
+        service.router = ModelRouter(False, "small-model", 400, "large-model", 800, 12)
+        service.output_budget = self.make_budget()
+        return service
+
+    def test_cut_answer_is_asked_again_with_full_budget(self):
+        """Test that an answer cut by the adaptive budget is retried at the route's max_tokens."""
+        service = self.make_fake_groq_service(completion_tokens=700)
+        planned = service.output_budget.max_tokens_for(question_features("Bienfaits du thym ?"))
+        assert planned < 700
+
+        text, tokens, finish_reason = asyncio.run(service.get_response("Bienfaits du thym ?"))
+
+        assert finish_reason == "stop"
+        assert tokens == (900 + planned) + (900 + 700)
+        assert service.output_budget.get_stats()["retries"] == 1
+        assert service.output_budget.get_stats()["finish_reasons"] == {"simple:length": 1, "simple:stop": 1}
+
+    def test_truncated_answers_are_not_cached(self, monkeypatch):
+        """Test that answers still cut at the route's max_tokens are served but not cached."""
+        service = self.make_fake_groq_service(completion_tokens=2000)
+        monkeypatch.setattr(chat_pipeline, "groq_service", service)
+        monkeypatch.setattr(chat_pipeline, "response_cache", ResponseCache(10, 10_000, 60))
+        monkeypatch.setattr(settings, "ANSWER_STORE_ENABLED", False)
+
+        first = asyncio.run(chat_pipeline.generate_answer("Bienfaits du thym ?"))
+        second = asyncio.run(chat_pipeline.generate_answer("Bienfaits du thym ?"))
+
+        assert first[0] and first[2] is False
+        assert second[2] is False
+        assert len(chat_pipeline.response_cache) == 0
+
+
+class TestUpstreamPool:
+    """Test upstream scoring and hedged completions."""
+
+    def make_pool(self, upstreams, **overrides):
+        options = {
+            "hedge_enabled": True,
+            "hedge_quantile": 95,
+            "hedge_min_delay": 0.01,
+            "hedge_max_delay": 0.05,
+            "failure_threshold": 2,
+            "cooldown_seconds": 60
+        }
+        options.update(overrides)
+        return UpstreamPool(upstreams, **options)
+
+    def test_parse_upstreams(self):
+        """Test that extra upstreams follow the default one."""
+        upstreams = parse_upstreams("https://a.test/v1/chat|key-a, |key-b,")
+        assert [(u.name, u.api_url, u.api_key) for u in upstreams] == [
+            ("default", None, None),
+            ("upstream-1", "https://a.test/v1/chat", "key-a"),
+            ("upstream-2", None, "key-b")
+        ]
+
+    def test_pick_prefers_fast_and_skips_failing(self):
+        """Test that picks follow latency scores and cooldowns."""
+        slow, fast = Upstream("slow"), Upstream("fast")
+        pool = self.make_pool([slow, fast])
+        pool.record_success(slow, 2.0)
+        pool.record_success(fast, 0.5)
+        assert pool.pick() is fast
+        assert pool.pick(exclude=fast) is slow
+
+        pool.record_failure(fast)
+        pool.record_failure(fast)
+        assert not fast.available(time.monotonic())
+        assert pool.pick() is slow
+        assert pool.pick(exclude=slow) is fast
+
+    def test_hedge_delay_follows_latency_percentile(self):
+        """Test that the hedge delay is the clamped percentile of recent latencies."""
+        upstream = Upstream("default")
+        pool = self.make_pool([upstream], hedge_min_delay=0.5, hedge_max_delay=5.0, min_samples=10)
+        assert pool.hedge_delay() == 5.0
+
+        for i in range(1, 101):
+            pool.record_success(upstream, i / 100)
+        assert pool.hedge_delay() == 0.96
+        assert self.make_pool([upstream], hedge_enabled=False).hedge_delay() is None
+
+    def test_slow_primary_is_hedged(self):
+        """Test that a second upstream answers when the first is slow, and the loser is cancelled."""
+        calls = []
+        cancelled = []
+
+        async def handler(request):
+            calls.append((str(request.url), request.headers["authorization"]))
+            if "slow" in str(request.url):
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    cancelled.append(str(request.url))
+                    raise
+            return make_groq_handler()(request)
+
+        service = make_groq_service(handler)
+        service.api_url = "https://slow.test/chat"
+        service.pool = self.make_pool([Upstream("default"), Upstream("backup", "https://fast.test/chat", "key-b")])
+
+        started = time.perf_counter()
+        assert asyncio.run(service.get_response("Bienfaits du thym ?")) == ("<p>Réponse</p>", 42, "stop")
+
+        assert time.perf_counter() - started < 1
+        assert calls == [
+            ("https://slow.test/chat", "Bearer gsk_test_key_0000"),
+            ("https://fast.test/chat", "Bearer key-b")
+        ]
+        assert cancelled == ["https://slow.test/chat"]
+        stats = service.pool.get_stats()
+        assert (stats["hedges"], stats["hedge_wins"], stats["hedge_rate"], stats["hedge_win_rate"]) == (1, 1, 1.0, 1.0)
+
+    def test_fast_primary_is_not_hedged(self):
+        """Test that no second request is sent when the first upstream answers in time."""
+        calls = []
+
+        def handler(request):
+            calls.append(str(request.url))
+            return make_groq_handler()(request)
+
+        service = make_groq_service(handler)
+        service.pool = self.make_pool([Upstream("default"), Upstream("backup", "https://backup.test/chat")])
+        asyncio.run(service.get_response("Bienfaits du thym ?"))
+
+        assert len(calls) == 1
+        assert service.pool.get_stats()["hedges"] == 0
+        assert service.pool.upstreams[0].latency_ewma is not None
+
+
+class TestResponseCache:
+    """Test the answer cache."""
+
+    def test_key_folds_case_accents_punctuation(self):
+        """Test that trivially different questions share a key."""
+        assert normalize_message("  Valériane, posologie ?! ") == "valeriane posologie"
+        key = make_cache_key("Quelles plantes pour le sommeil ?", "llama", 0.7)
+        assert key == make_cache_key("quelles   PLANTES pour le sommeil", "llama", 0.7)
+        assert key != make_cache_key("quelles plantes pour le sommeil", "llama", 0.2)
+        assert key != make_cache_key("quelles plantes pour le sommeil", "other-model", 0.7)
+        assert key != make_cache_key("quelles plantes pour le sommeil", "llama", 0.7, "v2")
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted."""
+        cache = ResponseCache(max_entries=2, max_bytes=10_000, ttl_seconds=60)
+        cache.set("a", "<p>A</p>")
+        cache.set("b", "<p>B</p>")
+        assert cache.get("a") == "<p>A</p>"
+        cache.set("c", "<p>C</p>")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == "<p>A</p>"
+        assert cache.get("c") == "<p>C</p>"
+        assert cache.evictions == 1
+
+    def test_byte_budget(self):
+        """Test that total size stays within max_bytes."""
+        cache = ResponseCache(max_entries=100, max_bytes=20, ttl_seconds=60)
+        cache.set("a", "x" * 15)
+        cache.set("b", "y" * 15)
+        assert len(cache) == 1
+        assert cache.get_stats()["size_bytes"] <= 20
+
+    def test_ttl_expiry(self):
+        """Test that expired entries are not served."""
+        cache = ResponseCache(max_entries=10, max_bytes=10_000, ttl_seconds=0.01)
+        cache.set("a", "<p>A</p>")
+        time.sleep(0.02)
+        assert cache.get("a") is None
+        stats = cache.get_stats()
+        assert stats["expirations"] == 1
+        assert stats["misses"] == 1
+
+    def test_pipeline_serves_repeat_from_cache(self, monkeypatch):
+        """Test that a repeated question skips Groq and reports no tokens."""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return make_groq_handler()(request)
+
+        monkeypatch.setattr(chat_pipeline, "groq_service", make_groq_service(handler))
+        monkeypatch.setattr(chat_pipeline, "response_cache", ResponseCache(10, 10_000, 60))
+
+        first = asyncio.run(chat_pipeline.generate_answer("Bienfaits du thym ?"))
+        second = asyncio.run(chat_pipeline.generate_answer("bienfaits du THYM"))
+
+        assert first == ("<p>Réponse</p>", 42, False)
+        assert second == ("<p>Réponse</p>", 0, True)
+        assert len(calls) == 1
+
+
+class TestAnswerStore:
+    """Test the persistent answer store."""
+
+    def make_store(self, path, **overrides):
+        options = {"max_entries": 100, "max_bytes": 100_000, "ttl_seconds": 60, "compact_interval": 3600}
+        options.update(overrides)
+        return PersistentAnswerStore(str(path), **options)
+
+    def test_answers_survive_restart(self, tmp_path):
+        """Test that a new store on the same file serves earlier answers."""
+        path = tmp_path / "answers.db"
+        store = self.make_store(path)
+        store.put("a", "<p>Thym</p>").result()
+        asyncio.run(store.close())
+
+        restarted = self.make_store(path)
+        assert asyncio.run(restarted.get("a")) == "<p>Thym</p>"
+        assert asyncio.run(restarted.get("b")) is None
+        stats = restarted.get_stats()
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+        asyncio.run(restarted.close())
+
+    def test_expired_answers_only_served_as_fallback(self, tmp_path):
+        """Test that answers past the TTL are skipped unless allow_expired."""
+        store = self.make_store(tmp_path / "answers.db", ttl_seconds=0.01)
+        store.put("a", "<p>A</p>").result()
+        time.sleep(0.02)
+
+        assert asyncio.run(store.get("a")) is None
+        assert asyncio.run(store.get("a", allow_expired=True)) == "<p>A</p>"
+        assert asyncio.run(store.compact()) == 1
+        assert asyncio.run(store.get("a", allow_expired=True)) is None
+        asyncio.run(store.close())
+
+    def test_compaction_evicts_least_recently_used(self, tmp_path):
+        """Test that compaction keeps the most recently used answers within bounds."""
+        store = self.make_store(tmp_path / "answers.db", max_entries=2, max_bytes=25)
+        for key in ("a", "b", "c"):
+            store.put(key, "x" * 10).result()
+        asyncio.run(store.get("a"))
+
+        assert asyncio.run(store.compact()) == 1
+        assert asyncio.run(store.get("b")) is None
+        stats = store.get_stats()
+        assert (stats["entries"], stats["size_bytes"], stats["evictions"]) == (2, 20, 1)
+
+        store.max_bytes = 15
+        assert asyncio.run(store.compact()) == 1
+        assert asyncio.run(store.get("a")) == "x" * 10
+        asyncio.run(store.close())
+
+    def test_pipeline_reads_through_store_after_restart(self, tmp_path, monkeypatch):
+        """Test that an answer written before a restart skips Groq and refills memory."""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return make_groq_handler()(request)
+
+        store = self.make_store(tmp_path / "answers.db")
+        monkeypatch.setattr(settings, "ANSWER_STORE_ENABLED", True)
+        monkeypatch.setattr(chat_pipeline, "answer_store", store)
+        monkeypatch.setattr(chat_pipeline, "groq_service", make_groq_service(handler))
+        monkeypatch.setattr(chat_pipeline, "response_cache", ResponseCache(10, 10_000, 60))
+
+        first = asyncio.run(chat_pipeline.generate_answer("Bienfaits du thym ?"))
+
+        # Process restart: the memory cache starts empty (the store thread
+        # runs the pending write before the lookup)
+        memory = ResponseCache(10, 10_000, 60)
+        monkeypatch.setattr(chat_pipeline, "response_cache", memory)
+        second = asyncio.run(chat_pipeline.generate_answer("bienfaits du THYM"))
+
+        assert first == ("<p>Réponse</p>", 42, False)
+        assert second == ("<p>Réponse</p>", 0, True)
+        assert len(calls) == 1
+        assert len(memory) == 1
+        asyncio.run(store.close())
+
+
+class TestCacheWarmup:
+    """Test the startup cache warm-up."""
+
+    def test_load_question_list(self, tmp_path):
+        """Test that a question file keeps its order and drops duplicates and comments."""
+        path = tmp_path / "questions.txt"
+        path.write_text(
+            "# frequent questions\nBienfaits du thym ?\n\nbienfaits du THYM\nTisane pour dormir ?\n",
+            encoding="utf-8"
+        )
+        assert load_warmup_questions(str(path), 10) == ["Bienfaits du thym ?", "Tisane pour dormir ?"]
+        assert load_warmup_questions(str(path), 1) == ["Bienfaits du thym ?"]
+
+    def test_load_capture_ranked_by_frequency(self, tmp_path):
+        """Test that questions from a capture are ranked by how often they were asked."""
+        messages = ["Tisane pour dormir ?", "Bienfaits du thym ?", "bienfaits du thym", "Bienfaits du thym"]
+        lines = [json.dumps({"ts": i, "path": "/chat", "payload": {"message": m}}) for i, m in enumerate(messages)]
+        path = tmp_path / "capture.jsonl"
+        path.write_text("\n".join(lines + ["not json"]) + "\n", encoding="utf-8")
+
+        assert load_warmup_questions(str(path), 10) == ["Bienfaits du thym ?", "Tisane pour dormir ?"]
+
+    def test_warms_with_bounded_concurrency(self):
+        """Test that on-topic questions are warmed at most `concurrency` at a time."""
+        active = 0
+        peak = 0
+
+        async def warm(question):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            if "camomille" in question:
+                raise GroqServiceError("boom")
+            return "thym" not in question
+
+        questions = [
+            "Bienfaits du thym ?",
+            "Bienfaits de la camomille ?",
+            "Tisane pour dormir ?",
+            "Plantes pour la digestion ?",
+            "Qui a gagné le match de football hier ?"
+        ]
+        warmer = CacheWarmer(warm, concurrency=2)
+        asyncio.run(warmer.run(questions))
+
+        stats = warmer.get_stats()
+        assert peak == 2
+        assert stats["state"] == "done"
+        assert (stats["warmed"], stats["already_cached"], stats["failed"], stats["off_topic"]) == (2, 1, 1, 1)
+        assert stats["duration_seconds"] is not None
+
+    def test_start_runs_in_background(self, tmp_path):
+        """Test that start returns before the file is read and a missing file is reported, not raised."""
+        path = tmp_path / "questions.txt"
+        path.write_text("Bienfaits du thym ?\n", encoding="utf-8")
+
+        async def warm(question):
+            await asyncio.sleep(0.05)
+            return True
+
+        async def main():
+            warmer = CacheWarmer(warm, concurrency=1)
+            warmer.start(str(path), 10)
+            # The file is read by the background task, not during start()
+            assert (warmer.state, warmer.questions) == ("running", 0)
+            await asyncio.sleep(0.1)
+            assert warmer.warmed == 1
+
+            missing = CacheWarmer(warm, concurrency=1)
+            missing.start(str(tmp_path / "missing.txt"), 10)
+            await missing._task
+            assert missing.state == "failed"
+
+        asyncio.run(main())
+
+    def test_warm_answer_fills_cache(self, monkeypatch):
+        """Test that a warmed question is then served from cache."""
+        monkeypatch.setattr(chat_pipeline, "groq_service", make_groq_service(make_groq_handler()))
+        monkeypatch.setattr(chat_pipeline, "response_cache", ResponseCache(10, 10_000, 60))
+
+        assert asyncio.run(chat_pipeline.warm_answer("Bienfaits du thym ?")) is True
+        assert asyncio.run(chat_pipeline.warm_answer("bienfaits du thym")) is False
+        assert asyncio.run(chat_pipeline.generate_answer("Bienfaits du thym ?")) == ("<p>Réponse</p>", 0, True)
+
+
+class TestKnowledgeBase:
+    """Test the local plant knowledge base."""
+
+    def test_search_ranks_the_requested_section(self):
+        """Test that a lookup returns the matching plant sheet section first."""
+        kb = load_knowledge_base(DEFAULT_KB_PATH)
+
+        snippet, _ = kb.search("Posologie de la valériane ?")[0]
+        assert (snippet.plant.name, snippet.section) == ("Valériane", "preparation")
+
+        snippet, _ = kb.search("Puis-je prendre de la valériane enceinte ?")[0]
+        assert (snippet.plant.name, snippet.section) == ("Valériane", "precautions")
+
+        assert kb.search("Quel temps fait-il ?") == []
+        assert kb.build_context("Quel temps fait-il ?", 3, 1.5) == ""
+
+    def test_weak_matches_are_dropped(self):
+        """Test that snippets far below the best score are not returned."""
+        kb = load_knowledge_base(DEFAULT_KB_PATH)
+        results = kb.search("Quelles plantes pour renforcer l'immunité en hiver ?", k=3)
+
+        assert [snippet.plant.name for snippet, _ in results] == ["Échinacée"]
+
+    def test_direct_answer(self):
+        """Test that only simple lookups about one plant are answered directly."""
+        kb = load_knowledge_base(DEFAULT_KB_PATH)
+
+        answer = kb.direct_answer("Posologie de la valériane ?", max_words=10)
+        assert "Préparation et posologie" in answer
+        assert "Précautions" in answer
+        assert MEDICAL_DISCLAIMER in answer
+
+        assert kb.direct_answer("Valériane enceinte, quelle posologie ?", max_words=10) is None
+        assert kb.direct_answer("Posologie de la valériane et du tilleul ?", max_words=10) is None
+        assert kb.direct_answer("Parle-moi de la valériane", max_words=10) is None
+        assert kb.get_stats()["direct_answers"] == 1
+
+    def test_invalid_sheet_is_rejected(self, tmp_path):
+        """Test that a malformed line reports the file and line number."""
+        path = tmp_path / "plants.jsonl"
+        path.write_text(json.dumps({"name": "Thym"}) + "\n", encoding="utf-8")
+
+        with pytest.raises(ValueError, match="plants.jsonl:1"):
+            load_knowledge_base(str(path))
+
+    def test_reference_sheets_are_sent_to_groq(self, monkeypatch):
+        """Test that relevant sheets are added as a second system message."""
+        payloads = []
+
+        def handler(request):
+            payloads.append(json.loads(request.content))
+            return make_groq_handler()(request)
+
+        monkeypatch.setattr(settings, "KB_ENABLED", True)
+        service = make_groq_service(handler)
+        asyncio.run(service.get_response("Bienfaits du thym ?"))
+        asyncio.run(service.get_response("Bonjour"))
+
+        with_sheets, without_sheets = (p["messages"] for p in payloads)
+        assert [m["role"] for m in with_sheets] == ["system", "system", "user"]
+        assert "Thym" in with_sheets[1]["content"]
+        assert [m["role"] for m in without_sheets] == ["system", "user"]
+
+    def test_pipeline_direct_answer_skips_groq(self, monkeypatch):
+        """Test that an opted-in direct answer is served without calling Groq."""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return make_groq_handler()(request)
+
+        monkeypatch.setattr(settings, "KB_ENABLED", True)
+        monkeypatch.setattr(settings, "KB_DIRECT_ANSWERS", True)
+        monkeypatch.setattr(chat_pipeline, "groq_service", make_groq_service(handler))
+        monkeypatch.setattr(chat_pipeline, "response_cache", ResponseCache(10, 10_000, 60))
+
+        response_text, tokens_used, cached = asyncio.run(
+            chat_pipeline.generate_answer("Contre-indications du millepertuis ?")
+        )
+
+        assert calls == []
+        assert "Millepertuis" in response_text
+        assert (tokens_used, cached) == (0, True)
+
+
+class TestBatchProcessor:
+    """Test batch planning and bounded concurrency."""
+
+    def test_concurrency_order_and_errors(self, monkeypatch):
+        """Test that groups run at most `concurrency` at a time and failures stay per item."""
+        active = 0
+        peak = 0
+        calls = []
+
+        async def fake_generate_answer(message, conversation_id, user_id=None, client_ip=None):
+            nonlocal active, peak
+            calls.append(message)
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            if "ortie" in message:
+                raise TokenBudgetExceededError("budget", retry_after=60, scope="user")
+            return f"<p>{message}</p>", 10, False
+
+        monkeypatch.setattr(batch, "generate_answer", fake_generate_answer)
+        processor = batch.BatchProcessor(concurrency=2)
+        requests = [
+            ChatRequest(message="Bienfaits du thym ?"),
+            ChatRequest(message="Bienfaits de la sauge ?"),
+            ChatRequest(message="bienfaits du thym"),
+            ChatRequest(message="Tisane d'ortie ?"),
+            ChatRequest(message="Et la camomille ?", conversation_id="c1"),
+            ChatRequest(message="Et le tilleul ?", conversation_id="c1"),
+        ]
+
+        async def collect():
+            plan = processor.plan(requests)
+            return plan, [result async for result in processor.run(plan)]
+
+        plan, results = asyncio.run(collect())
+        by_index = {result["index"]: result for result in results}
+
+        assert peak == 2
+        assert plan.unique_questions == 5
+        assert calls.count("Bienfaits du thym ?") == 1
+        assert calls.index("Et la camomille ?") < calls.index("Et le tilleul ?")
+        assert by_index[2]["response"] == "<p>Bienfaits du thym ?</p>"
+        assert by_index[3]["error"] == "quota_exceeded"
+        summary = batch.summarize(plan, results, 0.1)
+        assert (summary["tokens_used"], summary["errors"], summary["cached"]) == (40, 1, 1)
+        assert batch.batch_outcome(results) == "quota_exceeded"
+        assert batch.batch_outcome([r for r in results if r["error"] is None]) == "valid"
+        off_topic = batch.item_result(plan.groups[0][0], is_valid_topic=False)
+        assert batch.batch_outcome([off_topic]) == "off_topic"
+
+
+class TestSingleFlight:
+    """Test coalescing of identical in-flight calls."""
+
+    def test_concurrent_identical_questions_share_one_call(self, monkeypatch):
+        """Test that concurrent duplicates trigger a single Groq call."""
+        calls = []
+
+        async def handler(request):
+            calls.append(request)
+            await asyncio.sleep(0.05)
+            return make_groq_handler()(request)
+
+        monkeypatch.setattr(chat_pipeline, "groq_service", make_groq_service(handler))
+        monkeypatch.setattr(chat_pipeline, "response_cache", ResponseCache(10, 10_000, 60))
+        monkeypatch.setattr(chat_pipeline, "groq_singleflight", SingleFlight())
+
+        async def scenario():
+            return await asyncio.gather(*[
+                chat_pipeline.generate_answer("Plantes pour le sommeil ?") for _ in range(5)
+            ])
+
+        results = asyncio.run(scenario())
+
+        assert len(calls) == 1
+        assert sum(tokens for _, tokens, _ in results) == 42
+        assert sum(1 for _, _, cached in results if cached) == 4
+        assert chat_pipeline.groq_singleflight.get_stats()["coalesced"] == 4
+
+    def test_cancelled_caller_does_not_cancel_shared_call(self):
+        """Test that one disconnecting client leaves the others served."""
+        flight = SingleFlight()
+
+        async def slow_call():
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        async def scenario():
+            leader = asyncio.ensure_future(flight.do("key", slow_call))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.do("key", slow_call))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await follower
+
+        assert asyncio.run(scenario()) == ("answer", True)
+        assert flight.get_stats() == {"inflight": 0, "calls": 1, "coalesced": 1, "coalesced_ratio": 0.5}
+
+    def test_errors_propagate_to_every_caller(self):
+        """Test that a failed shared call raises in each waiter."""
+        flight = SingleFlight()
+
+        async def failing_call():
+            await asyncio.sleep(0.01)
+            raise GroqServiceError("boom")
+
+        async def scenario():
+            return await asyncio.gather(
+                flight.do("key", failing_call),
+                flight.do("key", failing_call),
+                return_exceptions=True
+            )
+
+        results = asyncio.run(scenario())
+        assert all(isinstance(r, GroqServiceError) for r in results)
+
+
+class TestHealthMonitor:
+    """Test the cached health subsystem."""
+
+    def test_check_connection_uses_models_listing(self):
+        """Test that the probe does not spend a chat completion."""
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json={"data": []})
+
+        service = make_groq_service(handler)
+        assert asyncio.run(service.check_connection()) is True
+        assert requests[0].method == "GET"
+        assert requests[0].url.path.endswith("/models")
+
+    def test_deep_check_is_rate_limited(self):
+        """Test that forced checks are throttled to deep_min_interval."""
+        probes = []
+
+        async def check():
+            probes.append(1)
+            return True
+
+        monitor = HealthMonitor(check=check, interval=60, deep_min_interval=60)
+
+        async def scenario():
+            await monitor.deep_check()
+            await monitor.deep_check()
+            await monitor.deep_check()
+
+        asyncio.run(scenario())
+
+        assert len(probes) == 1
+        stats = monitor.get_stats()
+        assert stats["groq_connection"] is True
+        assert stats["deep_checks_throttled"] == 2
+        assert stats["latency_ms"] is not None
+
+
+class FakeRedis:
+    """Local stand-in for redis.asyncio.Redis (get/set with expiry)."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        value, expires_at = self.data.get(key, (None, 0))
+        if value is None or expires_at <= time.monotonic():
+            return None
+        return value
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = (value, time.monotonic() + (ex if ex is not None else 3600))
+
+
+def make_memory_backend(ttl_seconds=60, max_conversations=100, max_total_bytes=100_000):
+    """Create an in-memory conversation backend for tests."""
+    return InMemoryConversationBackend(ttl_seconds, max_conversations, max_total_bytes)
+
+
+class TestConversationStore:
+    """Test multi-turn conversation memory."""
+
+    def test_history_roundtrip(self):
+        """Test that recorded exchanges come back as chat messages."""
+        store = ConversationStore(make_memory_backend(), max_turns=10, history_token_budget=1000)
+
+        async def scenario():
+            await store.append_exchange("c1", "Bienfaits du thym ?", "<p>Le thym...</p>")
+            return await store.get_history("c1")
+
+        assert asyncio.run(scenario()) == [
+            {"role": "user", "content": "Bienfaits du thym ?"},
+            {"role": "assistant", "content": "<p>Le thym...</p>"}
+        ]
+
+    def test_history_trimmed_to_token_budget(self):
+        """Test that old turns are dropped to fit the budget."""
+        store = ConversationStore(make_memory_backend(), max_turns=50, history_token_budget=50)
+
+        async def scenario():
+            for i in range(5):
+                await store.append_exchange("c1", f"Question {i}", "x" * 80)
+            return await store.get_history("c1")
+
+        history = asyncio.run(scenario())
+        assert history[0]["role"] == "user"
+        assert history[-1]["content"] == "x" * 80
+        assert len(history) == 2
+
+    def test_idle_conversations_expire(self):
+        """Test TTL eviction of idle conversations."""
+        backend = make_memory_backend(ttl_seconds=0.01)
+        store = ConversationStore(backend, max_turns=10, history_token_budget=1000)
+
+        async def scenario():
+            await store.append_exchange("c1", "Question", "Réponse")
+            await asyncio.sleep(0.02)
+            return await store.get_history("c1")
+
+        assert asyncio.run(scenario()) == []
+        assert backend.get_stats()["expirations"] == 1
+
+    def test_global_memory_cap(self):
+        """Test that least recently used conversations are evicted."""
+        backend = make_memory_backend(max_total_bytes=50)
+        store = ConversationStore(backend, max_turns=10, history_token_budget=1000)
+
+        async def scenario():
+            await store.append_exchange("c1", "q" * 20, "a" * 20)
+            await store.append_exchange("c2", "q" * 20, "a" * 20)
+
+        asyncio.run(scenario())
+        stats = backend.get_stats()
+        assert stats["conversations"] == 1
+        assert stats["size_bytes"] <= 50
+
+    def test_redis_backend_with_local_stand_in(self):
+        """Test the Redis backend against a local stand-in client."""
+        redis_client = FakeRedis()
+        store = ConversationStore(RedisConversationBackend(redis_client, ttl_seconds=60), 10, 1000)
+
+        async def scenario():
+            await store.append_exchange("c1", "Et pour un enfant ?", "<p>Réponse</p>")
+            return await store.get_history("c1")
+
+        history = asyncio.run(scenario())
+        assert history[0] == {"role": "user", "content": "Et pour un enfant ?"}
+        assert list(redis_client.data) == ["diane:conv:c1"]
+
+    def test_follow_up_sends_history_and_bypasses_cache(self, monkeypatch):
+        """Test that a follow-up question carries the previous turns."""
+        payloads = []
+
+        def handler(request):
+            payloads.append(json.loads(request.content))
+            return make_groq_handler()(request)
+
+        store = ConversationStore(make_memory_backend(), max_turns=10, history_token_budget=1000)
+        monkeypatch.setattr(chat_pipeline, "groq_service", make_groq_service(handler))
+        monkeypatch.setattr(chat_pipeline, "response_cache", ResponseCache(10, 10_000, 60))
+        monkeypatch.setattr(chat_pipeline, "conversation_store", store)
+        monkeypatch.setattr(settings, "KB_ENABLED", False)
+
+        async def scenario():
+            await chat_pipeline.generate_answer("Bienfaits de la camomille ?", "c1")
+            await chat_pipeline.generate_answer("Bienfaits de la camomille ?", "c2")
+            return await chat_pipeline.generate_answer("Et pour un enfant ?", "c1")
+
+        _, tokens_used, cached = asyncio.run(scenario())
+
+        assert len(payloads) == 2
+        assert [m["role"] for m in payloads[-1]["messages"]] == ["system", "user", "assistant", "user"]
+        assert tokens_used == 42
+        assert cached is False
+
+
+class TestResilience:
+    """Test retries, deadlines and the circuit breaker."""
+
+    def test_transient_errors_are_retried(self):
+        """Test that 503 and 429 responses are retried."""
+        service = make_groq_service(make_sequence_handler(
+            httpx.Response(503, text="unavailable"),
+            httpx.Response(429, text="slow down", headers={"Retry-After": "0"})
+        ))
+
+        assert asyncio.run(service.get_response("Thym ?")) == ("<p>Réponse</p>", 42, "stop")
+        stats = service.get_resilience_stats()
+        assert stats["retries"] == 2
+        assert stats["retry_after_honoured"] == 1
+        assert stats["circuit_breaker"]["state"] == "closed"
+
+    def test_client_errors_are_not_retried(self):
+        """Test that a 400 fails immediately without opening the circuit."""
+        service = make_groq_service(make_sequence_handler(httpx.Response(400, text="bad request")))
+
+        with pytest.raises(GroqServiceError) as exc_info:
+            asyncio.run(service.get_response("Thym ?"))
+
+        assert exc_info.value.status_code == 400
+        assert service.get_resilience_stats()["retries"] == 0
+        assert service.circuit_breaker.consecutive_failures == 0
+
+    def test_retry_after_beyond_deadline_fails_fast(self):
+        """Test that a Retry-After longer than the deadline is not waited for."""
+        service = make_groq_service(make_sequence_handler(
+            httpx.Response(429, text="slow down", headers={"Retry-After": "120"})
+        ))
+        service.overall_timeout = 1.0
+
+        started = time.monotonic()
+        with pytest.raises(GroqServiceError):
+            asyncio.run(service.get_response("Thym ?"))
+        assert time.monotonic() - started < 1.0
+
+    def test_circuit_opens_and_fails_fast(self):
+        """Test that repeated failures open the circuit."""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(503, text="unavailable")
+
+        service = make_groq_service(handler)
+        service.max_retries = 0
+        service.circuit_breaker = CircuitBreaker("groq", failure_threshold=2, recovery_timeout=60)
+
+        for _ in range(2):
+            with pytest.raises(GroqServiceError):
+                asyncio.run(service.get_response("Thym ?"))
+
+        with pytest.raises(CircuitOpenError):
+            asyncio.run(service.get_response("Thym ?"))
+
+        assert len(calls) == 2
+        stats = service.circuit_breaker.get_stats()
+        assert stats["state"] == "open"
+        assert stats["transitions"] == {"closed->open": 1}
+        assert stats["rejected_calls"] == 1
+
+    def test_circuit_half_open_recovery(self):
+        """Test that a successful trial call closes the circuit."""
+        breaker = CircuitBreaker("groq", failure_threshold=1, recovery_timeout=0.01)
+        breaker.record_failure()
+        assert breaker.allow_request() is False
+
+        time.sleep(0.02)
+        assert breaker.allow_request() is True
+        assert breaker.allow_request() is False  # only one trial call
+        breaker.record_success()
+
+        assert breaker.state == "closed"
+        assert list(breaker.transition_counts) == ["closed->open", "open->half_open", "half_open->closed"]
+
+    def test_stale_answer_served_while_circuit_open(self, monkeypatch):
+        """Test the cached fallback while Groq is unavailable."""
+        service = make_groq_service()
+        cache = ResponseCache(10, 10_000, ttl_seconds=0.01)
+        monkeypatch.setattr(chat_pipeline, "groq_service", service)
+        monkeypatch.setattr(chat_pipeline, "response_cache", cache)
+
+        asyncio.run(chat_pipeline.generate_answer("Bienfaits du thym ?"))
+        time.sleep(0.02)
+        service.circuit_breaker = CircuitBreaker("groq", failure_threshold=1, recovery_timeout=60)
+        service.circuit_breaker.record_failure()
+
+        assert asyncio.run(chat_pipeline.generate_answer("Bienfaits du thym ?")) == ("<p>Réponse</p>", 0, True)
+
+    def test_backoff_helpers(self):
+        """Test Retry-After parsing and jittered backoff bounds."""
+        assert parse_retry_after("3") == 3.0
+        assert parse_retry_after("invalid") is None
+        assert parse_retry_after(None) is None
+        assert 0 <= compute_backoff(3, base_delay=0.5, max_delay=2.0) <= 2.0
+        assert compute_backoff(0, base_delay=0.5, max_delay=2.0, retry_after=5.0) == 5.0
+
+
+class TestAdmissionControl:
+    """Test bounded concurrency and queueing of upstream calls."""
+
+    def test_concurrency_is_bounded(self):
+        """Test that no more than max_concurrency calls run at once."""
+        controller = AdmissionController(max_concurrency=2, max_queue=10, queue_timeout=1, retry_after=5)
+        running = []
+        peak = []
+
+        async def call():
+            async with controller.slot():
+                running.append(1)
+                peak.append(len(running))
+                await asyncio.sleep(0.01)
+                running.pop()
+
+        async def scenario():
+            await asyncio.gather(*[call() for _ in range(6)])
+
+        asyncio.run(scenario())
+
+        stats = controller.get_stats()
+        assert max(peak) == 2
+        assert stats["admitted"] == 6
+        assert stats["queued"] == 4
+        assert stats["active"] == 0
+
+    def test_full_queue_rejects_fast(self):
+        """Test that requests beyond the queue bound are rejected."""
+        controller = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=1, retry_after=7)
+
+        async def call():
+            async with controller.slot():
+                await asyncio.sleep(0.02)
+
+        async def scenario():
+            return await asyncio.gather(call(), call(), call(), return_exceptions=True)
+
+        results = asyncio.run(scenario())
+
+        rejected = [r for r in results if isinstance(r, AdmissionRejectedError)]
+        assert len(rejected) == 1
+        assert rejected[0].retry_after == 7
+        assert controller.get_stats()["rejected_queue_full"] == 1
+
+    def test_queue_timeout(self):
+        """Test that waiting longer than queue_timeout is rejected."""
+        controller = AdmissionController(max_concurrency=1, max_queue=5, queue_timeout=0.01, retry_after=5)
+
+        async def call(duration):
+            async with controller.slot():
+                await asyncio.sleep(duration)
+
+        async def scenario():
+            return await asyncio.gather(call(0.05), call(0), return_exceptions=True)
+
+        results = asyncio.run(scenario())
+
+        assert isinstance(results[1], AdmissionRejectedError)
+        assert controller.get_stats()["rejected_timeout"] == 1
+        assert controller.queue_depth == 0
+
+    def test_cancelled_waiter_does_not_leak_slot(self):
+        """Test that a disconnected client leaves the queue cleanly."""
+        controller = AdmissionController(max_concurrency=1, max_queue=5, queue_timeout=1, retry_after=5)
+
+        async def scenario():
+            await controller.acquire()
+            waiter = asyncio.ensure_future(controller.acquire())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.sleep(0)
+            controller.release()
+            await controller.acquire()
+            controller.release()
+
+        asyncio.run(scenario())
+        assert controller.active == 0
+        assert controller.queue_depth == 0
+
+
+
+def make_request(body=None, client_ip="10.0.0.1") -> Request:
+    request = Request({"type": "http", "method": "POST", "path": "/chat", "headers": [], "client": (client_ip, 1234)})
+    if body is not None:
+        request.state.rate_limit_body = body
+    return request
+
+
+class TestRateLimitStorage:
+    """Test the shared rate limit storage and limiter keys."""
+
+    def test_counters_shared_between_instances(self, tmp_path):
+        """Test that two workers opening the same file share counters."""
+        uri = f"shm://{tmp_path / 'ratelimit.db'}"
+        worker_a = SharedMemoryStorage(uri)
+        worker_b = SharedMemoryStorage(uri)
+
+        assert worker_a.incr("ip:1.2.3.4", 60) == 1
+        assert worker_b.incr("ip:1.2.3.4", 60) == 2
+        assert worker_a.get("ip:1.2.3.4") == 2
+        assert worker_b.get("ip:5.6.7.8") == 0
+
+        worker_b.clear("ip:1.2.3.4")
+        assert worker_a.get("ip:1.2.3.4") == 0
+
+    def test_window_expires(self, tmp_path):
+        """Test that a counter restarts once its window has elapsed."""
+        storage = SharedMemoryStorage(f"shm://{tmp_path / 'ratelimit.db'}")
+
+        storage.incr("key", 0.05)
+        storage.incr("key", 0.05)
+        assert storage.get("key") == 2
+
+        time.sleep(0.06)
+        assert storage.get("key") == 0
+        assert storage.incr("key", 0.05) == 1
+
+    def test_key_by_user_id_with_ip_fallback(self, monkeypatch):
+        """Test that RATE_LIMIT_KEY=user_id keys on the body, else on the IP."""
+        monkeypatch.setattr(settings, "RATE_LIMIT_KEY", "user_id")
+
+        assert get_rate_limit_key(make_request({"user_id": "wp_42"})) == "user_id:wp_42"
+        assert get_rate_limit_key(make_request({"message": "thym"})) == "ip:10.0.0.1"
+        assert get_rate_limit_key(make_request()) == "ip:10.0.0.1"
+
+    def test_key_by_ip(self, monkeypatch):
+        """Test that RATE_LIMIT_KEY=ip ignores body fields."""
+        monkeypatch.setattr(settings, "RATE_LIMIT_KEY", "ip")
+
+        assert get_rate_limit_key(make_request({"user_id": "wp_42"}, client_ip="10.0.0.9")) == "ip:10.0.0.9"
+
+
+
+class TestTokenBudget:
+    """Test per-user and per-IP token budgets."""
+
+    def test_settle_refunds_unused_reservation(self):
+        """Test that only the tokens actually used are charged."""
+        budget = TokenBudgetLimiter(user_capacity=1000, ip_capacity=5000, window_seconds=3600, max_keys=10)
+
+        reservation = budget.reserve("alice", "10.0.0.1", 800)
+        assert budget.get_quota("alice", "10.0.0.1")["user_id"]["remaining"] == 200
+
+        budget.settle(reservation, 300)
+        budget.settle(reservation, 300)  # settling twice is a no-op
+        quota = budget.get_quota("alice", "10.0.0.1")
+        assert 699 <= quota["user_id"]["remaining"] <= 700
+        assert 4699 <= quota["ip"]["remaining"] <= 4700
+        assert budget.get_stats()["tokens_charged"] == 300
+
+    def test_exhausted_budget_rejects_with_retry_after(self):
+        """Test that a reservation the budget cannot cover is rejected."""
+        budget = TokenBudgetLimiter(user_capacity=1000, ip_capacity=5000, window_seconds=100, max_keys=10)
+
+        budget.settle(budget.reserve("bob", "10.0.0.2", 800), 900)
+
+        with pytest.raises(TokenBudgetExceededError) as exc_info:
+            budget.reserve("bob", "10.0.0.2", 800)
+        assert exc_info.value.scope == "user_id"
+        # 700 tokens missing at 10 tokens/s
+        assert 69 <= exc_info.value.retry_after <= 70
+
+        # Other users behind the same IP are unaffected
+        budget.reserve("carol", "10.0.0.2", 800)
+        assert budget.get_stats()["rejections"] == 1
+
+    def test_budget_refills_over_window(self):
+        """Test that spent tokens come back as the window slides."""
+        budget = TokenBudgetLimiter(user_capacity=1000, ip_capacity=1000, window_seconds=0.1, max_keys=10)
+
+        budget.settle(budget.reserve(None, "10.0.0.3", 1000), 1000)
+        with pytest.raises(TokenBudgetExceededError):
+            budget.reserve(None, "10.0.0.3", 500)
+
+        time.sleep(0.06)
+        budget.reserve(None, "10.0.0.3", 500)
+
+    def test_anonymous_requests_only_charge_ip(self):
+        """Test that requests without user_id share no user budget."""
+        budget = TokenBudgetLimiter(user_capacity=1000, ip_capacity=5000, window_seconds=3600, max_keys=10)
+
+        reservation = budget.reserve(None, "10.0.0.4", 800)
+        assert reservation.keys == ("ip:10.0.0.4",)
+        assert set(budget.get_quota(None, "10.0.0.4")) == {"ip"}
+
+    def test_budgets_are_bounded(self):
+        """Test that the least recently used full budgets are evicted."""
+        budget = TokenBudgetLimiter(user_capacity=1000, ip_capacity=1000, window_seconds=3600, max_keys=2)
+
+        for i in range(4):
+            budget.settle(budget.reserve(None, f"10.0.1.{i}", 100), 0)
+
+        stats = budget.get_stats()
+        assert stats["tracked_budgets"] == 2
+        assert stats["evictions"] == 2
+
+    def test_spent_budgets_are_not_evicted(self):
+        """Test that new keys cannot reset a drained budget by evicting it."""
+        budget = TokenBudgetLimiter(user_capacity=1000, ip_capacity=1000, window_seconds=3600, max_keys=2)
+        budget.settle(budget.reserve(None, "10.0.2.1", 1000), 1000)
+
+        for i in range(5):
+            budget.settle(budget.reserve(f"user_{i}", None, 100), 0)
+
+        with pytest.raises(TokenBudgetExceededError):
+            budget.reserve(None, "10.0.2.1", 100)
+        assert budget.get_stats()["tracked_budgets"] == 2
+
+    def test_quota_is_read_only(self):
+        """Test that reading quotas neither creates nor evicts budgets."""
+        budget = TokenBudgetLimiter(user_capacity=1000, ip_capacity=5000, window_seconds=3600, max_keys=1)
+        budget.reserve(None, "10.0.3.1", 800)
+
+        for i in range(3):
+            quota = budget.get_quota(f"user_{i}", "10.0.3.2")
+            assert quota["user_id"]["remaining"] == 1000
+            assert quota["ip"]["remaining"] == 5000
+        assert budget.get_stats()["tracked_budgets"] == 1
+        assert 4199 <= budget.get_quota(None, "10.0.3.1")["ip"]["remaining"] <= 4200
+
+    def test_cancelled_caller_keeps_reservation(self, monkeypatch):
+        """Test that hanging up during a Groq call does not refund its tokens."""
+        budget = TokenBudgetLimiter(user_capacity=10_000, ip_capacity=10_000, window_seconds=3600, max_keys=10)
+
+        async def handler(request):
+            await asyncio.sleep(0.05)
+            return make_groq_handler()(request)
+
+        monkeypatch.setattr(chat_pipeline, "groq_service", make_groq_service(handler))
+        monkeypatch.setattr(chat_pipeline, "response_cache", ResponseCache(10, 10_000, 60))
+        monkeypatch.setattr(chat_pipeline, "groq_singleflight", SingleFlight())
+        monkeypatch.setattr(chat_pipeline, "token_budget", budget)
+
+        async def scenario():
+            leader = asyncio.ensure_future(chat_pipeline.generate_answer("Bienfaits de l'ortie ?", user_id="leader"))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(chat_pipeline.generate_answer("Bienfaits de l'ortie ?", user_id="follower"))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            follower.cancel()
+            await asyncio.gather(leader, follower, return_exceptions=True)
+
+        asyncio.run(scenario())
+
+        assert budget.get_quota("leader", None)["user_id"]["remaining"] <= 10_000 - settings.MAX_TOKENS
+        assert budget.get_quota("follower", None)["user_id"]["remaining"] == 10_000
+
+
+
+def make_record(level=logging.INFO, msg="Tokens: %s", args=(380,)) -> logging.LogRecord:
+    return logging.LogRecord("diane_api", level, __file__, 1, msg, args, None)
+
+
+class TestLogging:
+    """Test the non-blocking logging pipeline."""
+
+    def test_queue_handler_drops_when_full(self):
+        """Test that a full queue drops records instead of blocking."""
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=2))
+
+        for _ in range(5):
+            handler.handle(make_record())
+
+        assert handler.enqueued == 2
+        assert handler.dropped == 3
+        assert handler.queue.get_nowait().msg == "Tokens: 380"
+
+    def test_json_formatter(self):
+        """Test one JSON object per record with the merged message."""
+        entry = json.loads(JsonFormatter().format(make_record()))
+
+        assert entry["level"] == "INFO"
+        assert entry["message"] == "Tokens: 380"
+
+    def test_sampling_keeps_warnings(self):
+        """Test that unsampled requests drop INFO lines but keep warnings."""
+        sampling_filter = RequestSamplingFilter()
+
+        def in_unsampled_request():
+            assert sample_request_logs(rate=0.0) is False
+            return (
+                sampling_filter.filter(make_record(logging.INFO)),
+                sampling_filter.filter(make_record(logging.WARNING))
+            )
+
+        assert contextvars.copy_context().run(in_unsampled_request) == (False, True)
+        # Other requests (contexts) are unaffected
+        assert sampling_filter.filter(make_record(logging.INFO))
+
+
+
+class TestMetrics:
+    """Test the Prometheus metrics registry."""
+
+    def test_counter_labels_and_exposition(self):
+        """Test labelled counters in the text format."""
+        registry = MetricsRegistry()
+        requests = registry.counter("requests_total", "Requests", ("endpoint", "outcome"))
+
+        requests.labels("/chat", "valid").inc()
+        requests.labels("/chat", "valid").inc()
+        requests.labels("/chat", 'off"topic').inc()
+
+        text = registry.render()
+        assert "# TYPE requests_total counter" in text
+        assert 'requests_total{endpoint="/chat",outcome="valid"} 2' in text
+        assert 'requests_total{endpoint="/chat",outcome="off\\"topic"} 1' in text
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test bucket counts, sum and count of a histogram."""
+        registry = MetricsRegistry()
+        latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+
+        for value in (0.05, 0.1, 0.5, 3.0):
+            latency.observe(value)
+
+        text = registry.render()
+        assert 'latency_seconds_bucket{le="0.1"} 2' in text
+        assert 'latency_seconds_bucket{le="1.0"} 3' in text
+        assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+        assert "latency_seconds_sum 3.65" in text
+        assert "latency_seconds_count 4" in text
+
+    def test_wrong_label_count_rejected(self):
+        """Test that a series needs every label."""
+        registry = MetricsRegistry()
+        requests = registry.counter("requests_total", "Requests", ("endpoint",))
+
+        with pytest.raises(ValueError):
+            requests.labels("/chat", "valid")
+
+
+
+def run_capture_middleware(middleware, path="/chat", body=b"{}"):
+    """Send one POST through an ASGI middleware, in two body chunks."""
+    messages = [
+        {"type": "http.request", "body": body[:5], "more_body": True},
+        {"type": "http.request", "body": body[5:], "more_body": False}
+    ]
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "POST", "path": path}
+    asyncio.run(middleware(scope, receive, send))
+
+
+async def read_whole_body(scope, receive, send):
+    while (await receive()).get("more_body"):
+        pass
+
+
+class TestTrafficCapture:
+    """Test request capture for replay."""
+
+    def test_sampled_requests_are_written(self, tmp_path):
+        """Test that captured bodies end up as JSONL with their arrival time."""
+        writer = CaptureWriter(str(tmp_path / "captures" / "chat.jsonl"), max_queue=10)
+        middleware = CaptureMiddleware(read_whole_body, writer)
+
+        body = json.dumps({"message": "Bienfaits du thym ?", "user_id": "wp_1", "extra": "x"}).encode()
+        run_capture_middleware(middleware, body=body)
+        run_capture_middleware(middleware, path="/health", body=body)
+        run_capture_middleware(middleware, body=b"not json")
+
+        writer.start()
+        writer.stop()
+
+        lines = (tmp_path / "captures" / "chat.jsonl").read_text(encoding="utf-8").splitlines()
+        assert len(lines) == 1
+        record = json.loads(lines[0])
+        assert record["path"] == "/chat"
+        assert record["payload"] == {"message": "Bienfaits du thym ?", "user_id": "wp_1"}
+        assert record["ts"] > 0
+        assert writer.get_stats()["invalid"] == 1
+
+    def test_sampling_and_full_queue(self, tmp_path):
+        """Test that unsampled requests are skipped and a full queue drops."""
+        writer = CaptureWriter(str(tmp_path / "chat.jsonl"), max_queue=1)
+        body = json.dumps({"message": "Sauge"}).encode()
+
+        run_capture_middleware(CaptureMiddleware(read_whole_body, writer, sample_rate=0.0), body=body)
+        assert writer.captured == 0
+
+        middleware = CaptureMiddleware(read_whole_body, writer)
+        run_capture_middleware(middleware, body=body)
+        run_capture_middleware(middleware, body=body)
+        assert writer.captured == 1
+        assert writer.dropped == 1
+
+
+# Run tests with: pytest tests/test_services.py -v